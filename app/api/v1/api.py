@@ -2,7 +2,7 @@ from fastapi import APIRouter
 from app.api.v1.endpoints import (
     auth, users, products, categories, inventory, orders, returns,
     banners, offers, upload, settings, courier, dashboard, pages,
-    wishlist, notifications
+    wishlist, notifications, exports, analytics, jobs
 )
 
 api_router = APIRouter()
@@ -23,3 +23,6 @@ api_router.include_router(dashboard.router, tags=["dashboard"])
 api_router.include_router(pages.router, tags=["pages"])
 api_router.include_router(wishlist.router, tags=["wishlist"])
 api_router.include_router(notifications.router, tags=["notifications"])
+api_router.include_router(exports.router, tags=["exports"])
+api_router.include_router(analytics.router, tags=["analytics"])
+api_router.include_router(jobs.router, tags=["jobs"])
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.db.session import get_db
+from app.api.v1.endpoints.auth import admin_required
+from app.core.config import settings as config_settings
+from app.schemas.order import AnalyticsQuery
+from app.services.analytics import order_cube, DIMENSIONS, METRICS
+
+router = APIRouter()
+
+@router.post("/admin/analytics/query")
+def query_analytics(data: AnalyticsQuery, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    order_cube.refresh_if_stale(db, config_settings.ANALYTICS_REFRESH_SECONDS)
+    try:
+        return order_cube.query(
+            group_by=data.group_by,
+            metrics=data.metrics,
+            filters=data.filters,
+            date_from=data.date_from,
+            date_to=data.date_to,
+            limit=max(1, min(data.limit, 10000))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/admin/analytics/schema")
+def get_analytics_schema(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    order_cube.refresh_if_stale(db, config_settings.ANALYTICS_REFRESH_SECONDS)
+    return {
+        "dimensions": list(DIMENSIONS),
+        "metrics": list(METRICS),
+        "cube": order_cube.stats()
+    }
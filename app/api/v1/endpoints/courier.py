@@ -1,17 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 import qrcode
 from io import BytesIO as QRBytesIO
 import base64
+import json
 import os
+import queue
 from datetime import datetime
+from typing import Literal, Optional
 
 from app.db.session import get_db
 from app.api.v1.endpoints.auth import admin_required
-from app.models.settings import Settings
+from app.models.settings import Settings, PincodeServiceability
 from app.models.order import Order, ReturnRequest
 
-from app.services.courier import DelhiveryService
+from app.services.courier import DelhiveryService, delhivery_http
+from app.services import pincodes, tracking
+from app.services.courier_webhooks import webhook_queue, verify_signature, parse_push
+from app.services.pincodes import pincode_directory
+from app.services.shipping_rates import rate_engine
+from app.services import jobs as background_jobs
+from app.services.jobs import job_view
+from app.services.shipments import shipping_problem, cancel_problem, return_pickup_problem, busy_orders
+from app.schemas.order import BulkShipRequest, BulkRateQuoteRequest, MAX_PARCEL_GRAMS, MAX_ORDER_VALUE
+from app.utils.labels import label_content, content_hash, stored_label
+from app.utils.pdf import render_label_pdf
+from app.utils.zpl import render_label_zpl
 from app.core.config import settings as config_settings
 
 router = APIRouter()
@@ -19,6 +35,18 @@ router = APIRouter()
 # Initialize Courier Service
 delhivery_service = DelhiveryService(config_settings.DELHIVERY_TOKEN)
 
+def _order_for_job(db: Session, order_id: str) -> Order:
+    order = db.query(Order).filter(Order.id == order_id).first()
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+def _submit_order_job(db: Session, kind: str, order: Order, admin: dict, **params) -> dict:
+    if busy_orders(db, [order.id]):
+        raise HTTPException(status_code=409, detail="This order already has a courier job that has not finished")
+    job = background_jobs.submit(db, kind, {"order_id": order.id, **params}, total=1, created_by=admin["id"])
+    return job_view(job, include_results=False)
+
 @router.get("/admin/couriers")
 def get_couriers(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
     # For now, return a default Delhivery courier
@@ -35,6 +63,10 @@ def get_couriers(admin: dict = Depends(admin_required), db: Session = Depends(ge
         }
     ]
 
+@router.get("/admin/couriers/http-metrics")
+def get_courier_http_metrics(admin: dict = Depends(admin_required)):
+    return delhivery_http.metrics()
+
 @router.post("/admin/couriers/test")
 def test_courier_api(admin: dict = Depends(admin_required)):
     try:
@@ -78,7 +110,50 @@ def delete_courier(courier_id: str, admin: dict = Depends(admin_required), db: S
 
 @router.get("/courier/pincode")
 def check_pincode_serviceability(pincode: str):
-    return delhivery_service.check_serviceability(pincode)
+    return pincode_directory.lookup(pincode.strip())
+
+@router.get("/courier/rates")
+def get_shipping_rate(
+    pincode: str,
+    weight_grams: Optional[float] = Query(None, gt=0, le=MAX_PARCEL_GRAMS, allow_inf_nan=False),
+    payment_method: Literal["prepaid", "cod"] = "prepaid",
+    order_value: float = Query(0, ge=0, le=MAX_ORDER_VALUE, allow_inf_nan=False)
+):
+    """Shipping charge and delivery estimate from the local rate engine (cart previews)."""
+    quote = rate_engine.quote(pincode, weight_grams, payment_method, order_value)
+    if quote.get("error"):
+        raise HTTPException(status_code=400, detail=quote["error"])
+    return quote
+
+@router.post("/admin/couriers/rates/quote")
+def get_shipping_rates_bulk(data: BulkRateQuoteRequest, admin: dict = Depends(admin_required)):
+    return {"quotes": [
+        rate_engine.quote(item.pincode, item.weight_grams, item.payment_method, item.order_value, item.dimensions_cm)
+        for item in data.items
+    ]}
+
+@router.get("/admin/couriers/rates")
+def get_rate_engine_stats(admin: dict = Depends(admin_required)):
+    return rate_engine.stats()
+
+@router.get("/admin/couriers/pincodes")
+def get_pincode_table(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    return {
+        "rows": db.query(func.count(PincodeServiceability.pincode)).scalar(),
+        "serviceable": db.query(func.count(PincodeServiceability.pincode)).filter(
+            PincodeServiceability.serviceable == True
+        ).scalar(),
+        "last_refresh": pincodes.last_pincode_refresh(db),
+        "cache": pincode_directory.stats()
+    }
+
+@router.post("/admin/couriers/pincodes/refresh")
+def refresh_pincode_table(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    try:
+        return pincodes.refresh_from_api(db, force=True)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=502, detail=f"Pincode refresh failed: {str(e)}")
 
 @router.post("/courier/validate-address")
 def validate_shipping_address(address_data: dict):
@@ -126,83 +201,35 @@ def generate_payment_qr(data: dict, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate QR code: {str(e)}")
 
-@router.post("/courier/ship/{order_id}")
+@router.post("/courier/ship/{order_id}", status_code=202)
 def create_shipment(order_id: str, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    if order.status in ["shipped", "delivered", "cancelled"]:
-        raise HTTPException(status_code=400, detail=f"Cannot ship order with status: {order.status}")
-        
-    shipping_address = order.shipping_address
-    if not shipping_address:
-        raise HTTPException(status_code=400, detail="Order has no shipping address")
-    
-    required_fields = ["name", "phone", "line1", "city", "state", "pincode"]
-    missing_fields = [field for field in required_fields if not shipping_address.get(field)]
-    
-    if missing_fields:
+    """
+    Queue the Delhivery shipment for an order. Returns the job; its result
+    (AWB or error) is at GET /admin/jobs/{id} and sent as an admin notification.
+    """
+    order = _order_for_job(db, order_id)
+    problem = shipping_problem(order)
+    if problem:
+        raise HTTPException(status_code=400, detail=problem)
+    return _submit_order_job(db, "ship_order", order, admin)
+
+@router.post("/admin/couriers/ship-bulk", status_code=202)
+def create_shipments_bulk(data: BulkShipRequest, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    """
+    Ship many orders as a background job (app/services/shipments.py). Returns
+    the job at once; follow it at GET /admin/jobs/{id} for per-order results.
+    """
+    order_ids = list(dict.fromkeys(data.order_ids))
+    busy = busy_orders(db, order_ids)
+    if busy:
         raise HTTPException(
-            status_code=400, 
-            detail=f"Missing required shipping address fields: {', '.join(missing_fields)}"
+            status_code=409,
+            detail=f"{len(busy)} of these orders already have a courier job that has not finished"
         )
-    
-    phone = str(shipping_address.get("phone", "")).strip()
-    if len(phone) < 10:
-        raise HTTPException(status_code=400, detail="Invalid phone number in shipping address")
-    
-    pincode = str(shipping_address.get("pincode", "")).strip()
-    if len(pincode) != 6 or not pincode.isdigit():
-        raise HTTPException(status_code=400, detail="Invalid pincode in shipping address")
-    
-    order_data = {
-        "order_id": order.order_number,
-        "date": order.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-        "pay_mode": "Pre-paid" if order.payment_method == "online" else "COD",
-        "address": f"{shipping_address.get('line1', '')} {shipping_address.get('line2', '')}".strip(),
-        "phone": phone,
-        "name": shipping_address.get("name"),
-        "city": shipping_address.get("city"),
-        "state": shipping_address.get("state"),
-        "pincode": pincode,
-        "total_amount": float(order.grand_total),
-        "cod_amount": float(order.grand_total) if order.payment_method != "online" else 0,
-        "quantity": sum(item.get("quantity", 1) for item in order.items) if order.items else 1,
-        "products_desc": ", ".join(item.get("product_name", "Item") for item in order.items)[:50] if order.items else "Products",
-        
-        "pickup_name": "Amorlias Mart",
-        "pickup_address": "Warehouse Address",
-        "pickup_city": "New Delhi",
-        "pickup_pincode": "110001",
-        "pickup_phone": "9999999999"
-    }
-    
-    settings = db.query(Settings).first()
-    if settings:
-        order_data["pickup_name"] = settings.business_name or "Amorlias Mart"
-        if settings.address:
-            address_line = f"{settings.address.get('line1', '')} {settings.address.get('line2', '')}".strip()
-            if address_line:
-                order_data["pickup_address"] = address_line
-            if settings.address.get('city'):
-                order_data["pickup_city"] = settings.address.get('city')
-            if settings.address.get('pincode'):
-                order_data["pickup_pincode"] = settings.address.get('pincode')
-        if settings.phone:
-            order_data["pickup_phone"] = settings.phone
-
-    result = delhivery_service.create_surface_order(order_data)
-    
-    if result.get("success"):
-        order.tracking_number = result.get("awb")
-        order.courier_provider = "Delhivery"
-        order.status = "shipped"
-        order.updated_at = datetime.utcnow()
-        db.commit()
-        return result
-    else:
-        raise HTTPException(status_code=400, detail=f"Shipment Creation Failed: {result.get('error')}")
+    job = background_jobs.submit(
+        db, "bulk_ship", {"order_ids": order_ids}, total=len(order_ids), created_by=admin["id"]
+    )
+    return job_view(job, include_results=False)
 
 @router.get("/courier/track/{order_id}")
 def track_shipment(order_id: str, db: Session = Depends(get_db)):
@@ -213,27 +240,89 @@ def track_shipment(order_id: str, db: Session = Depends(get_db)):
     if not order.tracking_number:
          raise HTTPException(status_code=400, detail="Order has not been shipped yet")
     
-    tracking_result = delhivery_service.track_order(order.tracking_number)
+    if not tracking.is_fresh(order):
+        tracking_result = delhivery_service.track_order(order.tracking_number)
+        if not tracking_result.get("success"):
+            raise HTTPException(status_code=400, detail=f"Tracking failed: {tracking_result.get('error')}")
+        if str(tracking_result.get("note", "")).startswith("Mock"):
+            # Placeholder data while the API is unreachable; shown but never stored
+            return {
+                "order_id": order.id,
+                "order_number": order.order_number,
+                "awb": order.tracking_number,
+                "courier_provider": order.courier_provider,
+                "current_status": tracking_result.get("status"),
+                "current_location": tracking_result.get("current_location"),
+                "expected_delivery": tracking_result.get("expected_delivery"),
+                "tracking_history": tracking_result.get("tracking_history", []),
+                "last_updated": datetime.utcnow().isoformat()
+            }
+        tracking.record_tracking(db, order, tracking_result)
     
-    if tracking_result.get("success"):
-        if tracking_result.get("tracking_history"):
-            order.tracking_history = tracking_result["tracking_history"]
-            order.updated_at = datetime.utcnow()
-            db.commit()
-        
-        return {
-            "order_id": order.id,
-            "order_number": order.order_number,
-            "awb": order.tracking_number,
-            "courier_provider": order.courier_provider,
-            "current_status": tracking_result.get("status"),
-            "current_location": tracking_result.get("current_location"),
-            "expected_delivery": tracking_result.get("expected_delivery"),
-            "tracking_history": tracking_result.get("tracking_history", []),
-            "last_updated": datetime.utcnow().isoformat()
-        }
-    else:
-        raise HTTPException(status_code=400, detail=f"Tracking failed: {tracking_result.get('error')}")
+    summary = order.tracking_summary or {}
+    return {
+        "order_id": order.id,
+        "order_number": order.order_number,
+        "awb": order.tracking_number,
+        "courier_provider": order.courier_provider,
+        "current_status": summary.get("status"),
+        "current_location": summary.get("current_location"),
+        "expected_delivery": summary.get("expected_delivery"),
+        # Courier scans only; admin status entries have no scan date
+        "tracking_history": [entry for entry in order.tracking_history or [] if entry.get("date")],
+        "last_updated": order.tracking_checked_at.isoformat()
+    }
+
+@router.get("/admin/couriers/tracking")
+def get_tracking_poll(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    return {
+        "in_transit": db.query(func.count(Order.id)).filter(
+            Order.status.in_(tracking.IN_TRANSIT), Order.tracking_number.isnot(None)
+        ).scalar(),
+        "last_run": tracking.last_tracking_poll(db)
+    }
+
+@router.post("/admin/couriers/tracking/poll")
+def run_tracking_poll(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    return tracking.poll_shipments(db)
+
+@router.post("/courier/webhooks/delhivery", status_code=202)
+async def receive_courier_webhook(request: Request):
+    """
+    Courier status pushes, signed with X-Webhook-Signature (hex HMAC-SHA256
+    of the body). Only queues the events; see app/services/courier_webhooks.py.
+    """
+    secret = config_settings.DELHIVERY_WEBHOOK_SECRET
+    if not secret:
+        raise HTTPException(status_code=503, detail="Courier webhook is not configured")
+    
+    limit = config_settings.WEBHOOK_MAX_BYTES
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise HTTPException(status_code=413, detail="Payload too large")
+    body = bytearray()
+    async for piece in request.stream():
+        body += piece
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail="Payload too large")
+    body = bytes(body)
+    
+    if not verify_signature(body, request.headers.get("x-webhook-signature"), secret):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    
+    events, invalid = parse_push(payload)
+    try:
+        accepted, duplicates = webhook_queue.offer(events)
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="Webhook queue is full, retry later", headers={"Retry-After": "5"})
+    return {"accepted": accepted, "duplicates": duplicates, "invalid": invalid}
+
+@router.get("/admin/couriers/webhooks")
+def get_courier_webhook_stats(admin: dict = Depends(admin_required)):
+    return webhook_queue.stats()
 
 @router.get("/courier/track-by-awb/{awb}")
 def track_by_awb(awb: str):
@@ -241,11 +330,6 @@ def track_by_awb(awb: str):
 
 @router.get("/courier/label/{order_id}")
 def get_shipping_label(order_id: str, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
-    # Need to move generate_shipping_label_pdf to a utility file first or it won't be accessible
-    # I'll create `app/utils/pdf.py` later and import it.
-    # For now, I will assume it's imported from app.utils.pdf
-    from app.utils.pdf import generate_shipping_label_pdf
-    
     order = db.query(Order).filter(Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -263,23 +347,8 @@ def get_shipping_label(order_id: str, admin: dict = Depends(admin_required), db:
             }
     
     try:
-        pdf_buffer = generate_shipping_label_pdf(order_id, db)
-        
-        # In a real app we'd save to S3 or similar. Here we save locally to static folder.
-        # But for this endpoint, we are returning JSON with URL. 
-        # The original code saved to temp file.
-        
-        import os
-        temp_dir = os.path.join(config_settings.UPLOAD_DIR, "labels")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        temp_filename = f"label_{order.order_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        temp_path = os.path.join(temp_dir, temp_filename)
-        
-        with open(temp_path, 'wb') as f:
-            f.write(pdf_buffer.getvalue())
-        
-        label_url = f"/uploads/labels/{temp_filename}"
+        # Stored under its content hash: an unchanged label is not rendered or written again
+        _, label_url = stored_label(label_content(db, order), "pdf", render_label_pdf)
         
         return {
             "order_id": order.id,
@@ -292,6 +361,28 @@ def get_shipping_label(order_id: str, admin: dict = Depends(admin_required), db:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate shipping label: {str(e)}")
 
+@router.get("/courier/label/{order_id}/zpl")
+def get_shipping_label_zpl(order_id: str, request: Request, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    """
+    The shipping label as ZPL for thermal printers, sent as plain text. The
+    ETag is the label's content hash, so a reprint of an unchanged label can
+    be answered with 304.
+    """
+    order = db.query(Order).filter(Order.id == order_id).first()
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    content = label_content(db, order)
+    etag = f'"{content_hash(content, "zpl")}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    path, _ = stored_label(content, "zpl", render_label_zpl)
+    return FileResponse(
+        path, media_type="text/plain; charset=utf-8", filename=os.path.basename(path),
+        content_disposition_type="inline", headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
 @router.get("/courier/label-url/{order_id}")
 def get_shipping_label_url(order_id: str, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
     order = db.query(Order).filter(Order.id == order_id).first()
@@ -336,90 +427,20 @@ def get_shipping_invoice(order_id: str, admin: dict = Depends(admin_required), d
     else:
         raise HTTPException(status_code=400, detail=f"Invoice generation failed: {result.get('error')}")
 
-@router.post("/courier/cancel/{order_id}")
+@router.post("/courier/cancel/{order_id}", status_code=202)
 def cancel_shipment(order_id: str, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-        
-    if not order.tracking_number:
-         raise HTTPException(status_code=400, detail="Order has not been shipped yet")
-    
-    if order.status not in ["shipped", "processing"]:
-        raise HTTPException(status_code=400, detail="Cannot cancel order in current status")
+    """Queue the cancellation of an order's shipment; the result arrives like create_shipment's."""
+    order = _order_for_job(db, order_id)
+    problem = cancel_problem(order)
+    if problem:
+        raise HTTPException(status_code=400, detail=problem)
+    return _submit_order_job(db, "cancel_shipment", order, admin)
 
-    result = delhivery_service.cancel_shipment(order.tracking_number)
-    
-    if result.get("success"):
-        order.status = "cancelled"
-        order.updated_at = datetime.utcnow()
-        db.commit()
-        
-        return {
-            "order_id": order.id,
-            "order_number": order.order_number,
-            "awb": order.tracking_number,
-            "message": "Shipment cancelled successfully",
-            "cancelled_at": datetime.utcnow().isoformat()
-        }
-    else:
-        raise HTTPException(status_code=400, detail=f"Cancellation failed: {result.get('error')}")
-
-@router.post("/admin/couriers/create-return/{order_id}")
+@router.post("/admin/couriers/create-return/{order_id}", status_code=202)
 def create_return_shipment_endpoint(order_id: str, return_data: dict, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
-    # Renamed to avoid conflict with method name
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    if order.status not in ["delivered", "shipped"]:
-        raise HTTPException(status_code=400, detail="Can only create returns for delivered/shipped orders")
-    
-    shipping_address = order.shipping_address
-    if not shipping_address:
-        raise HTTPException(status_code=400, detail="No shipping address found for return pickup")
-    
-    return_shipment_data = {
-        "original_order_id": order.order_number,
-        "customer_name": shipping_address.get("name"),
-        "customer_phone": shipping_address.get("phone"),
-        "pickup_address": f"{shipping_address.get('line1', '')} {shipping_address.get('line2', '')}".strip(),
-        "pickup_city": shipping_address.get("city"),
-        "pickup_state": shipping_address.get("state"),
-        "pickup_pincode": shipping_address.get("pincode"),
-        "return_amount": return_data.get("return_amount", order.grand_total),
-        "quantity": return_data.get("quantity", 1),
-        "products_desc": return_data.get("reason", "Return Items"),
-        "weight": return_data.get("weight", "500")
-    }
-    
-    result = delhivery_service.create_return_shipment(return_shipment_data)
-    
-    if result.get("success"):
-        from app.models.order import ReturnRequest # ensure imported
-        return_request = ReturnRequest(
-            id=generate_id(), # Need uuid
-            order_id=order.id,
-            user_id=order.user_id,
-            reason=return_data.get("reason", "Customer return"),
-            status="pickup_scheduled",
-            return_awb=result.get("return_awb"),
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
-        # We need generate_id imported
-        from app.utils.common import generate_id
-        return_request.id = generate_id()
-        
-        db.add(return_request)
-        db.commit()
-        
-        return {
-            "order_id": order.id,
-            "return_id": return_request.id,
-            "return_awb": result.get("return_awb"),
-            "pickup_scheduled": True,
-            "message": "Return pickup scheduled successfully"
-        }
-    else:
-        raise HTTPException(status_code=400, detail=f"Return creation failed: {result.get('error')}")
+    """Queue a return pickup; on success the job's result carries the new return's id and AWB."""
+    order = _order_for_job(db, order_id)
+    problem = return_pickup_problem(order)
+    if problem:
+        raise HTTPException(status_code=400, detail=problem)
+    return _submit_order_job(db, "return_pickup", order, admin, return_data=return_data)
@@ -4,7 +4,9 @@ from datetime import datetime, timedelta
 
 from app.db.session import get_db
 from app.api.v1.endpoints.auth import admin_required
-from app.models.product import Product
+from app.models.product import Product, ProductSalesStats
+from app.services import popularity
+from app.services.retention import with_archive
 from app.models.order import Order, ReturnRequest
 from app.models.user import User
 
@@ -12,8 +14,10 @@ router = APIRouter()
 
 @router.get("/admin/dashboard")
 def get_dashboard_stats(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    # Totals and revenue include archived orders; the pending and recent lists only ever need live ones
+    all_orders = with_archive(Order)
     total_products = db.query(Product).count()
-    total_orders = db.query(Order).count()
+    total_orders = db.query(all_orders).count()
     total_customers = db.query(User).filter(User.role == "customer").count()
     
     pending_orders = db.query(Order).filter(Order.status == "pending").count()
@@ -23,16 +27,25 @@ def get_dashboard_stats(admin: dict = Depends(admin_required), db: Session = Dep
     ).count()
     
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_orders = db.query(Order).filter(
-        Order.created_at >= thirty_days_ago,
-        Order.status.in_(["completed", "shipped", "delivered"])
+    recent_orders = db.query(all_orders).filter(
+        all_orders.created_at >= thirty_days_ago,
+        all_orders.status.in_(["completed", "shipped", "delivered"])
     ).all()
     
     total_revenue = sum(order.grand_total for order in recent_orders)
     
-    top_products = db.query(Product).filter(
-        Product.is_active == True
-    ).order_by(Product.created_at.desc()).limit(5).all()
+    top_rows = db.query(Product, ProductSalesStats).join(
+        ProductSalesStats, ProductSalesStats.product_id == Product.id
+    ).filter(
+        Product.is_active == True,
+        ProductSalesStats.popularity_score > 0
+    ).order_by(ProductSalesStats.popularity_score.desc()).limit(5).all()
+    
+    top_products = []
+    for product, stats in top_rows:
+        product_dict = {c.name: getattr(product, c.name) for c in product.__table__.columns}
+        product_dict.update(popularity.stats_dict(stats))
+        top_products.append(product_dict)
     
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     
@@ -71,12 +84,13 @@ def get_sales_report(
     admin: dict = Depends(admin_required), 
     db: Session = Depends(get_db)
 ):
-    query = db.query(Order).filter(Order.status != "cancelled")
+    all_orders = with_archive(Order)
+    query = db.query(all_orders).filter(all_orders.status != "cancelled")
     
     if date_from:
         try:
            dt_from = datetime.fromisoformat(date_from.replace("Z", "+00:00"))
-           query = query.filter(Order.created_at >= dt_from)
+           query = query.filter(all_orders.created_at >= dt_from)
         except:
            pass
 
@@ -136,13 +150,14 @@ def get_profit_loss_report(
     admin: dict = Depends(admin_required), 
     db: Session = Depends(get_db)
 ):
-    orders_query = db.query(Order).filter(Order.status != "cancelled")
+    all_orders = with_archive(Order)
+    orders_query = db.query(all_orders).filter(all_orders.status != "cancelled")
     returns_query = db.query(ReturnRequest).filter(ReturnRequest.status == "approved")
     
     if date_from:
         try:
            dt_from = datetime.fromisoformat(date_from.replace("Z", "+00:00"))
-           orders_query = orders_query.filter(Order.created_at >= dt_from)
+           orders_query = orders_query.filter(all_orders.created_at >= dt_from)
            returns_query = returns_query.filter(ReturnRequest.created_at >= dt_from)
         except:
            pass
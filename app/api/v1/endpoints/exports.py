@@ -0,0 +1,212 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime
+
+from app.db.session import SessionLocal
+from app.api.v1.endpoints.auth import admin_required
+from app.models.order import Order
+from app.models.product import Product, Category
+from app.models.user import User
+from app.services.retention import with_archive
+from app.utils.export import iter_csv, iter_xlsx, ensure_xlsx_support
+
+router = APIRouter()
+
+# Rows are pulled from the database in batches of this size (server-side cursor)
+EXPORT_BATCH_SIZE = 1000
+
+def _parse_date(value: Optional[str]):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}. Use ISO format (YYYY-MM-DD)")
+
+def _filter_dates(query, column, filters):
+    if filters.get("date_from"):
+        query = query.filter(column >= filters["date_from"])
+    if filters.get("date_to"):
+        query = query.filter(column <= filters["date_to"])
+    return query
+
+def _address_field(address, key):
+    return address.get(key, "") if isinstance(address, dict) else ""
+
+def _sales_rows(db: Session, filters: dict):
+    orders = with_archive(Order)
+    query = db.query(
+        orders.order_number, orders.created_at, orders.status, orders.payment_method,
+        orders.payment_status, orders.is_offline, orders.subtotal, orders.gst_total,
+        orders.discount_amount, orders.grand_total, orders.shipping_address
+    ).filter(orders.status != "cancelled")
+    query = _filter_dates(query, orders.created_at, filters)
+
+    for row in query.order_by(orders.created_at).yield_per(EXPORT_BATCH_SIZE):
+        yield (
+            row.order_number, row.created_at, row.status, row.payment_method,
+            row.payment_status, "offline" if row.is_offline else "online", row.subtotal,
+            row.gst_total, row.discount_amount, row.grand_total,
+            _address_field(row.shipping_address, "name"),
+            _address_field(row.shipping_address, "state")
+        )
+
+def _orders_rows(db: Session, filters: dict):
+    orders = with_archive(Order)
+    query = db.query(
+        orders.id, orders.order_number, orders.created_at, orders.updated_at, orders.user_id,
+        orders.customer_phone, orders.status, orders.payment_method, orders.payment_status,
+        orders.grand_total, orders.tracking_number, orders.courier_provider,
+        orders.items, orders.shipping_address
+    )
+    if filters.get("status"):
+        query = query.filter(orders.status == filters["status"])
+    query = _filter_dates(query, orders.created_at, filters)
+
+    for row in query.order_by(orders.created_at).yield_per(EXPORT_BATCH_SIZE):
+        items = row.items or []
+        yield (
+            row.id, row.order_number, row.created_at, row.updated_at, row.user_id,
+            row.customer_phone, row.status, row.payment_method, row.payment_status,
+            row.grand_total, len(items), sum(item.get("quantity", 0) for item in items),
+            row.tracking_number, row.courier_provider,
+            _address_field(row.shipping_address, "name"),
+            _address_field(row.shipping_address, "city"),
+            _address_field(row.shipping_address, "state"),
+            _address_field(row.shipping_address, "pincode")
+        )
+
+def _profit_loss_rows(db: Session, filters: dict):
+    # One small lookup instead of a Product query per order line
+    cost_prices = dict(db.query(Product.id, Product.cost_price).all())
+
+    orders = with_archive(Order)
+    query = db.query(orders.order_number, orders.created_at, orders.items).filter(orders.status != "cancelled")
+    query = _filter_dates(query, orders.created_at, filters)
+
+    for row in query.order_by(orders.created_at).yield_per(EXPORT_BATCH_SIZE):
+        for item in row.items or []:
+            quantity = item.get("quantity", 0)
+            price = item.get("price", 0)
+            unit_cost = cost_prices.get(item.get("product_id"))
+            if unit_cost is None:
+                unit_cost = price * 0.7
+            revenue = price * quantity
+            total_cost = unit_cost * quantity
+            yield (
+                row.order_number, row.created_at, item.get("product_id"), item.get("sku"),
+                item.get("product_name"), quantity, price, revenue, unit_cost, total_cost,
+                revenue - total_cost
+            )
+
+def _inventory_rows(db: Session, filters: dict):
+    query = db.query(
+        Product.id, Product.sku, Product.name, Category.name.label("category_name"),
+        Product.stock_qty, Product.low_stock_threshold, Product.cost_price,
+        Product.selling_price, Product.is_active
+    ).outerjoin(Category, Category.id == Product.category_id)
+
+    for row in query.order_by(Product.sku).yield_per(EXPORT_BATCH_SIZE):
+        stock_qty = row.stock_qty or 0
+        if stock_qty <= 0:
+            stock_status = "out_of_stock"
+        elif stock_qty <= (row.low_stock_threshold or 0):
+            stock_status = "low_stock"
+        else:
+            stock_status = "in_stock"
+        yield (
+            row.id, row.sku, row.name, row.category_name or "Uncategorized", stock_qty,
+            row.low_stock_threshold, stock_status, row.cost_price, row.selling_price,
+            stock_qty * (row.cost_price or 0), row.is_active
+        )
+
+def _users_rows(db: Session, filters: dict):
+    query = db.query(
+        User.id, User.name, User.phone, User.email, User.role, User.is_wholesale,
+        User.is_seller, User.supplier_status, User.gst_number, User.created_at
+    )
+    if filters.get("role"):
+        query = query.filter(User.role == filters["role"])
+    query = _filter_dates(query, User.created_at, filters)
+
+    for row in query.order_by(User.created_at).yield_per(EXPORT_BATCH_SIZE):
+        yield tuple(row)
+
+EXPORT_DATASETS = {
+    "sales": (
+        ["order_number", "created_at", "status", "payment_method", "payment_status", "channel",
+         "subtotal", "gst_total", "discount_amount", "grand_total", "customer_name", "state"],
+        _sales_rows
+    ),
+    "orders": (
+        ["order_id", "order_number", "created_at", "updated_at", "user_id", "customer_phone",
+         "status", "payment_method", "payment_status", "grand_total", "line_count", "unit_count",
+         "tracking_number", "courier_provider", "customer_name", "city", "state", "pincode"],
+        _orders_rows
+    ),
+    "profit-loss": (
+        ["order_number", "created_at", "product_id", "sku", "product_name", "quantity", "price",
+         "revenue", "unit_cost", "total_cost", "gross_profit"],
+        _profit_loss_rows
+    ),
+    "inventory": (
+        ["product_id", "sku", "name", "category", "stock_qty", "low_stock_threshold", "stock_status",
+         "cost_price", "selling_price", "stock_value", "is_active"],
+        _inventory_rows
+    ),
+    "users": (
+        ["id", "name", "phone", "email", "role", "is_wholesale", "is_seller", "supplier_status",
+         "gst_number", "created_at"],
+        _users_rows
+    ),
+}
+
+def _stream_rows(row_source, filters: dict):
+    # The request-scoped session from get_db is closed before a streaming body
+    # is sent, so the export owns its session for the lifetime of the stream.
+    db = SessionLocal()
+    try:
+        yield from row_source(db, filters)
+    finally:
+        db.close()
+
+@router.get("/admin/exports/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = "csv",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    status: Optional[str] = None,
+    role: Optional[str] = None,
+    admin: dict = Depends(admin_required)
+):
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown export. Available: {', '.join(EXPORT_DATASETS)}")
+    if format not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="Format must be csv or xlsx")
+
+    filters = {
+        "date_from": _parse_date(date_from),
+        "date_to": _parse_date(date_to),
+        "status": status,
+        "role": role
+    }
+    header, row_source = EXPORT_DATASETS[dataset]
+    rows = _stream_rows(row_source, filters)
+    filename = f"{dataset}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{format}"
+
+    if format == "xlsx":
+        ensure_xlsx_support()
+        body = iter_xlsx(header, rows, sheet_title=dataset)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        body = iter_csv(header, rows)
+        media_type = "text/csv"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
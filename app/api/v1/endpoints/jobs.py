@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.db.session import get_db
+from app.api.v1.endpoints.auth import admin_required
+from app.models.settings import BackgroundJob
+from app.services import jobs as background_jobs
+from app.services.jobs import job_view
+
+router = APIRouter()
+
+@router.get("/admin/jobs")
+def list_jobs(
+    kind: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    admin: dict = Depends(admin_required),
+    db: Session = Depends(get_db)
+):
+    query = db.query(BackgroundJob)
+    if kind:
+        query = query.filter(BackgroundJob.kind == kind)
+    if status:
+        query = query.filter(BackgroundJob.status == status)
+    jobs = query.order_by(BackgroundJob.created_at.desc()).limit(limit).all()
+    return {
+        "jobs": [job_view(job, include_results=False) for job in jobs],
+        "pools": background_jobs.metrics()
+    }
+
+@router.get("/admin/jobs/{job_id}")
+def get_job(job_id: str, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    job = db.get(BackgroundJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
@@ -1,110 +1,198 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from collections import deque
 from datetime import datetime
+from typing import Optional
+import asyncio
+import json
 
+from app.core.config import settings
 from app.db.session import get_db
-from app.api.v1.endpoints.auth import get_current_user, admin_required
+from app.api.v1.endpoints.auth import get_current_user, admin_required, _resolve_principal
 from app.models.user import Notification
+from app.services.events import broker, event_time
+from app.schemas.user import NotificationIds
+from app.services.notifications import ADMIN_OWNER, unread_count, mark_read, delete_notifications, list_notifications, reconcile_unread_counters, notifications_since
 
 router = APIRouter()
 
+def _open_stream(request: Request, token: str, resume_from, db: Session):
+    try:
+        user = _resolve_principal(request, token, db)
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    channels = [user["id"]]
+    if user.get("role") == "admin":
+        channels.append(ADMIN_OWNER)
+
+    backlog = []
+    if resume_from:
+        try:
+            since = event_time(int(resume_from))
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+        backlog = notifications_since(db, since, channels)
+    db.close()
+    return channels, backlog
+
+def _format_event(item: dict) -> str:
+    return f"id: {item['id']}\nevent: {item['event']}\ndata: {json.dumps(item['data'], default=str)}\n\n"
+
+@router.get("/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    token: Optional[str] = Query(None, description="Access token, for EventSource clients that cannot send headers"),
+    last_event_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-sent events for the caller's notifications and order status changes
+    (admins also receive the admin inbox). Reconnects resume missed
+    notifications from Last-Event-ID, re-sending a short overlap window that
+    clients dedupe by notification id; order status events are live only.
+    """
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="No authorization header")
+    resume_from = request.headers.get("Last-Event-ID") or last_event_id
+    # Auth and the resume query are the only DB work; after them the stream holds no session
+    channels, backlog = await run_in_threadpool(_open_stream, request, token, resume_from, db)
+
+    subscription = broker.subscribe(channels)
+
+    async def event_stream():
+        # Notifications can arrive from the local broker and the cross-worker poller
+        seen = deque(maxlen=256)
+        try:
+            yield "retry: 3000\n\n"
+            for item in backlog:
+                seen.append(item["data"]["id"])
+                yield _format_event(item)
+            while not subscription.overflowed:
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if item["event"] == "notification":
+                    if item["data"]["id"] in seen:
+                        continue
+                    seen.append(item["data"]["id"])
+                yield _format_event(item)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _page(db: Session, owner: str, cursor: Optional[str], limit: int, unread_only: bool) -> dict:
+    try:
+        notifications, next_cursor = list_notifications(db, owner, cursor, limit, unread_only)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"notifications": notifications, "unread_count": unread_count(db, owner), "next_cursor": next_cursor}
+
 @router.get("/notifications")
-def get_user_notifications(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    notifications = db.query(Notification).filter(
-        Notification.user_id == user["id"],
-        Notification.for_admin == False
-    ).order_by(Notification.created_at.desc()).limit(50).all()
-    
-    unread_count = db.query(Notification).filter(
-        Notification.user_id == user["id"],
-        Notification.read == False,
-        Notification.for_admin == False
-    ).count()
-    
-    return {"notifications": notifications, "unread_count": unread_count}
+def get_user_notifications(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    unread_only: bool = False,
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Newest first. Pass `next_cursor` from the previous page as `cursor` to page further."""
+    return _page(db, user["id"], cursor, limit, unread_only)
 
 @router.get("/notifications/unread-count")
 def get_unread_notification_count(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    unread_count = db.query(Notification).filter(
-        Notification.user_id == user["id"],
-        Notification.read == False,
-        Notification.for_admin == False
-    ).count()
-    
-    return {"unread_count": unread_count}
+    return {"unread_count": unread_count(db, user["id"])}
+
+@router.put("/notifications/mark-read")
+def mark_notifications_read(data: NotificationIds, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    updated = mark_read(db, user["id"], Notification.id.in_(data.ids))
+    db.commit()
+    return {"message": "Notifications marked as read", "updated": updated}
+
+@router.post("/notifications/bulk-delete")
+def delete_notifications_bulk(data: NotificationIds, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    deleted = delete_notifications(db, user["id"], Notification.id.in_(data.ids))
+    db.commit()
+    return {"message": "Notifications deleted", "deleted": deleted}
 
 @router.put("/notifications/{notification_id}/read")
 def mark_notification_read(notification_id: str, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    note = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.user_id == user["id"]
-    ).first()
-    
-    if note:
-        note.read = True
-        db.commit()
+    mark_read(db, user["id"], Notification.id == notification_id)
+    db.commit()
     return {"message": "Notification marked as read"}
 
 @router.put("/notifications/mark-all-read")
 def mark_all_read(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    db.query(Notification).filter(
-        Notification.user_id == user["id"],
-        Notification.for_admin == False
-    ).update({"read": True})
+    mark_read(db, user["id"])
     db.commit()
     return {"message": "All notifications marked as read"}
 
 @router.delete("/notifications/{notification_id}")
 def delete_notification(notification_id: str, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    note = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.user_id == user["id"]
-    ).first()
-    
-    if note:
-        db.delete(note)
-        db.commit()
+    delete_notifications(db, user["id"], Notification.id == notification_id)
+    db.commit()
     return {"message": "Notification deleted"}
 
 @router.delete("/notifications")
 def clear_all_notifications(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    db.query(Notification).filter(
-        Notification.user_id == user["id"],
-        Notification.for_admin == False
-    ).delete()
+    delete_notifications(db, user["id"])
     db.commit()
     return {"message": "All notifications cleared"}
 
 @router.get("/admin/notifications")
-def get_admin_notifications(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
-    notifications = db.query(Notification).filter(
-        Notification.for_admin == True
-    ).order_by(Notification.created_at.desc()).limit(50).all()
-    
-    unread_count = db.query(Notification).filter(
-        Notification.for_admin == True,
-        Notification.read == False
-    ).count()
-    
-    return {"notifications": notifications, "unread_count": unread_count}
+def get_admin_notifications(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    unread_only: bool = False,
+    admin: dict = Depends(admin_required),
+    db: Session = Depends(get_db)
+):
+    return _page(db, ADMIN_OWNER, cursor, limit, unread_only)
 
 @router.get("/admin/notifications/unread-count")
 def get_admin_unread_count(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
-    unread_count = db.query(Notification).filter(
-        Notification.for_admin == True,
-        Notification.read == False
-    ).count()
-    
-    return {"unread_count": unread_count}
+    return {"unread_count": unread_count(db, ADMIN_OWNER)}
+
+@router.put("/admin/notifications/mark-read")
+def mark_admin_notifications_read(data: NotificationIds, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    updated = mark_read(db, ADMIN_OWNER, Notification.id.in_(data.ids))
+    db.commit()
+    return {"message": "Notifications marked as read", "updated": updated}
+
+@router.put("/admin/notifications/mark-all-read")
+def mark_all_admin_read(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    mark_read(db, ADMIN_OWNER)
+    db.commit()
+    return {"message": "All notifications marked as read"}
+
+@router.post("/admin/notifications/bulk-delete")
+def delete_admin_notifications_bulk(data: NotificationIds, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    deleted = delete_notifications(db, ADMIN_OWNER, Notification.id.in_(data.ids))
+    db.commit()
+    return {"message": "Notifications deleted", "deleted": deleted}
 
 @router.put("/admin/notifications/{notification_id}/read")
 def mark_admin_notification_read(notification_id: str, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
-    note = db.query(Notification).filter(
-        Notification.id == notification_id,
-        Notification.for_admin == True
-    ).first()
-    
-    if note:
-        note.read = True
-        db.commit()
+    mark_read(db, ADMIN_OWNER, Notification.id == notification_id)
+    db.commit()
     return {"message": "Notification marked as read"}
+
+@router.post("/admin/notifications/reconcile-counts")
+def reconcile_notification_counts(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    return reconcile_unread_counters(db)
@@ -7,11 +7,15 @@ from datetime import datetime, timezone
 from app.db.session import get_db
 from app.api.v1.endpoints.auth import get_current_user_optional, get_current_user, admin_required
 from app.models.order import Order
+from app.models.archive import ArchivedOrder
 from app.models.product import Product
-from app.models.user import Notification
 from app.schemas.order import OrderCreate, OrderStatusUpdate, OrderCancellationRequest
+from app.services.notifications import create_notification, queue_order_status
 from app.utils.common import generate_id, generate_order_number
 from app.services import email as email_utils
+from app.services import popularity
+from app.services.shipments import busy_orders
+from app.services.retention import find_with_archive, list_with_archive
 
 # We need invoice generation logic. This was embedded in server.py.
 # I'll create a utility for invoice generation in app/utils/pdf.py later, or keep it here if simple.
@@ -22,21 +26,6 @@ from app.services import email as email_utils
 
 router = APIRouter()
 
-def create_notification(db: Session, user_id: str = None, type: str = "", title: str = "", message: str = "", data: dict = None, for_admin: bool = False):
-    """Helper function to create notifications"""
-    notification = Notification(
-        id=generate_id(),
-        type=type,
-        title=title,
-        message=message,
-        user_id=user_id,
-        data=data or {},
-        for_admin=for_admin,
-        read=False
-    )
-    db.add(notification)
-    return notification
-
 def create_order_tracking_notification(db: Session, user_id: str, order_id: str, status: str, message: str):
     """Create order tracking notification"""
     status_titles = {
@@ -89,8 +78,10 @@ def create_order(data: OrderCreate, request: Request, db: Session = Depends(get_
              raise HTTPException(status_code=400, detail=f"Insufficient stock for {prod.name}")
         
         price = prod.selling_price
+        is_wholesale = False
         if user and user.get("is_wholesale") and item.quantity >= prod.wholesale_min_qty:
              price = prod.wholesale_price or prod.selling_price
+             is_wholesale = prod.wholesale_price is not None
              
         item_total = price * item.quantity
         gst_amount = item_total * (prod.gst_rate / 100) if data.apply_gst else 0
@@ -103,6 +94,7 @@ def create_order(data: OrderCreate, request: Request, db: Session = Depends(get_
             "price": price,
             "total": item_total + gst_amount,
             "gst_amount": gst_amount,
+            "is_wholesale": is_wholesale,
             "image_url": prod.images[0] if prod.images else None
         })
         subtotal += item_total
@@ -132,6 +124,7 @@ def create_order(data: OrderCreate, request: Request, db: Session = Depends(get_
         updated_at=datetime.utcnow()
     )
     db.add(new_order)
+    popularity.record_sales(db, items_valid, new_order.created_at)
     
     if user:
         create_order_tracking_notification(
@@ -161,7 +154,7 @@ def create_order(data: OrderCreate, request: Request, db: Session = Depends(get_
 
 @router.get("/orders")
 def get_user_orders(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    orders = db.query(Order).filter(Order.user_id == user["id"]).order_by(Order.created_at.desc()).limit(100).all()
+    orders = list_with_archive(db, Order, limit=100, user_id=user["id"])
     
     enriched_orders = []
     for order in orders:
@@ -207,10 +200,7 @@ def get_user_orders(user: dict = Depends(get_current_user), db: Session = Depend
 
 @router.get("/orders/{order_id}")
 def get_order_by_id(order_id: str, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(
-        Order.id == order_id,
-        Order.user_id == user["id"]
-    ).first()
+    order = find_with_archive(db, Order, id=order_id, user_id=user["id"])
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -219,16 +209,17 @@ def get_order_by_id(order_id: str, user: dict = Depends(get_current_user), db: S
 
 @router.get("/admin/orders")
 def get_all_orders(
-    status: Optional[str] = None, page: int = 1, limit: int = 20, 
+    status: Optional[str] = None, page: int = 1, limit: int = 20, archived: bool = False,
     admin: dict = Depends(admin_required), db: Session = Depends(get_db)
 ):
     try:
-        query = db.query(Order) # Removed join for simplicity/robustness, can add back if needed
+        model = ArchivedOrder if archived else Order
+        query = db.query(model) # Removed join for simplicity/robustness, can add back if needed
         if status:
-            query = query.filter(Order.status == status)
+            query = query.filter(model.status == status)
         
         total = query.count()
-        orders = query.order_by(Order.created_at.desc()).offset((page-1)*limit).limit(limit).all()
+        orders = query.order_by(model.created_at.desc()).offset((page-1)*limit).limit(limit).all()
         
         orders_with_customer = []
         for order in orders:
@@ -290,6 +281,9 @@ def update_order_status(order_id: str, data: dict, admin: dict = Depends(admin_r
     
     old_status = order.status
     order.status = new_status
+    order.updated_at = datetime.utcnow()
+    queue_order_status(db, order, new_status)
+    popularity.record_status_change(db, order, old_status)
     
     if tracking_number:
         order.tracking_number = tracking_number
@@ -339,6 +333,9 @@ def cancel_order(order_id: str, data: OrderCancellationRequest, user: dict = Dep
     
     if order.status in ["delivered", "cancelled", "returned"]:
         raise HTTPException(status_code=400, detail=f"Cannot cancel order with status: {order.status}")
+
+    if busy_orders(db, [order.id]):
+        raise HTTPException(status_code=409, detail="This order has a courier request in progress; try again shortly")
     
     # ... (skipping complex shipping cancellation logic for brevity, assuming standard flow)
     # If implementing full logic, would need to import courier service here
@@ -346,6 +343,7 @@ def cancel_order(order_id: str, data: OrderCancellationRequest, user: dict = Dep
     old_status = order.status
     order.status = "cancelled"
     order.updated_at = datetime.utcnow()
+    queue_order_status(db, order, "cancelled")
     
     if not order.tracking_history:
         order.tracking_history = []
@@ -363,6 +361,7 @@ def cancel_order(order_id: str, data: OrderCancellationRequest, user: dict = Dep
         product = db.query(Product).filter(Product.id == item.get("product_id")).first()
         if product:
             product.stock_qty += item.get("quantity", 1)
+    popularity.record_status_change(db, order, old_status)
     
     if order.user_id:
         create_order_tracking_notification(
@@ -529,7 +528,7 @@ def get_invoice(order_id: str, user: dict = Depends(get_current_user), db: Sessi
     """Get professional invoice PDF for an order"""
     from app.utils.pdf import generate_invoice_pdf
     
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = find_with_archive(db, Order, id=order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
         
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, desc, asc
+from sqlalchemy import or_, desc, asc, func
 from typing import Optional, List
 from datetime import datetime
 
 from app.db.session import get_db
 from app.api.v1.endpoints.auth import admin_required
-from app.models.product import Product
+from app.models.product import Product, ProductSalesStats, ProductSalesDaily
 from app.schemas.product import ProductCreate, ProductUpdate
 from app.utils.common import generate_id
+from app.services import popularity
 
 router = APIRouter()
 
@@ -42,14 +43,26 @@ def get_products(
     if max_price:
         query = query.filter(Product.selling_price <= max_price)
         
-    sort_attr = getattr(Product, sort_by, Product.created_at)
-    if sort_order == "desc":
-        query = query.order_by(desc(sort_attr))
-    else:
-        query = query.order_by(asc(sort_attr))
-        
     total = query.count()
-    products = query.offset((page - 1) * limit).limit(limit).all()
+    
+    if sort_by == "popularity":
+        # Ranked from the maintained sales counters, never from orders
+        score = func.coalesce(ProductSalesStats.popularity_score, 0)
+        query = query.outerjoin(ProductSalesStats, ProductSalesStats.product_id == Product.id)
+        query = query.order_by(desc(score) if sort_order == "desc" else asc(score), desc(Product.created_at))
+        rows = query.add_entity(ProductSalesStats).offset((page - 1) * limit).limit(limit).all()
+        products = []
+        for product, stats in rows:
+            product_dict = {c.name: getattr(product, c.name) for c in product.__table__.columns}
+            product_dict.update(popularity.stats_dict(stats))
+            products.append(product_dict)
+    else:
+        sort_attr = getattr(Product, sort_by, Product.created_at)
+        if sort_order == "desc":
+            query = query.order_by(desc(sort_attr))
+        else:
+            query = query.order_by(asc(sort_attr))
+        products = query.offset((page - 1) * limit).limit(limit).all()
     
     return {"products": products, "total": total, "page": page, "pages": (total + limit - 1) // limit}
 
@@ -91,6 +104,8 @@ def update_product(product_id: str, data: ProductUpdate, admin: dict = Depends(a
 
 @router.delete("/admin/products/{product_id}")
 def delete_product(product_id: str, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    db.query(ProductSalesDaily).filter(ProductSalesDaily.product_id == product_id).delete()
+    db.query(ProductSalesStats).filter(ProductSalesStats.product_id == product_id).delete()
     db.query(Product).filter(Product.id == product_id).delete()
     db.commit()
     return {"message": "Product deleted"}
@@ -123,3 +138,12 @@ def bulk_upload_products(products: List[ProductCreate], admin: dict = Depends(ad
     
     db.commit()
     return {"created": created, "updated": updated, "errors": errors}
+
+@router.post("/admin/products/popularity/rebuild")
+def rebuild_product_popularity(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    """Backfill sales counters from order history (one-off, scans all orders)"""
+    return popularity.rebuild_from_orders(db)
+
+@router.post("/admin/products/popularity/refresh")
+def refresh_product_popularity(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    return popularity.refresh_windows(db)
@@ -1,33 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Header
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from app.db.session import get_db
 from app.api.v1.endpoints.auth import get_current_user, admin_required
 from app.models.order import Order, ReturnRequest
-from app.models.user import Notification
-from app.models.product import Product
-from app.schemas.order import ReturnRequestCreate, ReturnRequestUpdate
+from app.models.archive import ArchivedOrder, ArchivedReturnRequest
+from app.models.user import User
+from app.core.config import settings
+from app.schemas.order import ReturnRequestCreate, ReturnRequestUpdate, ReturnBulkAction, EvidenceUploadCreate
+from app.services import inventory, chunked_uploads
+from app.services.notifications import create_notification, bulk_create_notifications
+from app.services.retention import find_with_archive, list_with_archive
 from app.utils.common import generate_id
-from app.utils.image import save_uploaded_file
+from app.utils.image import save_uploaded_file, IMAGE_EXTENSIONS
+from app.utils.pagination import keyset_page, encode_cursor
 
 router = APIRouter()
 
-def create_notification(db: Session, user_id: str = None, type: str = "", title: str = "", message: str = "", data: dict = None, for_admin: bool = False):
-    notification = Notification(
-        id=generate_id(),
-        type=type,
-        title=title,
-        message=message,
-        user_id=user_id,
-        data=data or {},
-        for_admin=for_admin,
-        read=False
-    )
-    db.add(notification)
-    return notification
-
 def create_admin_notification(db: Session, type: str, title: str, message: str, data: dict = None):
     return create_notification(
         db=db,
@@ -135,28 +127,47 @@ def create_return_request(order_id: str, data: ReturnRequestCreate, user: dict =
 
 @router.get("/orders/{order_id}/returns")
 def get_order_returns(order_id: str, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = find_with_archive(db, Order, id=order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     if user["role"] != "admin" and order.user_id != user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    returns = db.query(ReturnRequest).filter(ReturnRequest.order_id == order_id).all()
+    returns = list_with_archive(db, ReturnRequest, order_id=order_id)
     return returns
 
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value and value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _order_summaries(db: Session, order_ids) -> dict:
+    """order_id -> (order_number, created_at) for a page of returns, live orders first, then archived."""
+    order_ids = set(order_ids)
+    summaries = {
+        row.id: (row.order_number, row.created_at)
+        for row in db.query(Order.id, Order.order_number, Order.created_at).filter(Order.id.in_(order_ids))
+    }
+    missing = order_ids - summaries.keys()
+    if missing:
+        summaries.update(
+            (row.id, (row.order_number, row.created_at))
+            for row in db.query(ArchivedOrder.id, ArchivedOrder.order_number, ArchivedOrder.created_at).filter(ArchivedOrder.id.in_(missing))
+        )
+    return summaries
+
 @router.get("/returns")
 def get_user_returns(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    returns = db.query(ReturnRequest).filter(
-        ReturnRequest.user_id == user["id"]
-    ).order_by(ReturnRequest.created_at.desc()).all()
+    returns = list_with_archive(db, ReturnRequest, user_id=user["id"])
+    orders = _order_summaries(db, (return_req.order_id for return_req in returns))
     
     enriched_returns = []
     for return_req in returns:
-        order = db.query(Order).filter(Order.id == return_req.order_id).first()
+        order_number, order_date = orders.get(return_req.order_id, ("Unknown", None))
         return_dict = {c.name: getattr(return_req, c.name) for c in return_req.__table__.columns}
-        return_dict["order_number"] = order.order_number if order else "Unknown"
-        return_dict["order_date"] = order.created_at.isoformat() if order and order.created_at else None
+        return_dict["order_number"] = order_number
+        return_dict["order_date"] = order_date.isoformat() if order_date else None
         enriched_returns.append(return_dict)
     
     return enriched_returns
@@ -164,39 +175,156 @@ def get_user_returns(user: dict = Depends(get_current_user), db: Session = Depen
 @router.get("/admin/returns")
 def get_all_returns(
     status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     page: int = 1,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    archived: bool = False,
     admin: dict = Depends(admin_required),
     db: Session = Depends(get_db)
 ):
-    query = db.query(ReturnRequest)
+    """
+    Newest first. Pass `next_cursor` back as `cursor` to page through the
+    queue; `page` is still honoured for offset paging, and `total` is only
+    computed for requests without a cursor.
+    """
+    model = ArchivedReturnRequest if archived else ReturnRequest
+    query = db.query(model)
     
     if status:
-        query = query.filter(ReturnRequest.status == status)
+        query = query.filter(model.status == status)
+    if date_from:
+        query = query.filter(model.created_at >= _naive_utc(date_from))
+    if date_to:
+        query = query.filter(model.created_at <= _naive_utc(date_to))
     
-    total = query.count()
-    returns = query.order_by(ReturnRequest.created_at.desc()).offset((page - 1) * limit).limit(limit).all()
+    total = query.count() if not cursor else None
+    if cursor or page == 1:
+        try:
+            returns, next_cursor = keyset_page(query, model.created_at, model.id, cursor, limit)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    else:
+        returns = query.order_by(model.created_at.desc(), model.id.desc()).offset((page - 1) * limit).limit(limit).all()
+        next_cursor = encode_cursor(returns[-1].created_at, returns[-1].id) if len(returns) == limit else None
+    
+    orders = _order_summaries(db, (return_req.order_id for return_req in returns))
+    customers = {
+        row.id: (row.name, row.phone)
+        for row in db.query(User.id, User.name, User.phone).filter(User.id.in_({return_req.user_id for return_req in returns}))
+    }
     
     enriched_returns = []
     for return_req in returns:
-        order = db.query(Order).filter(Order.id == return_req.order_id).first()
-        # Need user model for name, phone
-        from app.models.user import User
-        user_obj = db.query(User).filter(User.id == return_req.user_id).first()
-        
+        customer_name, customer_phone = customers.get(return_req.user_id, ("Unknown", "Unknown"))
         return_dict = {c.name: getattr(return_req, c.name) for c in return_req.__table__.columns}
-        return_dict["order_number"] = order.order_number if order else "Unknown"
-        return_dict["customer_name"] = user_obj.name if user_obj else "Unknown"
-        return_dict["customer_phone"] = user_obj.phone if user_obj else "Unknown"
+        return_dict["order_number"] = orders.get(return_req.order_id, ("Unknown", None))[0]
+        return_dict["customer_name"] = customer_name
+        return_dict["customer_phone"] = customer_phone
         enriched_returns.append(return_dict)
     
     return {
         "returns": enriched_returns,
         "total": total,
         "page": page,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit if total is not None else None,
+        "next_cursor": next_cursor
     }
 
+def _return_quantities(returns) -> dict:
+    quantities = {}
+    for return_req in returns:
+        for item in return_req.items or []:
+            product_id = item.get("product_id")
+            quantities[product_id] = quantities.get(product_id, 0) + item.get("quantity", 1)
+    return quantities
+
+# action -> (statuses it applies to, new status, notification type, title, message)
+BULK_RETURN_ACTIONS = {
+    "approve": (("pending",), "approved", "return_approved", "Return Request Approved",
+                "Your return request for order #{order_number} has been approved."),
+    "reject": (("pending",), "rejected", "return_rejected", "Return Request Rejected",
+               "Your return request for order #{order_number} has been rejected."),
+    "receive": (("approved", "pickup_scheduled", "picked_up"), "received", "return_received", "Return Received",
+                "We have received the items returned from order #{order_number}."),
+}
+
+@router.post("/admin/returns/bulk")
+def bulk_update_returns(data: ReturnBulkAction, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    """
+    Approve, reject or receive many returns in one transaction: one UPDATE
+    for the returns, one grouped restock for approvals, one bulk insert for
+    inventory logs and one for notifications. Returns not in a state the
+    action applies to are reported as skipped.
+
+    The returns are locked while they are read, so two concurrent bulk
+    actions cannot both act on (and restock) the same return.
+    """
+    from_statuses, new_status, notification_type, title, message = BULK_RETURN_ACTIONS[data.action]
+    return_ids = list(dict.fromkeys(data.return_ids))
+    returns = db.query(ReturnRequest).filter(ReturnRequest.id.in_(return_ids)).with_for_update().all()
+    by_id = {return_req.id: return_req for return_req in returns}
+    eligible = [return_req for return_req in returns if return_req.status in from_statuses]
+
+    results = []
+    for return_id in return_ids:
+        return_req = by_id.get(return_id)
+        if not return_req:
+            results.append({"id": return_id, "result": "not_found"})
+        elif return_req.status not in from_statuses:
+            results.append({"id": return_id, "result": "skipped", "reason": f"Return is {return_req.status}"})
+        else:
+            results.append({"id": return_id, "result": new_status})
+
+    restocked = {}
+    if eligible:
+        now = datetime.utcnow()
+        values = {"status": new_status, "updated_at": now, "processed_by": admin["id"]}
+        if data.action == "approve":
+            values["pickup_scheduled_date"] = now + timedelta(days=1)
+        elif data.action == "receive":
+            values["received_date"] = now
+        if data.admin_notes:
+            values["notes"] = func.coalesce(ReturnRequest.notes, "") + f"\n\nAdmin Notes: {data.admin_notes}"
+        
+        try:
+            updated = db.query(ReturnRequest).filter(
+                ReturnRequest.id.in_([return_req.id for return_req in eligible]),
+                ReturnRequest.status.in_(from_statuses)
+            ).update(values, synchronize_session=False)
+            if updated != len(eligible):
+                # Databases without row locks: another request changed some of these returns first
+                db.rollback()
+                raise HTTPException(status_code=409, detail="Some of these returns were changed by another request, please retry")
+            
+            if data.action == "approve":
+                restocked = inventory.restock(db, _return_quantities(eligible), notes="Bulk return approval", created_by=admin["id"])
+            
+            orders = _order_summaries(db, (return_req.order_id for return_req in eligible))
+            bulk_create_notifications(db, [
+                {
+                    "id": generate_id(),
+                    "type": notification_type,
+                    "title": title,
+                    "message": message.format(order_number=orders.get(return_req.order_id, ("",))[0]),
+                    "user_id": return_req.user_id,
+                    "data": {"return_id": return_req.id},
+                    "for_admin": False,
+                    "read": False,
+                    "created_at": now
+                }
+                for return_req in eligible
+            ])
+            db.commit()
+        except HTTPException:
+            raise
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+    return {"action": data.action, "updated": len(eligible), "results": results, "restocked": restocked}
+
 @router.put("/admin/returns/{return_id}")
 def update_return_request(return_id: str, data: ReturnRequestUpdate, admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
     return_request = db.query(ReturnRequest).filter(ReturnRequest.id == return_id).first()
@@ -228,11 +356,7 @@ def update_return_request(return_id: str, data: ReturnRequestUpdate, admin: dict
             return_request.pickup_scheduled_date = datetime.utcnow() + timedelta(days=1)
             
             # Restore inventory
-            if return_request.items:
-                for item in return_request.items:
-                    product = db.query(Product).filter(Product.id == item["product_id"]).first()
-                    if product:
-                        product.stock_qty += item.get("quantity", 1)
+            inventory.restock(db, _return_quantities([return_request]), notes=f"Return {return_request.id} approved", created_by=admin["id"])
         
         if data.status == "picked_up":
             return_request.pickup_completed_date = datetime.utcnow()
@@ -257,6 +381,15 @@ def update_return_request(return_id: str, data: ReturnRequestUpdate, admin: dict
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
+def _evidence_return(db: Session, return_id: str, user: dict) -> ReturnRequest:
+    return_request = db.query(ReturnRequest).filter(ReturnRequest.id == return_id).first()
+    if not return_request:
+        raise HTTPException(status_code=404, detail="Return request not found")
+    
+    if user["role"] != "admin" and return_request.user_id != user["id"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return return_request
+
 @router.post("/returns/{return_id}/evidence")
 def upload_return_evidence(
     return_id: str,
@@ -265,12 +398,7 @@ def upload_return_evidence(
     user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    return_request = db.query(ReturnRequest).filter(ReturnRequest.id == return_id).first()
-    if not return_request:
-        raise HTTPException(status_code=404, detail="Return request not found")
-    
-    if user["role"] != "admin" and return_request.user_id != user["id"]:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    return_request = _evidence_return(db, return_id, user)
     
     if len(files) > 5:
         raise HTTPException(status_code=400, detail="Maximum 5 files allowed per upload")
@@ -278,24 +406,31 @@ def upload_return_evidence(
     uploaded_files = []
     
     for file in files:
+        # Stored under the extension of an allowed content type, never the client's, so /uploads
+        # cannot serve an evidence file as a page (.html, .svg)
+        content_type = (file.content_type or "").split(";")[0].strip().lower()
         if evidence_type == "image":
-            if not file.content_type or not file.content_type.startswith('image/'):
-                continue
+            extension = IMAGE_EXTENSIONS.get(content_type)
             folder = "returns/images"
         elif evidence_type == "video":
-            if not file.content_type or not file.content_type.startswith('video/'):
-                continue
+            extension = chunked_uploads.VIDEO_EXTENSIONS.get(content_type)
             folder = "returns/videos"
         else:
             raise HTTPException(status_code=400, detail="Invalid evidence type")
+        if not extension:
+            continue
         
         try:
-            file_url = save_uploaded_file(file, folder)
+            max_bytes = settings.EVIDENCE_VIDEO_MAX_MB * 1024 * 1024 if evidence_type == "video" else None
+            file_url = save_uploaded_file(file, folder, max_bytes=max_bytes, extension=extension)
             uploaded_files.append({
                 "url": file_url,
                 "filename": file.filename,
                 "type": evidence_type
             })
+        except HTTPException:
+            # Oversized files must fail the request, not disappear from the count
+            raise
         except Exception:
             continue
     
@@ -323,9 +458,86 @@ def upload_return_evidence(
             "customer_name": user["name"]
         }
     )
+    db.commit()
     
     return {
         "message": f"Uploaded {len(uploaded_files)} {evidence_type}(s) successfully",
         "files": uploaded_files,
         "return_id": return_id
     }
+
+# Chunked, resumable evidence video uploads (see app/services/chunked_uploads.py):
+# create -> PUT chunks (any order, retry freely) -> GET to see what is missing -> complete
+
+def _evidence_upload(return_id: str, upload_id: str, user: dict) -> dict:
+    manifest = chunked_uploads.load_upload(upload_id, owner=user["id"])
+    if manifest["context"].get("return_id") != return_id:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return manifest
+
+@router.post("/returns/{return_id}/evidence/uploads")
+def create_evidence_upload(return_id: str, data: EvidenceUploadCreate, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    _evidence_return(db, return_id, user)
+    
+    manifest = chunked_uploads.create_upload(
+        owner=user["id"],
+        filename=data.filename,
+        content_type=data.content_type,
+        size=data.size,
+        max_size=settings.EVIDENCE_VIDEO_MAX_MB * 1024 * 1024,
+        allowed_types=chunked_uploads.VIDEO_EXTENSIONS,
+        sha256=data.sha256,
+        context={"return_id": return_id}
+    )
+    return chunked_uploads.upload_status(manifest)
+
+@router.get("/returns/{return_id}/evidence/uploads/{upload_id}")
+def get_evidence_upload(return_id: str, upload_id: str, user: dict = Depends(get_current_user)):
+    return chunked_uploads.upload_status(_evidence_upload(return_id, upload_id, user))
+
+@router.put("/returns/{return_id}/evidence/uploads/{upload_id}/chunks/{index}")
+async def put_evidence_chunk(
+    return_id: str,
+    upload_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: Optional[str] = Header(None),
+    user: dict = Depends(get_current_user)
+):
+    """Raw chunk bytes as the request body, with their hex SHA-256 in X-Chunk-SHA256."""
+    manifest = _evidence_upload(return_id, upload_id, user)
+    return await chunked_uploads.write_chunk(manifest, index, request.stream(), x_chunk_sha256)
+
+@router.post("/returns/{return_id}/evidence/uploads/{upload_id}/complete")
+def complete_evidence_upload(return_id: str, upload_id: str, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    manifest = _evidence_upload(return_id, upload_id, user)
+    return_request = _evidence_return(db, return_id, user)
+    
+    file_url = chunked_uploads.assemble(manifest, "returns/videos")
+    return_request.evidence_videos = (return_request.evidence_videos or []) + [file_url]
+    return_request.updated_at = datetime.utcnow()
+    
+    create_admin_notification(
+        db=db,
+        type="return_evidence",
+        title="New Return Evidence Uploaded",
+        message=f"Customer uploaded 1 video(s) for return request {return_id}",
+        data={
+            "return_id": return_id,
+            "evidence_type": "video",
+            "file_count": 1,
+            "customer_name": user["name"]
+        }
+    )
+    db.commit()
+    
+    return {
+        "message": "Uploaded 1 video(s) successfully",
+        "files": [{"url": file_url, "filename": manifest["filename"], "type": "video"}],
+        "return_id": return_id
+    }
+
+@router.delete("/returns/{return_id}/evidence/uploads/{upload_id}")
+def abort_evidence_upload(return_id: str, upload_id: str, user: dict = Depends(get_current_user)):
+    chunked_uploads.abort_upload(_evidence_upload(return_id, upload_id, user))
+    return {"message": "Upload cancelled"}
@@ -8,6 +8,8 @@ from app.api.v1.endpoints.auth import admin_required
 from app.models.settings import Settings
 from app.schemas.settings import SettingsUpdate
 from app.services import email as email_utils
+from app.services import retention
+from app.services.shipping_rates import rate_engine
 
 router = APIRouter()
 
@@ -97,6 +99,9 @@ def update_settings(data: SettingsUpdate, admin: dict = Depends(admin_required),
     settings.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(settings)
+    if data.address is not None:
+        # The business address pincode is the shipping origin for rate quotes
+        rate_engine.expire()
     
     return {"message": "Settings updated successfully"}
 
@@ -185,3 +190,17 @@ def get_admin_settings(admin: dict = Depends(admin_required), db: Session = Depe
         "youtube_url": social_links.get("youtube_url", ""),
         "whatsapp_number": social_links.get("whatsapp_number", "")
     }
+
+@router.get("/admin/retention")
+def get_retention_status(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    return {
+        "policies": [
+            {"table": policy.name, "action": policy.action, "days": policy.days, "enabled": policy.days > 0}
+            for policy in retention.default_policies()
+        ],
+        "last_run": retention.last_retention_run(db)
+    }
+
+@router.post("/admin/retention/run")
+def run_retention_now(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    return retention.run_retention(db)
@@ -10,6 +10,7 @@ from app.models.user import User, SellerRequest
 from app.schemas.user import AdminCreate
 from app.utils.common import generate_id, generate_otp
 from app.core.security import hash_password
+from app.core.principal import invalidate_principal
 from app.services import email as email_utils
 
 router = APIRouter()
@@ -70,6 +71,7 @@ def update_user(user_id: str, data: dict, admin: dict = Depends(admin_required),
     
     user.updated_at = datetime.utcnow()
     db.commit()
+    invalidate_principal(user.id)
     
     user_dict = {c.name: getattr(user, c.name) for c in user.__table__.columns}
     user_dict.pop("password", None)
@@ -87,6 +89,7 @@ def delete_user(user_id: str, admin: dict = Depends(admin_required), db: Session
     
     db.delete(user)
     db.commit()
+    invalidate_principal(user_id)
     
     return {"message": "User deleted successfully"}
 
@@ -113,6 +116,7 @@ def update_user_role(user_id: str, data: dict, admin: dict = Depends(admin_requi
         user.is_wholesale = False
     
     db.commit()
+    invalidate_principal(user.id)
     return {"message": "User role updated", "user": {"id": user.id, "name": user.name, "role": user.role}}
 
 @router.get("/admin/seller-requests")
@@ -141,6 +145,7 @@ def handle_seller_request(request_id: str, data: dict, admin: dict = Depends(adm
             user.gst_number = request.gst_number or user.gst_number
     
     db.commit()
+    invalidate_principal(request.user_id)
     return {"message": f"Request {status}"}
 
 @router.get("/admin/team")
@@ -212,6 +217,7 @@ def update_team_member_role(user_id: str, data: dict, admin: dict = Depends(admi
     
     db.commit()
     db.refresh(user)
+    invalidate_principal(user.id)
     
     user_dict = {c.name: getattr(user, c.name) for c in user.__table__.columns}
     user_dict.pop("password")
@@ -228,4 +234,5 @@ def remove_admin_access(user_id: str, admin: dict = Depends(admin_required), db:
     
     user.role = "customer"
     db.commit()
+    invalidate_principal(user.id)
     return {"message": "Admin access removed successfully"}
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from datetime import datetime
 
 from app.db.session import get_db
-from app.api.v1.endpoints.auth import get_current_user
+from app.api.v1.endpoints.auth import get_current_user, admin_required
 from app.models.product import Wishlist, WishlistCategory, Product
-from app.schemas.product import WishlistItemAdd
+from app.schemas.product import WishlistItemAdd, WishlistCheckRequest
 from app.utils.common import generate_id
+from app.services.wishlist_cache import wishlist_membership
+from app.services.wishlist_alerts import run_wishlist_alerts
 
 router = APIRouter()
 
@@ -32,16 +35,17 @@ def get_user_wishlist_categories(user: dict = Depends(get_current_user), db: Ses
             db.refresh(default_category)
             categories = [default_category]
         
+        item_counts = dict(
+            db.query(Wishlist.category_id, func.count(Wishlist.id)).filter(
+                Wishlist.user_id == user["id"]
+            ).group_by(Wishlist.category_id).all()
+        )
+        
         categories_with_count = []
         for category in categories:
             try:
                 category_dict = {c.name: getattr(category, c.name) for c in category.__table__.columns}
-                
-                item_count = db.query(Wishlist).filter(
-                    Wishlist.user_id == user["id"],
-                    Wishlist.category_id == category.id
-                ).count()
-                category_dict['item_count'] = item_count
+                category_dict['item_count'] = item_counts.get(category.id, 0)
                 
                 categories_with_count.append(category_dict)
             except Exception as e:
@@ -173,34 +177,50 @@ def delete_wishlist_category(category_id: str, user: dict = Depends(get_current_
     
     db.delete(category)
     db.commit()
+    wishlist_membership.invalidate(user["id"])
     
     return {"message": "Category deleted successfully"}
 
 @router.get("/wishlist")
 def get_user_wishlist(category_id: str = None, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    query = db.query(Wishlist).filter(
+    query = db.query(Wishlist, Product).join(
+        Product, Product.id == Wishlist.product_id
+    ).filter(
         Wishlist.user_id == user["id"]
     )
     
     if category_id:
         query = query.filter(Wishlist.category_id == category_id)
     
-    wishlist_items = query.order_by(Wishlist.created_at.desc()).all()
+    rows = query.order_by(Wishlist.created_at.desc()).all()
     
     products = []
-    for item in wishlist_items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product:
-            product_dict = {c.name: getattr(product, c.name) for c in product.__table__.columns}
-            product_dict['wishlist_id'] = item.id
-            product_dict['category_id'] = item.category_id
-            product_dict['notes'] = item.notes
-            product_dict['priority'] = item.priority
-            product_dict['added_at'] = item.created_at
-            products.append(product_dict)
+    for item, product in rows:
+        product_dict = {c.name: getattr(product, c.name) for c in product.__table__.columns}
+        product_dict['wishlist_id'] = item.id
+        product_dict['category_id'] = item.category_id
+        product_dict['notes'] = item.notes
+        product_dict['priority'] = item.priority
+        product_dict['added_at'] = item.created_at
+        products.append(product_dict)
     
     return {"wishlist": products}
 
+# Declared before /wishlist/{product_id} so "check" is not taken as a product id
+@router.post("/wishlist/check")
+def check_wishlist_status_bulk(data: WishlistCheckRequest, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    if len(data.product_ids) > 200:
+        raise HTTPException(status_code=400, detail="At most 200 product ids per request")
+    
+    membership = wishlist_membership.get(db, user["id"])
+    items = {}
+    for product_id in data.product_ids:
+        entry = membership.get(product_id)
+        if entry:
+            items[product_id] = {"id": entry[0], "category_id": entry[1]}
+    
+    return {"wishlisted": list(items), "items": items}
+
 @router.post("/wishlist/{product_id}")
 def add_to_wishlist(product_id: str, item_data: WishlistItemAdd = None, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     product = db.query(Product).filter(Product.id == product_id).first()
@@ -265,6 +285,7 @@ def add_to_wishlist(product_id: str, item_data: WishlistItemAdd = None, user: di
     
     db.add(wishlist_item)
     db.commit()
+    wishlist_membership.invalidate(user["id"])
     
     return {"message": "Product added to wishlist", "product": product}
 
@@ -300,6 +321,7 @@ def update_wishlist_item(wishlist_id: str, data: dict, user: dict = Depends(get_
         wishlist_item.priority = priority
     
     db.commit()
+    wishlist_membership.invalidate(user["id"])
     return {"message": "Wishlist item updated successfully"}
 
 @router.delete("/wishlist/{product_id}")
@@ -314,6 +336,7 @@ def remove_from_wishlist(product_id: str, user: dict = Depends(get_current_user)
     
     db.delete(wishlist_item)
     db.commit()
+    wishlist_membership.invalidate(user["id"])
     
     return {"message": "Product removed from wishlist"}
 
@@ -329,6 +352,7 @@ def clear_wishlist(category_id: str = None, user: dict = Depends(get_current_use
     
     query.delete()
     db.commit()
+    wishlist_membership.invalidate(user["id"])
     
     return {"message": message}
 
@@ -348,3 +372,8 @@ def check_wishlist_status(product_id: str, user: dict = Depends(get_current_user
             "priority": wishlist_item.priority
         } if wishlist_item else None
     }
+
+@router.post("/admin/wishlist/alerts/run")
+def trigger_wishlist_alerts(admin: dict = Depends(admin_required), db: Session = Depends(get_db)):
+    """Run the price-drop / back-in-stock alert job now instead of waiting for the scheduler"""
+    return run_wishlist_alerts(db)
@@ -13,8 +13,125 @@ class Config:
     JWT_ALGORITHM = "HS256"
     
     DELHIVERY_TOKEN = os.environ.get('DELHIVERY_TOKEN', 'ac9b6a862cffeba552eeb07729e40e692b7a3fd8')
+    DELHIVERY_BASE_URL = os.environ.get('DELHIVERY_BASE_URL', 'https://track.delhivery.com').rstrip('/')
+    DELHIVERY_CONNECT_TIMEOUT = float(os.environ.get('DELHIVERY_CONNECT_TIMEOUT', '3.05'))
+    DELHIVERY_READ_TIMEOUT = float(os.environ.get('DELHIVERY_READ_TIMEOUT', '10'))
+    DELHIVERY_MAX_RETRIES = int(os.environ.get('DELHIVERY_MAX_RETRIES', '2'))
+    DELHIVERY_POOL_SIZE = int(os.environ.get('DELHIVERY_POOL_SIZE', '20'))
+    DELHIVERY_BREAKER_FAILURES = int(os.environ.get('DELHIVERY_BREAKER_FAILURES', '5'))
+    DELHIVERY_BREAKER_RESET_SECONDS = float(os.environ.get('DELHIVERY_BREAKER_RESET_SECONDS', '30'))
+
+    # Local pincode serviceability table (app/services/pincodes.py); 0 hours disables the scheduled pull
+    PINCODE_REFRESH_HOURS = float(os.environ.get('PINCODE_REFRESH_HOURS', '24'))
+    PINCODE_CACHE_TTL_SECONDS = float(os.environ.get('PINCODE_CACHE_TTL_SECONDS', '900'))
+    PINCODE_MISS_WAIT_SECONDS = float(os.environ.get('PINCODE_MISS_WAIT_SECONDS', '2'))
+
+    # Shipment tracking poller (app/services/tracking.py); 0 minutes disables it. The packages
+    # API takes up to 50 waybills per call; TRACKING_RATE_PER_MINUTE caps calls across threads.
+    TRACKING_POLL_MINUTES = float(os.environ.get('TRACKING_POLL_MINUTES', '30'))
+    TRACKING_BATCH_SIZE = int(os.environ.get('TRACKING_BATCH_SIZE', '50'))
+    TRACKING_POLL_CONCURRENCY = int(os.environ.get('TRACKING_POLL_CONCURRENCY', '4'))
+    TRACKING_RATE_PER_MINUTE = float(os.environ.get('TRACKING_RATE_PER_MINUTE', '60'))
+
+    # Courier status pushes (POST /courier/webhooks/delhivery), signed with HMAC-SHA256 of the
+    # body; the endpoint is disabled while the secret is empty
+    DELHIVERY_WEBHOOK_SECRET = os.environ.get('DELHIVERY_WEBHOOK_SECRET', '')
+    WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', '10000'))
+    WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '200'))
+    WEBHOOK_MAX_BYTES = int(os.environ.get('WEBHOOK_MAX_BYTES', str(1024 * 1024)))
+    # Stored pushes whose batch failed to apply are retried this often
+    WEBHOOK_RETRY_MINUTES = float(os.environ.get('WEBHOOK_RETRY_MINUTES', '5'))
     
     # Add other config variables here
     UPLOAD_DIR = Path("uploads")
 
+    # Analytics cube is re-synced from orders at most this often (seconds)
+    ANALYTICS_REFRESH_SECONDS = float(os.environ.get('ANALYTICS_REFRESH_SECONDS', '30'))
+
+    # Background maintenance jobs (app/services/scheduler.py)
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+    # A run holds its job's lease at least this long, so a slow run is not started again by
+    # another process; the lease of a process that died mid-run expires after this
+    SCHEDULER_LEASE_MINUTES = float(os.environ.get('SCHEDULER_LEASE_MINUTES', '30'))
+
+    # Product popularity (app/services/popularity.py)
+    POPULARITY_HALF_LIFE_DAYS = float(os.environ.get('POPULARITY_HALF_LIFE_DAYS', '7'))
+    POPULARITY_REFRESH_MINUTES = float(os.environ.get('POPULARITY_REFRESH_MINUTES', '60'))
+
+    # Authenticated user lookups are cached per process for this long (0 disables)
+    PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+
+    # Password hashing (app/core/security.py)
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+    HASH_WORKERS = int(os.environ.get('HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+    HASH_QUEUE_LIMIT = int(os.environ.get('HASH_QUEUE_LIMIT', '4'))
+    # Size of the threadpool sync endpoints run on (Starlette/AnyIO default: 40); password
+    # hashing may occupy at most a quarter of it, whatever HASH_WORKERS + HASH_QUEUE_LIMIT say
+    REQUEST_THREADPOOL_SIZE = int(os.environ.get('REQUEST_THREADPOOL_SIZE', '40'))
+
+    # OTPs (app/services/otp_store.py): "db" works across workers, "memory" is per process
+    OTP_STORE = os.environ.get('OTP_STORE', 'db').lower()
+    OTP_TTL_MINUTES = float(os.environ.get('OTP_TTL_MINUTES', '10'))
+    OTP_MAX_ATTEMPTS = int(os.environ.get('OTP_MAX_ATTEMPTS', '5'))
+    OTP_SWEEP_MINUTES = float(os.environ.get('OTP_SWEEP_MINUTES', '15'))
+
+    # Auth rate limiting (app/core/rate_limit.py): store is "memory" (per process) or "redis" (shared)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory').lower()
+    RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+    RATE_LIMIT_TRUST_FORWARDED = os.environ.get('RATE_LIMIT_TRUST_FORWARDED', 'false').lower() == 'true'
+
+    # Per-user wishlist membership cache used by POST /wishlist/check (0 disables)
+    WISHLIST_CACHE_TTL_SECONDS = float(os.environ.get('WISHLIST_CACHE_TTL_SECONDS', '60'))
+
+    # Wishlist price-drop / back-in-stock alerts (app/services/wishlist_alerts.py)
+    WISHLIST_ALERTS_MINUTES = float(os.environ.get('WISHLIST_ALERTS_MINUTES', '15'))
+    WISHLIST_ALERT_EMAILS = os.environ.get('WISHLIST_ALERT_EMAILS', 'false').lower() == 'true'
+    PRICE_DROP_MIN_PERCENT = float(os.environ.get('PRICE_DROP_MIN_PERCENT', '1'))
+
+    # Unread notification counters (app/services/notifications.py)
+    NOTIFICATION_COUNT_CACHE_SECONDS = float(os.environ.get('NOTIFICATION_COUNT_CACHE_SECONDS', '5'))
+    NOTIFICATION_RECONCILE_MINUTES = float(os.environ.get('NOTIFICATION_RECONCILE_MINUTES', '60'))
+
+    # Server-sent events (GET /notifications/stream). Set SSE_POLL_SECONDS when
+    # running several workers so events committed in another process are delivered.
+    SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '25'))
+    SSE_POLL_SECONDS = float(os.environ.get('SSE_POLL_SECONDS', '0'))
+    # notifications.created_at is stamped before commit, so the poller and Last-Event-ID resume
+    # re-read this far behind their position to catch rows whose transaction committed late
+    SSE_COMMIT_OVERLAP_SECONDS = float(os.environ.get('SSE_COMMIT_OVERLAP_SECONDS', '60'))
+
+    # Retention / archival (app/services/retention.py); 0 days disables a policy
+    RETENTION_HOURS = float(os.environ.get('RETENTION_HOURS', '24'))
+    NOTIFICATION_RETENTION_DAYS = float(os.environ.get('NOTIFICATION_RETENTION_DAYS', '90'))
+    ORDER_ARCHIVE_DAYS = float(os.environ.get('ORDER_ARCHIVE_DAYS', '365'))
+    RETURN_ARCHIVE_DAYS = float(os.environ.get('RETURN_ARCHIVE_DAYS', '365'))
+    RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', '500'))
+    RETENTION_BATCH_PAUSE_MS = float(os.environ.get('RETENTION_BATCH_PAUSE_MS', '50'))
+    RETENTION_MAX_SECONDS = float(os.environ.get('RETENTION_MAX_SECONDS', '300'))
+
+    # Uploads: single-request limit, and chunked uploads for return evidence videos
+    UPLOAD_MAX_MB = int(os.environ.get('UPLOAD_MAX_MB', '10'))
+    EVIDENCE_VIDEO_MAX_MB = int(os.environ.get('EVIDENCE_VIDEO_MAX_MB', '200'))
+    UPLOAD_CHUNK_MB = int(os.environ.get('UPLOAD_CHUNK_MB', '5'))
+    UPLOAD_SESSION_HOURS = float(os.environ.get('UPLOAD_SESSION_HOURS', '24'))
+
+    # Background jobs (app/services/jobs.py): bulk runs and single courier calls have separate pools
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+    JOB_QUEUE_LIMIT = int(os.environ.get('JOB_QUEUE_LIMIT', '20'))
+    COURIER_JOB_WORKERS = int(os.environ.get('COURIER_JOB_WORKERS', '4'))
+    COURIER_JOB_QUEUE_LIMIT = int(os.environ.get('COURIER_JOB_QUEUE_LIMIT', '200'))
+    JOB_STALE_MINUTES = float(os.environ.get('JOB_STALE_MINUTES', '30'))
+    JOB_RETENTION_DAYS = float(os.environ.get('JOB_RETENTION_DAYS', '30'))
+
+    # Bulk shipping: orders per Delhivery manifest call (app/services/shipments.py)
+    SHIP_BATCH_SIZE = int(os.environ.get('SHIP_BATCH_SIZE', '25'))
+
+    # Local shipping rates and delivery estimates (app/services/shipping_rates.py).
+    # The origin defaults to the business address pincode; the rate card file overrides DEFAULT_RATE_CARD keys.
+    SHIPPING_ORIGIN_PINCODE = os.environ.get('SHIPPING_ORIGIN_PINCODE', '')
+    SHIPPING_RATE_CARD_PATH = os.environ.get('SHIPPING_RATE_CARD_PATH', '')
+    SHIPPING_DEFAULT_WEIGHT_GRAMS = float(os.environ.get('SHIPPING_DEFAULT_WEIGHT_GRAMS', '500'))
+    SHIPPING_VOLUMETRIC_DIVISOR = float(os.environ.get('SHIPPING_VOLUMETRIC_DIVISOR', '5000'))
+
 settings = Config()
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.user import User
+
+# Columns copied onto the principal; the password hash is deliberately left out
+PRINCIPAL_FIELDS = (
+    "id", "phone", "name", "email", "role", "gst_number", "is_gst_verified",
+    "is_wholesale", "is_seller", "supplier_status", "address", "addresses",
+    "created_at", "updated_at"
+)
+
+class Principal:
+    """
+    The authenticated user as seen by endpoints.
+
+    Supports the dict-style access (`user["id"]`, `user.get("role")`) that
+    endpoints already use, so it is a drop-in replacement for the old
+    per-request column dict.
+    """
+    __slots__ = PRINCIPAL_FIELDS
+
+    def __init__(self, user: User):
+        for field in PRINCIPAL_FIELDS:
+            setattr(self, field, getattr(user, field))
+        if self.addresses is None:
+            self.addresses = []
+
+    def __getitem__(self, key):
+        if key not in PRINCIPAL_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in PRINCIPAL_FIELDS
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in PRINCIPAL_FIELDS else default
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in PRINCIPAL_FIELDS}
+
+class PrincipalCache:
+    """
+    Process-level user_id -> Principal cache with a TTL.
+
+    Endpoints that change a user's profile or role call `invalidate()`; the
+    TTL bounds staleness for changes made by other worker processes. Least
+    recently used users are evicted beyond `max_users`.
+    """
+
+    def __init__(self, ttl_seconds: float, max_users: int = 50_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, user_id: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, principal: Principal):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries), "max_users": self.max_users, "evicted": self.evicted,
+            "hits": self.hits, "misses": self.misses, "ttl_seconds": self.ttl_seconds
+        }
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+def load_principal(db: Session, user_id: str) -> Optional[Principal]:
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+        principal = Principal(user)
+        principal_cache.put(principal)
+    return principal
+
+def invalidate_principal(user_id: str):
+    principal_cache.invalidate(user_id)
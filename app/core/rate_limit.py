@@ -0,0 +1,239 @@
+"""
+Token-bucket rate limiting for abuse-prone auth routes.
+
+Each policy applies to one route and holds one or more limits. A limit is a
+bucket of `capacity` tokens refilled at `capacity / period` tokens per
+second, keyed either by client IP or by an identifier taken from the JSON
+body (phone, email, ...). A request spends one token from every matching
+bucket and is rejected with 429 and Retry-After when any bucket is empty.
+
+Buckets live in process memory by default. Set RATE_LIMIT_STORE=redis (and
+RATE_LIMIT_REDIS_URL) to share them across workers; the optional `redis`
+package is only imported in that case.
+"""
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Sequence, Tuple
+
+from app.core.config import settings
+
+class Limit:
+    __slots__ = ("key", "capacity", "period", "rate", "fields")
+
+    def __init__(self, key: str, capacity: int, period: float, fields: Sequence[str] = ()):
+        """`key` is "ip" or "identifier"; identifier limits read the first present body field in `fields`."""
+        self.key = key
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self.fields = tuple(fields)
+
+# (method, path) -> limits. Paths include the /api prefix.
+RATE_LIMIT_POLICIES: Dict[Tuple[str, str], Tuple[Limit, ...]] = {
+    ("POST", "/api/auth/send-otp"): (
+        Limit("ip", capacity=10, period=60),
+        Limit("identifier", capacity=3, period=600, fields=("phone",)),
+    ),
+    ("POST", "/api/auth/login"): (
+        Limit("ip", capacity=20, period=60),
+        Limit("identifier", capacity=5, period=300, fields=("identifier",)),
+    ),
+    ("POST", "/api/auth/forgot-password"): (
+        Limit("ip", capacity=5, period=60),
+        Limit("identifier", capacity=3, period=3600, fields=("email", "phone")),
+    ),
+}
+
+class MemoryBucketStore:
+    """
+    Buckets as key -> [tokens, updated_at, capacity, rate] in an OrderedDict
+    kept in least-recently-used order. At `max_keys` the least recently used
+    bucket is evicted: it is the most likely to have refilled, and busy
+    (throttled) buckets stay, so rotating keys cannot reset anyone's limit.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        """Spend one token; returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                while len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+                self._buckets[key] = [capacity - 1, now, capacity, rate]
+                return 0.0
+            self._buckets.move_to_end(key)
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+
+class TokenBucket:
+    """
+    Blocking bucket for outbound calls made from worker threads (e.g. the
+    tracking poller against the courier's rate limit). Same refill rule as
+    the stores above; `acquire` sleeps until a token is available.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Spend one token, waiting for it if needed; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+class RedisBucketStore:
+    """Shared buckets for multi-worker deployments; each take is one atomic Lua call."""
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis_asyncio
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        wait = await self._script(keys=[f"ratelimit:{key}"], args=[capacity, rate, time.time()])
+        return float(wait)
+
+def create_store():
+    if settings.RATE_LIMIT_STORE == "redis":
+        return RedisBucketStore(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryBucketStore()
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware; requests to routes without a policy pass straight through."""
+
+    def __init__(self, app, policies: Dict[Tuple[str, str], Tuple[Limit, ...]] = None, store=None):
+        self.app = app
+        self.policies = RATE_LIMIT_POLICIES if policies is None else policies
+        self.store = store or create_store()
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        limits = self.policies.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if not limits:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        wait = 0.0
+        for limit in limits:
+            if limit.key == "ip":
+                wait = max(wait, await self.store.take(f"{path}:ip:{self._client_ip(scope)}", limit.capacity, limit.rate))
+
+        identifier_limits = [limit for limit in limits if limit.key == "identifier"]
+        if identifier_limits and not wait:
+            body = await self._read_body(receive)
+            receive = self._replay(body, receive)
+            payload = self._parse(body)
+            for limit in identifier_limits:
+                identifier = next((str(payload[field]).strip().lower() for field in limit.fields if payload.get(field)), None)
+                if identifier:
+                    wait = max(wait, await self.store.take(f"{path}:id:{identifier}", limit.capacity, limit.rate))
+
+        if wait:
+            self.rejected += 1
+            await self._reject(send, wait)
+            return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _client_ip(scope) -> str:
+        if settings.RATE_LIMIT_TRUST_FORWARDED:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    def _replay(body: bytes, receive):
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+        return replay
+
+    @staticmethod
+    def _parse(body: bytes) -> dict:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return {}
+        return payload if isinstance(payload, dict) else {}
+
+    @staticmethod
+    async def _reject(send, wait: float):
+        body = json.dumps({"detail": "Too many requests. Please try again later."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
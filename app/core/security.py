@@ -1,14 +1,118 @@
 import bcrypt
 import jwt
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from typing import Optional
+from fastapi import HTTPException
 from app.core.config import settings
 
+class HashingExecutor:
+    """
+    Dedicated, bounded pool for bcrypt work.
+
+    bcrypt releases the GIL, so hashing on `workers` threads uses that many
+    cores and no more. Callers are sync endpoints and block one request
+    threadpool thread each until their hash is done, so at most
+    `workers + queue_limit` are admitted at once, capped at `max_admitted`
+    (a quarter of the request threadpool); beyond that requests are rejected
+    with 503 instead of parking ever more of the shared threadpool behind a
+    CPU-bound queue.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, max_admitted: int):
+        self.workers = max(1, min(workers, max_admitted))
+        self.queue_limit = max(0, min(queue_limit, max_admitted - self.workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_limit)
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_wait = 0.0
+        self.total_hash_time = 0.0
+        self.max_wait = 0.0
+
+    def run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        with self._lock:
+            self.admitted += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        submitted = time.perf_counter()
+        try:
+            started, result = self._executor.submit(self._timed, func, args).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.in_flight -= 1
+        finished = time.perf_counter()
+        with self._lock:
+            wait = started - submitted
+            self.completed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_hash_time += finished - started
+        return result
+
+    @staticmethod
+    def _timed(func, args):
+        return time.perf_counter(), func(*args)
+
+    def metrics(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "max_admitted": self.workers + self.queue_limit,
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+            "max_in_flight": self.max_in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "avg_wait_ms": round(self.total_wait / completed * 1000, 2),
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "avg_hash_ms": round(self.total_hash_time / completed * 1000, 2)
+        }
+
+hashing_executor = HashingExecutor(
+    settings.HASH_WORKERS, settings.HASH_QUEUE_LIMIT, max_admitted=max(1, settings.REQUEST_THREADPOOL_SIZE // 4)
+)
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)).decode()
+
+def _check(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return hashing_executor.run(_hash, password, settings.BCRYPT_ROUNDS)
 
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+    return hashing_executor.run(_check, password, hashed)
+
+def needs_rehash(hashed: str) -> bool:
+    """True if a stored hash uses an older bcrypt variant or a different work factor."""
+    # Modular crypt format: $2b$12$<salt+digest>
+    parts = (hashed or "").split("$")
+    if len(parts) != 4 or parts[1] != "2b":
+        return True
+    try:
+        return int(parts[2]) != settings.BCRYPT_ROUNDS
+    except ValueError:
+        return True
 
 def create_token(user_id: str, role: str) -> str:
     payload = {
@@ -0,0 +1,17 @@
+from sqlalchemy import update, insert, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+def increment_counter(db: Session, table, key: dict, deltas: dict, extra: dict = None):
+    """UPDATE ... SET col = col + delta, inserting the row first time it is seen."""
+    condition = and_(*[table.c[name] == value for name, value in key.items()])
+    values = {name: table.c[name] + delta for name, delta in deltas.items()}
+    values.update(extra or {})
+    if db.execute(update(table).where(condition).values(**values)).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(table).values(**key, **deltas, **(extra or {})))
+    except IntegrityError:
+        # Another transaction created the row between our UPDATE and INSERT
+        db.execute(update(table).where(condition).values(**values))
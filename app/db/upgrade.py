@@ -0,0 +1,37 @@
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.db.base import Base
+
+logger = logging.getLogger(__name__)
+
+def sync_schema(engine: Engine):
+    """
+    Bring an existing database up to the current models.
+
+    `create_all` only creates missing tables, so columns and indexes added to
+    a model later never reach databases created before the change. This adds
+    them: missing columns are added as nullable (existing rows read as NULL,
+    so code must treat NULL like the column default), and missing indexes are
+    created. Columns are never dropped or altered.
+    """
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or column.primary_key:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=connection, checkfirst=True)
+                    logger.info(f"Created index {index.name}")
@@ -5,6 +5,7 @@ from pathlib import Path
 import os
 import logging
 from dotenv import load_dotenv
+import anyio
 import uvicorn
 
 # Load env variables
@@ -14,12 +15,17 @@ load_dotenv(ROOT_DIR / '.env')
 from app.api.v1.api import api_router
 from app.db.base import Base
 from app.db.session import engine
+from app.db.upgrade import sync_schema
+from app.core.config import settings as config_settings
+from app.core.rate_limit import RateLimitMiddleware
+from app.services import scheduler, popularity, wishlist_alerts, notifications, retention, chunked_uploads, pincodes, tracking, courier_webhooks, jobs
+from app.services.otp_store import otp_store
 
 # Import all models to ensure they are registered with Base.metadata
 from app.models import user, product, order, content, settings
 
-# Create Tables
-Base.metadata.create_all(bind=engine)
+# Create tables, plus columns/indexes added to models since the database was created
+sync_schema(engine)
 
 app = FastAPI(title="BharatBazaar API")
 
@@ -28,6 +34,10 @@ UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+# Rate limiting sits inside CORS so 429 responses still carry CORS headers
+if config_settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -39,6 +49,49 @@ app.add_middleware(
 
 app.include_router(api_router, prefix="/api")
 
+@app.on_event("startup")
+async def size_request_threadpool():
+    # Sync endpoints run on AnyIO's default thread limiter; the hashing executor's admission cap is derived from it
+    anyio.to_thread.current_default_thread_limiter().total_tokens = config_settings.REQUEST_THREADPOOL_SIZE
+
+@app.on_event("startup")
+def start_background_jobs():
+    if not config_settings.SCHEDULER_ENABLED:
+        return
+    scheduler.register_job("product_sales_windows", config_settings.POPULARITY_REFRESH_MINUTES * 60, popularity.refresh_windows)
+    scheduler.register_job("otp_sweep", config_settings.OTP_SWEEP_MINUTES * 60, otp_store.sweep)
+    scheduler.register_job("wishlist_alerts", config_settings.WISHLIST_ALERTS_MINUTES * 60, wishlist_alerts.run_wishlist_alerts)
+    # Reconciled once shortly after startup too, which also seeds counters on existing databases
+    scheduler.register_job("notification_counters", config_settings.NOTIFICATION_RECONCILE_MINUTES * 60, notifications.reconcile_unread_counters, initial_delay=5)
+    scheduler.register_job("retention", config_settings.RETENTION_HOURS * 3600, retention.run_retention)
+    scheduler.register_job("chunked_upload_sweep", 3600, chunked_uploads.sweep_stale_uploads)
+    # Checked soon after startup; skipped if the table was refreshed recently
+    scheduler.register_job("pincode_refresh", config_settings.PINCODE_REFRESH_HOURS * 3600, pincodes.refresh_from_api, initial_delay=60)
+    scheduler.register_job("tracking_poll", config_settings.TRACKING_POLL_MINUTES * 60, tracking.poll_shipments)
+    scheduler.register_job("stale_jobs", 600, jobs.fail_stale_jobs)
+    scheduler.register_job("courier_event_retry", config_settings.WEBHOOK_RETRY_MINUTES * 60, courier_webhooks.apply_pending_events)
+    scheduler.start_scheduler()
+
+@app.on_event("startup")
+async def start_event_poller():
+    notifications.notification_poller.start()
+
+@app.on_event("startup")
+def start_webhook_worker():
+    courier_webhooks.webhook_queue.start()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    scheduler.stop_scheduler()
+
+@app.on_event("shutdown")
+async def stop_event_poller():
+    notifications.notification_poller.stop()
+
+@app.on_event("shutdown")
+def stop_webhook_worker():
+    courier_webhooks.webhook_queue.stop()
+
 @app.get("/")
 def root():
     return {"message": "BharatBazaar API (SQL)", "version": "2.0.0"}
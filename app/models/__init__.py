@@ -1,6 +1,7 @@
 from app.db.base import Base
-from app.models.user import User, OTP, Notification, SellerRequest
-from app.models.product import Category, Product, InventoryLog, WishlistCategory, Wishlist
-from app.models.order import Order, ReturnRequest, OrderCancellation
+from app.models.user import User, OTP, Notification, NotificationCounter, SellerRequest
+from app.models.product import Category, Product, InventoryLog, WishlistCategory, Wishlist, ProductSalesStats, ProductSalesDaily, ProductAlertState
+from app.models.order import Order, ReturnRequest, OrderCancellation, CourierEvent
 from app.models.content import Banner, Offer, Page
-from app.models.settings import Settings, Courier, PaymentGateway
+from app.models.settings import Settings, Courier, PaymentGateway, JobCheckpoint, PincodeServiceability, BackgroundJob
+from app.models.archive import ArchivedOrder, ArchivedReturnRequest, ArchivedOrderCancellation
@@ -0,0 +1,34 @@
+"""
+Archive copies of cold rows moved out of the hot tables by
+app/services/retention.py. Each archive table has the live table's columns
+(without foreign keys, so rows can move independently) plus `archived_at`,
+and columns added to the live model later reach the archive through
+sync_schema as well.
+"""
+from sqlalchemy import Column, DateTime, Index, Table
+from app.db.base import Base
+from app.models.order import Order, ReturnRequest, OrderCancellation
+
+def archive_table(live: Table, name: str, *indexes) -> Table:
+    columns = [Column(column.name, column.type, primary_key=column.primary_key) for column in live.columns]
+    return Table(name, Base.metadata, *columns, Column("archived_at", DateTime, index=True), *indexes)
+
+class ArchivedOrder(Base):
+    __table__ = archive_table(
+        Order.__table__, "archived_orders",
+        Index("ix_archived_orders_user_created", "user_id", "created_at"),
+        Index("ix_archived_orders_number", "order_number"),
+    )
+
+class ArchivedReturnRequest(Base):
+    __table__ = archive_table(
+        ReturnRequest.__table__, "archived_returns",
+        Index("ix_archived_returns_user_created", "user_id", "created_at"),
+        Index("ix_archived_returns_order", "order_id"),
+    )
+
+class ArchivedOrderCancellation(Base):
+    __table__ = archive_table(
+        OrderCancellation.__table__, "archived_order_cancellations",
+        Index("ix_archived_order_cancellations_order", "order_id"),
+    )
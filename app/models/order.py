@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Boolean, ForeignKey, DateTime, Text, JSON
+from sqlalchemy import Column, String, Float, Boolean, ForeignKey, DateTime, Text, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 from datetime import datetime
@@ -35,15 +35,29 @@ class Order(Base):
     courier_provider = Column(String(50), nullable=True)
     
     tracking_history = Column(JSON, default=list)
+    # Latest courier status/location/ETA and when the courier was last asked (app/services/tracking.py)
+    tracking_summary = Column(JSON, nullable=True)
+    tracking_checked_at = Column(DateTime, nullable=True)
     notes = Column(JSON, default=list)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="orders")
 
+    __table_args__ = (
+        # Tracking poller: in-transit orders, least recently checked first
+        Index("ix_orders_status_tracking", "status", "tracking_checked_at"),
+    )
+
 class ReturnRequest(Base):
     __tablename__ = "returns"
+    __table_args__ = (
+        # Admin returns queue: status filter + newest first / date range
+        Index("ix_returns_status_created", "status", "created_at"),
+        Index("ix_returns_order", "order_id"),
+        Index("ix_returns_user_created", "user_id", "created_at"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     order_id = Column(String(36), ForeignKey("orders.id"))
@@ -96,3 +110,22 @@ class OrderCancellation(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+
+class CourierEvent(Base):
+    """One courier status push, stored once per (awb, scan_time) (app/services/courier_webhooks.py)"""
+    __tablename__ = "courier_events"
+    __table_args__ = (
+        UniqueConstraint("awb", "scan_time", name="uq_courier_events_awb_scan"),
+        Index("ix_courier_events_received", "received_at"),
+    )
+    
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    awb = Column(String(50), nullable=False)
+    scan_time = Column(String(40), nullable=False)  # as sent by the courier
+    status = Column(String(100), nullable=True)
+    status_type = Column(String(10), nullable=True)
+    location = Column(String(200), nullable=True)
+    payload = Column(JSON, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    applied_at = Column(DateTime, nullable=True)
+    result = Column(String(20), nullable=True)  # order, return, unmatched, failed; NULL until applied
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, ForeignKey, DateTime, Text, JSON
+from sqlalchemy import Column, String, Integer, Float, Boolean, ForeignKey, DateTime, Date, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 from datetime import datetime
@@ -50,7 +50,7 @@ class Product(Base):
     is_active = Column(Boolean, default=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     category = relationship("Category", back_populates="products")
 
@@ -86,6 +86,12 @@ class WishlistCategory(Base):
 
 class Wishlist(Base):
     __tablename__ = "wishlists"
+    __table_args__ = (
+        # Listing/counting a user's wishlist by category, newest first
+        Index("ix_wishlists_user_category_created", "user_id", "category_id", "created_at"),
+        # "Is this product in the user's wishlist?" checks
+        Index("ix_wishlists_user_product", "user_id", "product_id"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     user_id = Column(String(36), ForeignKey("users.id"))
@@ -99,3 +105,32 @@ class Wishlist(Base):
     user = relationship("User")
     product = relationship("Product")
     category = relationship("WishlistCategory", back_populates="wishlist_items")
+
+class ProductSalesStats(Base):
+    __tablename__ = "product_sales_stats"
+    
+    product_id = Column(String(36), ForeignKey("products.id"), primary_key=True)
+    units_7d = Column(Integer, default=0)
+    units_30d = Column(Integer, default=0)
+    units_90d = Column(Integer, default=0)
+    units_total = Column(Integer, default=0)
+    # Forward-decayed score, see app/services/popularity.py
+    popularity_score = Column(Float, default=0, index=True)
+    last_sold_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ProductSalesDaily(Base):
+    __tablename__ = "product_sales_daily"
+    
+    product_id = Column(String(36), ForeignKey("products.id"), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    units = Column(Integer, default=0)
+
+class ProductAlertState(Base):
+    """Price/stock last seen by the wishlist alert job, see app/services/wishlist_alerts.py"""
+    __tablename__ = "product_alert_states"
+    
+    product_id = Column(String(36), ForeignKey("products.id"), primary_key=True)
+    selling_price = Column(Float)
+    stock_qty = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, JSON
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, JSON, Index
 from app.db.base import Base
 from datetime import datetime
 import uuid
@@ -44,3 +44,58 @@ class Settings(Base):
     configs = Column(JSON, nullable=True) # invoice_prefix, etc
     
     updated_at = Column(DateTime, default=datetime.utcnow)
+
+class JobCheckpoint(Base):
+    """
+    Watermark of an incremental background job (last processed timestamp),
+    and the scheduler lease of the periodic job with the same name
+    """
+    __tablename__ = "job_checkpoints"
+    
+    name = Column(String(50), primary_key=True)
+    watermark = Column(DateTime, nullable=True)
+    data = Column(JSON, nullable=True)
+    lease_owner = Column(String(100), nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PincodeServiceability(Base):
+    """Local copy of the courier's pincode list (app/services/pincodes.py)"""
+    __tablename__ = "pincode_serviceability"
+    
+    pincode = Column(String(6), primary_key=True)
+    serviceable = Column(Boolean, default=True)
+    cod = Column(Boolean, default=False)
+    prepaid = Column(Boolean, default=False)
+    pickup = Column(Boolean, default=False)
+    cash_pickup = Column(Boolean, default=False)
+    repl = Column(Boolean, default=False)
+    city = Column(String(100), nullable=True)
+    state = Column(String(50), nullable=True)
+    district = Column(String(100), nullable=True)
+    source = Column(String(20), nullable=True)  # api, lookup, import
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class BackgroundJob(Base):
+    """A long admin operation run off the request thread (app/services/jobs.py)"""
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        Index("ix_background_jobs_kind_status", "kind", "status"),
+        Index("ix_background_jobs_created", "created_at"),
+    )
+    
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    kind = Column(String(50))  # bulk_ship, ...
+    status = Column(String(20), default="queued")  # queued, running, completed, failed
+    params = Column(JSON, nullable=True)
+    created_by = Column(String(36), nullable=True)
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    succeeded = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    results = Column(JSON, nullable=True)  # per-item outcomes
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
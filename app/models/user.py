@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, Text, JSON
+from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 from datetime import datetime
@@ -35,15 +35,25 @@ class User(Base):
 
 class OTP(Base):
     __tablename__ = "otps"
+    __table_args__ = (
+        Index("ix_otps_phone_expiry", "phone", "expiry"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     phone = Column(String(15), index=True)
     otp = Column(String(6))
     expiry = Column(DateTime)
     verified = Column(Boolean, default=False)
+    attempts = Column(Integer, default=0)  # failed verifications since the OTP was issued
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # User inbox listing/paging (optionally unread only) and bulk updates
+        Index("ix_notifications_user_inbox", "user_id", "for_admin", "read", "created_at"),
+        # Shared admin inbox, which has no user_id
+        Index("ix_notifications_admin_inbox", "for_admin", "read", "created_at"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     type = Column(String(50))
@@ -53,7 +63,15 @@ class Notification(Base):
     data = Column(JSON, nullable=True)
     for_admin = Column(Boolean, default=False)
     read = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class NotificationCounter(Base):
+    """Unread notification count per inbox, maintained by app/services/notifications.py"""
+    __tablename__ = "notification_counters"
+    
+    owner = Column(String(36), primary_key=True)  # user id, or "admin" for the shared admin inbox
+    unread = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class SellerRequest(Base):
     __tablename__ = "seller_requests"
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Literal
+from typing_extensions import Annotated
+from datetime import date
 
 class CartItem(BaseModel):
     product_id: str
@@ -48,3 +50,43 @@ class ReturnRequestUpdate(BaseModel):
     refund_amount: Optional[float] = None
     return_awb: Optional[str] = None
     courier_provider: Optional[str] = None
+
+class ReturnBulkAction(BaseModel):
+    return_ids: List[str] = Field(..., min_length=1, max_length=500)
+    action: Literal["approve", "reject", "receive"]
+    admin_notes: Optional[str] = None
+
+class BulkShipRequest(BaseModel):
+    order_ids: List[str] = Field(..., min_length=1, max_length=500)
+
+# Upper bounds for rate quotes; without them "inf" parses as a float and breaks the slab maths
+MAX_PARCEL_GRAMS = 1_000_000
+MAX_PARCEL_CM = 1_000
+MAX_ORDER_VALUE = 100_000_000
+
+class RateQuoteItem(BaseModel):
+    pincode: str
+    weight_grams: Optional[float] = Field(None, gt=0, le=MAX_PARCEL_GRAMS, allow_inf_nan=False)
+    payment_method: Literal["prepaid", "cod"] = "prepaid"
+    order_value: float = Field(0, ge=0, le=MAX_ORDER_VALUE, allow_inf_nan=False)
+    # length, breadth, height
+    dimensions_cm: Optional[List[Annotated[float, Field(gt=0, le=MAX_PARCEL_CM, allow_inf_nan=False)]]] = Field(
+        None, min_length=3, max_length=3
+    )
+
+class BulkRateQuoteRequest(BaseModel):
+    items: List[RateQuoteItem] = Field(..., min_length=1, max_length=1000)
+
+class EvidenceUploadCreate(BaseModel):
+    filename: str
+    size: int
+    content_type: str
+    sha256: Optional[str] = None  # of the whole file, checked after assembly
+
+class AnalyticsQuery(BaseModel):
+    group_by: List[str] = []
+    metrics: List[str] = ["revenue"]
+    filters: Optional[Dict[str, Any]] = {}  # dimension -> value or list of values
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    limit: int = 100
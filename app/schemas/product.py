@@ -52,3 +52,6 @@ class WishlistItemAdd(BaseModel):
     category_id: Optional[str] = None
     notes: Optional[str] = None
     priority: int = 1
+
+class WishlistCheckRequest(BaseModel):
+    product_ids: List[str]
@@ -61,3 +61,6 @@ class ContactMessage(BaseModel):
     phone: Optional[str] = None
     subject: str
     message: str
+
+class NotificationIds(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=500)
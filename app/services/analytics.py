@@ -0,0 +1,413 @@
+"""
+In-memory analytics cube over order lines.
+
+Every order item becomes one row in a set of NumPy column arrays. String-like
+dimensions (category, product, state, ...) are dictionary-encoded to small
+integer codes, so group-by/filter/sum queries become vectorised mask,
+factorise and bincount operations instead of Python loops over `Order` rows.
+
+The cube is refreshed incrementally: only orders whose `updated_at` moved past
+the last watermark are re-read, their previous rows are tombstoned and the new
+rows appended. Tombstoned rows are compacted away once they pile up. Orders
+are read together with the archive table, so a rebuild after retention has
+moved old orders still covers the full history.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import or_
+
+from app.models.order import Order
+from app.models.product import Product, Category
+from app.services.retention import with_archive
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+REFRESH_BATCH_SIZE = 2000
+COMPACT_DEAD_RATIO = 0.25
+DENSE_KEY_SPACE = 1 << 22  # group with a bincount table up to this many possible keys
+
+# Column name -> dtype. Dimensions first, then measures, then bookkeeping.
+COLUMNS = {
+    "day": np.int32,            # days since 1970-01-01
+    "category": np.int32,       # code into the category dictionary
+    "product": np.int32,        # code into the product dictionary
+    "gst_rate": np.int32,       # code into the GST rate dictionary
+    "wholesale": np.bool_,
+    "payment_method": np.int32,
+    "state": np.int32,
+    "status": np.int32,
+    "offline": np.bool_,
+    "quantity": np.int32,
+    "revenue": np.float64,      # price * quantity, excluding GST
+    "gst": np.float64,
+    "cost": np.float64,
+    "order": np.int32,          # code into the order dictionary
+    "alive": np.bool_,
+}
+
+CODED_DIMENSIONS = ("category", "product", "gst_rate", "payment_method", "state", "status")
+DIMENSIONS = ("day", "week", "month", "category", "product", "gst_rate", "wholesale",
+              "payment_method", "state", "status", "offline")
+ORDER_LEVEL_DIMENSIONS = frozenset(("day", "week", "month", "payment_method", "state", "status", "offline"))
+METRICS = ("revenue", "gst", "cost", "quantity", "lines", "orders")
+
+class _Dictionary:
+    """Bidirectional value <-> int32 code mapping for one dimension."""
+    __slots__ = ("codes", "values")
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+def _day_number(value: Optional[datetime]) -> int:
+    if value is None:
+        return 0
+    return (value.date() - EPOCH).days
+
+def _normalise_state(address) -> str:
+    if isinstance(address, dict) and address.get("state"):
+        return str(address["state"]).strip().title()
+    return "Unknown"
+
+def _factorise(keys: np.ndarray):
+    """Sort-based np.unique(keys, return_inverse=True) for sparse key spaces."""
+    if not len(keys):
+        return keys, keys
+    order = np.argsort(keys, kind="stable")
+    ordered = keys[order]
+    starts = np.concatenate(([True], ordered[1:] != ordered[:-1]))
+    inverse = np.empty(len(keys), dtype=np.int64)
+    inverse[order] = np.cumsum(starts) - 1
+    return ordered[starts], inverse
+
+class OrderLineCube:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._size = 0
+        self._dead = 0
+        self._columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._dictionaries = {name: _Dictionary() for name in CODED_DIMENSIONS}
+        self._orders = _Dictionary()
+        self._order_rows: Dict[int, tuple] = {}  # order code -> (start, stop)
+        self._category_names: Dict[str, str] = {}
+        self._product_names: Dict[str, str] = {}
+        self.watermark: Optional[datetime] = None
+        self.refreshed_at = 0.0
+
+    # --- loading -----------------------------------------------------------
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = len(self._columns["day"])
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        for name, column in self._columns.items():
+            grown = np.empty(new_capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def append_lines(self, lines: Dict[str, np.ndarray]):
+        """Append already-encoded rows; every column in COLUMNS except `alive` must be present."""
+        with self._lock:
+            count = len(lines["day"])
+            self._reserve(count)
+            start, stop = self._size, self._size + count
+            for name in COLUMNS:
+                if name == "alive":
+                    self._columns[name][start:stop] = True
+                else:
+                    self._columns[name][start:stop] = lines[name]
+            self._size = stop
+
+    def _kill_order(self, order_code: int):
+        span = self._order_rows.pop(order_code, None)
+        if span:
+            start, stop = span
+            alive = self._columns["alive"]
+            self._dead += int(alive[start:stop].sum())
+            alive[start:stop] = False
+
+    def compact(self):
+        with self._lock:
+            if not self._dead:
+                return
+            keep = np.flatnonzero(self._columns["alive"][:self._size])
+            for name, column in self._columns.items():
+                self._columns[name] = column[keep]
+            self._size = len(keep)
+            self._dead = 0
+
+            # Rows of one order stay contiguous, so the spans can be rebuilt from the order column
+            self._order_rows = {}
+            orders = self._columns["order"]
+            if self._size:
+                boundaries = np.flatnonzero(np.diff(orders)) + 1
+                starts = np.concatenate(([0], boundaries))
+                stops = np.concatenate((boundaries, [self._size]))
+                for start, stop in zip(starts.tolist(), stops.tolist()):
+                    self._order_rows[int(orders[start])] = (start, stop)
+
+    def _encode_order(self, order, products: dict) -> Dict[str, list]:
+        rows = {name: [] for name in COLUMNS if name != "alive"}
+        order_code = self._orders.encode(order.id)
+        day = _day_number(order.created_at)
+        state = self._dictionaries["state"].encode(_normalise_state(order.shipping_address))
+        payment = self._dictionaries["payment_method"].encode(order.payment_method or "unknown")
+        status = self._dictionaries["status"].encode(order.status or "unknown")
+
+        for item in order.items or []:
+            product_id = item.get("product_id")
+            category_id, cost_price, selling_price, wholesale_price = products.get(product_id, (None, None, None, None))
+            quantity = int(item.get("quantity", 0) or 0)
+            price = float(item.get("price", 0) or 0)
+
+            wholesale = item.get("is_wholesale")
+            if wholesale is None:
+                # Lines written before the flag existed: infer from the price actually charged
+                wholesale = bool(wholesale_price and selling_price and price < selling_price and price <= wholesale_price)
+
+            gst_amount = float(item.get("gst_amount", 0) or 0)
+            revenue = price * quantity
+            rows["day"].append(day)
+            rows["category"].append(self._dictionaries["category"].encode(category_id or "uncategorized"))
+            rows["product"].append(self._dictionaries["product"].encode(product_id or "unknown"))
+            rows["gst_rate"].append(self._dictionaries["gst_rate"].encode(round(gst_amount / revenue * 100, 1) if revenue else 0.0))
+            rows["wholesale"].append(bool(wholesale))
+            rows["payment_method"].append(payment)
+            rows["state"].append(state)
+            rows["status"].append(status)
+            rows["offline"].append(bool(order.is_offline))
+            rows["quantity"].append(quantity)
+            rows["revenue"].append(revenue)
+            rows["gst"].append(gst_amount)
+            rows["cost"].append((cost_price if cost_price is not None else price * 0.7) * quantity)
+            rows["order"].append(order_code)
+        return rows
+
+    def refresh(self, db) -> int:
+        """Pull orders changed since the watermark. Returns the number of orders applied."""
+        with self._lock:
+            products = {
+                row.id: (row.category_id, row.cost_price, row.selling_price, row.wholesale_price)
+                for row in db.query(Product.id, Product.category_id, Product.cost_price,
+                                    Product.selling_price, Product.wholesale_price)
+            }
+            self._product_names = dict(db.query(Product.id, Product.name).all())
+            self._category_names = dict(db.query(Category.id, Category.name).all())
+
+            orders = with_archive(Order)
+            query = db.query(orders)
+            if self.watermark is not None:
+                # >= so rows sharing the watermark timestamp are never missed; re-applying is idempotent
+                query = query.filter(or_(orders.updated_at >= self.watermark, orders.updated_at == None))
+
+            applied = 0
+            watermark = self.watermark
+            for order in query.order_by(orders.updated_at).yield_per(REFRESH_BATCH_SIZE):
+                order_code = self._orders.encode(order.id)
+                self._kill_order(order_code)
+                rows = self._encode_order(order, products)
+                if rows["day"]:
+                    start = self._size
+                    self.append_lines({name: np.asarray(values, dtype=COLUMNS[name]) for name, values in rows.items()})
+                    self._order_rows[order_code] = (start, self._size)
+                applied += 1
+                if order.updated_at and (watermark is None or order.updated_at > watermark):
+                    watermark = order.updated_at
+
+            self.watermark = watermark
+            self.refreshed_at = time.monotonic()
+            if self._size and self._dead / self._size > COMPACT_DEAD_RATIO:
+                self.compact()
+            return applied
+
+    def refresh_if_stale(self, db, max_age_seconds: float):
+        if time.monotonic() - self.refreshed_at >= max_age_seconds:
+            self.refresh(db)
+
+    # --- querying ----------------------------------------------------------
+
+    def _dimension_codes(self, name: str, rows: np.ndarray):
+        """Return (dense codes, radix, offset) for one dimension over the selected rows."""
+        if name in CODED_DIMENSIONS:
+            return self._columns[name][rows].astype(np.int64), max(len(self._dictionaries[name]), 1), 0
+        if name in ("wholesale", "offline"):
+            return self._columns[name][rows].astype(np.int64), 2, 0
+
+        days = self._columns["day"][rows].astype(np.int64)
+        if not len(days):
+            return days, 1, 0
+        first, last = int(days.min()), int(days.max())
+        if name == "week":
+            # Monday-based weeks: 1970-01-01 was a Thursday
+            keys = (days + 3) // 7
+        elif name == "month":
+            # Calendar maths on a per-day lookup table rather than on every row
+            table = np.arange(first, last + 1).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+            keys = table[days - first]
+        else:
+            keys = days
+        low = int(keys.min())
+        return keys - low, int(keys.max()) - low + 1, low
+
+    def _label(self, name: str, key: int):
+        if name == "day":
+            return (EPOCH + timedelta(days=key)).isoformat()
+        if name == "week":
+            return (EPOCH + timedelta(days=key * 7 - 3)).isoformat()
+        if name == "month":
+            return str(np.datetime64(key, "M"))
+        if name in ("wholesale", "offline"):
+            return bool(key)
+        value = self._dictionaries[name].values[key]
+        if name == "category":
+            return self._category_names.get(value, value)
+        if name == "product":
+            return self._product_names.get(value, value)
+        return value
+
+    def _filter_mask(self, filters: Dict[str, list], date_from: Optional[date], date_to: Optional[date]) -> np.ndarray:
+        mask = self._columns["alive"][:self._size].copy()
+        if date_from:
+            mask &= self._columns["day"][:self._size] >= (date_from - EPOCH).days
+        if date_to:
+            mask &= self._columns["day"][:self._size] <= (date_to - EPOCH).days
+
+        for name, values in (filters or {}).items():
+            if name not in DIMENSIONS or name in ("day", "week", "month"):
+                raise ValueError(f"Cannot filter on '{name}'")
+            if not isinstance(values, list):
+                values = [values]
+            column = self._columns[name][:self._size]
+            if name in CODED_DIMENSIONS:
+                dictionary = self._dictionaries[name]
+                if name in ("category", "product"):
+                    # Accept ids or display names
+                    names = self._category_names if name == "category" else self._product_names
+                    by_name = {label: key for key, label in names.items()}
+                    values = [by_name.get(v, v) for v in values]
+                if name == "gst_rate":
+                    values = [float(v) for v in values]
+                codes = [dictionary.codes[v] for v in values if v in dictionary.codes]
+                mask &= np.isin(column, np.asarray(codes, dtype=np.int32))
+            else:
+                mask &= np.isin(column, np.asarray([bool(v) for v in values]))
+        return mask
+
+    def query(
+        self,
+        group_by: List[str],
+        metrics: List[str],
+        filters: Optional[Dict[str, list]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        limit: int = 100
+    ) -> dict:
+        for name in group_by:
+            if name not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension '{name}'")
+        for name in metrics:
+            if name not in METRICS:
+                raise ValueError(f"Unknown metric '{name}'")
+
+        with self._lock:
+            started = time.perf_counter()
+            mask = self._filter_mask(filters, date_from, date_to)
+            # A plain slice keeps every column access a view when nothing is filtered out
+            rows = slice(0, self._size) if mask.all() else np.flatnonzero(mask)
+            row_count = int(mask.sum())
+
+            # Every dimension is a dense code in [0, radix), so the group key is a
+            # mixed-radix number and grouping needs no sort when the key space is small.
+            combined = np.zeros(row_count, dtype=np.int64)
+            radices, offsets = [], []
+            for name in group_by:
+                codes, radix, offset = self._dimension_codes(name, rows)
+                combined = combined * radix + codes
+                radices.append(radix)
+                offsets.append(offset)
+            key_space = int(np.prod(radices, dtype=np.float64)) if radices else 1
+
+            if key_space <= DENSE_KEY_SPACE:
+                present = np.flatnonzero(np.bincount(combined, minlength=key_space))
+                lookup = np.empty(key_space, dtype=np.int64)
+                lookup[present] = np.arange(len(present))
+                groups, group_index = present, lookup[combined]
+            else:
+                groups, group_index = _factorise(combined)
+            group_count = len(groups)
+
+            results = {}
+            for name in metrics:
+                if name == "lines":
+                    results[name] = np.bincount(group_index, minlength=group_count)
+                elif name == "orders" and ORDER_LEVEL_DIMENSIONS.issuperset(group_by):
+                    # Every line of an order lands in the same group: count each order's first line
+                    orders = self._columns["order"][rows]
+                    first = np.concatenate(([True], orders[1:] != orders[:-1])) if row_count else np.zeros(0, dtype=bool)
+                    results[name] = np.bincount(group_index[first], minlength=group_count)
+                elif name == "orders":
+                    # Distinct (group, order) pairs; rows of one order are contiguous so the sort is cheap
+                    pairs = np.sort(self._columns["order"][rows].astype(np.int64) * max(group_count, 1) + group_index)
+                    distinct = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))] if len(pairs) else pairs
+                    results[name] = np.bincount(distinct % max(group_count, 1), minlength=group_count)
+                else:
+                    results[name] = np.bincount(group_index, weights=self._columns[name][rows], minlength=group_count)
+
+            order = np.arange(group_count)
+            if metrics:
+                order = np.argsort(-results[metrics[0]], kind="stable")
+            order = order[:limit]
+
+            # Decode the mixed-radix keys back into per-dimension labels
+            decoded = []
+            remaining = groups[order]
+            for name, radix, offset in reversed(list(zip(group_by, radices, offsets))):
+                decoded.append((name, (remaining % radix + offset).tolist()))
+                remaining = remaining // radix
+            decoded.reverse()
+
+            output = []
+            for position, group in enumerate(order.tolist()):
+                entry = {name: self._label(name, keys[position]) for name, keys in decoded}
+                for name in metrics:
+                    value = results[name][group]
+                    entry[name] = int(value) if name in ("lines", "orders", "quantity") else round(float(value), 2)
+                output.append(entry)
+
+            return {
+                "rows": output,
+                "groups": group_count,
+                "lines_scanned": row_count,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "lines": self._size - self._dead,
+                "tombstoned": self._dead,
+                "orders": len(self._order_rows),
+                "memory_bytes": int(sum(column[:self._size].nbytes for column in self._columns.values())),
+                "watermark": self.watermark.isoformat() if self.watermark else None
+            }
+
+order_cube = OrderLineCube()
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.settings import JobCheckpoint
+
+def load_checkpoint(db: Session, name: str) -> JobCheckpoint:
+    """Return the checkpoint row for `name`, creating an empty one (watermark None) on first use."""
+    checkpoint = db.query(JobCheckpoint).filter(JobCheckpoint.name == name).first()
+    if not checkpoint:
+        checkpoint = JobCheckpoint(name=name, watermark=None, data={})
+        db.add(checkpoint)
+    return checkpoint
+
+def advance_checkpoint(checkpoint: JobCheckpoint, watermark: datetime, **data):
+    """Move the watermark forward and record run details; committed with the caller's transaction."""
+    checkpoint.watermark = watermark
+    checkpoint.data = {**(checkpoint.data or {}), **data}
+    checkpoint.updated_at = datetime.utcnow()
+
+def acquire_lease(db: Session, name: str, owner: str, until: datetime, now: datetime) -> bool:
+    """
+    Take the lease of `name` for `owner` until `until`, if nobody holds it at
+    `now`. The conditional UPDATE lets exactly one process win; it is
+    committed straight away so the others see it.
+    """
+    if db.get(JobCheckpoint, name) is None:
+        try:
+            db.add(JobCheckpoint(name=name, watermark=None, data={}))
+            db.commit()
+        except IntegrityError:
+            # Another process created it first
+            db.rollback()
+    result = db.execute(update(JobCheckpoint).where(
+        JobCheckpoint.name == name,
+        or_(JobCheckpoint.lease_until == None, JobCheckpoint.lease_until <= now)
+    ).values(lease_owner=owner, lease_until=until))
+    db.commit()
+    return result.rowcount == 1
+
+def release_lease(db: Session, name: str, owner: str, until: datetime):
+    """Move the end of our own lease of `name` to `until`, the earliest time any process may take it again."""
+    db.execute(update(JobCheckpoint).where(
+        JobCheckpoint.name == name, JobCheckpoint.lease_owner == owner
+    ).values(lease_until=until))
+    db.commit()
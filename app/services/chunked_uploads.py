@@ -0,0 +1,214 @@
+"""
+Chunked, resumable uploads (used for return evidence videos).
+
+A client creates an upload with the file's total size, receives a chunk
+size, and PUTs the chunks in any order, each with the SHA-256 of its bytes.
+Chunks are streamed to disk in small pieces while being hashed, so memory
+stays bounded whatever the chunk size, and a chunk that is too long or
+fails its checksum is discarded. After a dropped connection the client asks
+which chunks arrived and sends only the rest. `assemble` then concatenates
+the chunks into the final file (again streaming) and removes the session.
+
+The stored file's extension comes from the declared content type, checked
+against an allow-list when the upload is created, never from the client's
+filename: /uploads is served statically, so a ".html" or ".svg" "video"
+would otherwise be served as a page.
+
+Sessions live on disk under UPLOAD_DIR/.chunked/<upload_id>/ (a manifest
+plus one file per chunk), so any worker sharing the upload directory can
+serve any chunk. Abandoned sessions are removed by `sweep_stale_uploads`.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+COPY_BUFFER = 1024 * 1024
+
+# Content types accepted for evidence videos and the extension each is stored under
+VIDEO_EXTENSIONS = {
+    "video/mp4": "mp4",
+    "video/quicktime": "mov",
+    "video/webm": "webm",
+    "video/x-matroska": "mkv",
+    "video/3gpp": "3gp",
+    "video/x-msvideo": "avi",
+}
+
+def _sessions_dir() -> Path:
+    return settings.UPLOAD_DIR / ".chunked"
+
+def _session_dir(upload_id: str) -> Path:
+    # upload ids are server-generated UUIDs; anything else must not reach the filesystem
+    try:
+        upload_id = str(uuid.UUID(upload_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return _sessions_dir() / upload_id
+
+def _chunk_path(session: Path, index: int) -> Path:
+    return session / f"{index:06d}.chunk"
+
+def create_upload(owner: str, filename: str, content_type: str, size: int, max_size: int,
+                  allowed_types: Dict[str, str], sha256: Optional[str] = None, context: dict = None) -> dict:
+    """`allowed_types` maps each accepted content type to the extension the file is stored under."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type not in allowed_types:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported file type; allowed: {', '.join(sorted(allowed_types))}"
+        )
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="File size must be positive")
+    if size > max_size:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {max_size // (1024 * 1024)} MB limit")
+
+    chunk_size = settings.UPLOAD_CHUNK_MB * 1024 * 1024
+    manifest = {
+        "upload_id": str(uuid.uuid4()),
+        "owner": owner,
+        "filename": filename,
+        "content_type": content_type,
+        "extension": allowed_types[content_type],
+        "size": size,
+        "sha256": sha256.lower() if sha256 else None,
+        "chunk_size": chunk_size,
+        "total_chunks": (size + chunk_size - 1) // chunk_size,
+        "context": context or {},
+        "created_at": datetime.utcnow().isoformat()
+    }
+    session = _session_dir(manifest["upload_id"])
+    session.mkdir(parents=True)
+    (session / MANIFEST).write_text(json.dumps(manifest))
+    return manifest
+
+def load_upload(upload_id: str, owner: str) -> dict:
+    path = _session_dir(upload_id) / MANIFEST
+    try:
+        manifest = json.loads(path.read_text())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if manifest["owner"] != owner:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return manifest
+
+def received_chunks(manifest: dict) -> list:
+    session = _session_dir(manifest["upload_id"])
+    return sorted(int(path.stem) for path in session.glob("*.chunk"))
+
+def upload_status(manifest: dict) -> dict:
+    received = received_chunks(manifest)
+    return {
+        "upload_id": manifest["upload_id"],
+        "size": manifest["size"],
+        "chunk_size": manifest["chunk_size"],
+        "total_chunks": manifest["total_chunks"],
+        "received": received,
+        "missing": sorted(set(range(manifest["total_chunks"])) - set(received))
+    }
+
+def _expected_length(manifest: dict, index: int) -> int:
+    if index == manifest["total_chunks"] - 1:
+        return manifest["size"] - index * manifest["chunk_size"]
+    return manifest["chunk_size"]
+
+async def write_chunk(manifest: dict, index: int, body: AsyncIterator[bytes], sha256: str) -> dict:
+    """Stream one chunk to disk, verifying its length and checksum before it counts as received."""
+    if not 0 <= index < manifest["total_chunks"]:
+        raise HTTPException(status_code=400, detail=f"Chunk index must be between 0 and {manifest['total_chunks'] - 1}")
+    if not sha256:
+        raise HTTPException(status_code=400, detail="X-Chunk-SHA256 header is required")
+
+    expected = _expected_length(manifest, index)
+    session = _session_dir(manifest["upload_id"])
+    temp_path = session / f"{index:06d}.{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    written = 0
+
+    handle = await run_in_threadpool(open, temp_path, "wb")
+    try:
+        async for piece in body:
+            written += len(piece)
+            if written > expected:
+                raise HTTPException(status_code=413, detail=f"Chunk {index} must be {expected} bytes")
+            digest.update(piece)
+            await run_in_threadpool(handle.write, piece)
+        await run_in_threadpool(handle.close)
+
+        if written != expected:
+            raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected} bytes, got {written}")
+        if digest.hexdigest() != sha256.lower():
+            raise HTTPException(status_code=422, detail=f"Checksum mismatch for chunk {index}")
+        # Atomic, so a retried chunk racing an earlier attempt never leaves a torn file
+        os.replace(temp_path, _chunk_path(session, index))
+    except BaseException:
+        handle.close()
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return {"index": index, "size": written, "received": len(received_chunks(manifest)), "total_chunks": manifest["total_chunks"]}
+
+def assemble(manifest: dict, folder: str) -> str:
+    """Concatenate all chunks into the final file under UPLOAD_DIR/folder; returns its URL."""
+    status = upload_status(manifest)
+    if status["missing"]:
+        raise HTTPException(status_code=409, detail={"message": "Upload is incomplete", "missing": status["missing"]})
+
+    session = _session_dir(manifest["upload_id"])
+    folder_path = settings.UPLOAD_DIR / folder
+    folder_path.mkdir(parents=True, exist_ok=True)
+    final_name = f"{uuid.uuid4()}.{manifest.get('extension') or 'bin'}"
+    final_path = folder_path / final_name
+
+    digest = hashlib.sha256()
+    try:
+        with open(final_path, "wb") as output:
+            for index in range(manifest["total_chunks"]):
+                with open(_chunk_path(session, index), "rb") as chunk:
+                    while piece := chunk.read(COPY_BUFFER):
+                        digest.update(piece)
+                        output.write(piece)
+        if manifest["sha256"] and digest.hexdigest() != manifest["sha256"]:
+            raise HTTPException(status_code=422, detail="Checksum mismatch for the assembled file")
+    except BaseException:
+        final_path.unlink(missing_ok=True)
+        raise
+
+    shutil.rmtree(session, ignore_errors=True)
+    return f"/uploads/{folder}/{final_name}"
+
+def abort_upload(manifest: dict):
+    shutil.rmtree(_session_dir(manifest["upload_id"]), ignore_errors=True)
+
+def sweep_stale_uploads(db=None) -> int:
+    """Remove sessions untouched for UPLOAD_SESSION_HOURS (scheduler job; `db` is unused)."""
+    sessions = _sessions_dir()
+    if not sessions.exists():
+        return 0
+    cutoff = time.time() - settings.UPLOAD_SESSION_HOURS * 3600
+    removed = 0
+    for session in sessions.iterdir():
+        try:
+            last_touched = max((path.stat().st_mtime for path in session.iterdir()), default=session.stat().st_mtime)
+        except FileNotFoundError:
+            continue
+        if last_touched < cutoff:
+            shutil.rmtree(session, ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"Removed {removed} abandoned chunked uploads")
+    return removed
@@ -1,13 +1,97 @@
-import requests
 import json
 import logging
+import random
+import string
 from datetime import datetime, timedelta
 
+from app.core.config import settings
+from app.services.http_client import ResilientClient
+from app.services.shipping_rates import rate_engine, valid_pincode, UNKNOWN_ETA
+
 logger = logging.getLogger(__name__)
 
+# One pooled, keep-alive session for every DelhiveryService instance
+delhivery_http = ResilientClient(
+    "delhivery",
+    timeout=(settings.DELHIVERY_CONNECT_TIMEOUT, settings.DELHIVERY_READ_TIMEOUT),
+    max_retries=settings.DELHIVERY_MAX_RETRIES,
+    pool_size=settings.DELHIVERY_POOL_SIZE,
+    failure_threshold=settings.DELHIVERY_BREAKER_FAILURES,
+    reset_seconds=settings.DELHIVERY_BREAKER_RESET_SECONDS
+)
+
+def parse_pincode_codes(data: dict) -> list:
+    """Pincode records (PincodeServiceability fields) from a pin-codes API response or dump"""
+    records = []
+    # Delhivery returns { "delivery_codes": [ { "postal_code": { "pin": ... } } ] }
+    for item in data.get("delivery_codes", []):
+        # Fallback for flat structure if API varies
+        details = item.get("postal_code") or item
+        if details.get("pin") is None:
+            continue
+        records.append({
+            "pincode": str(details.get("pin")),
+            "serviceable": True,
+            "cod": details.get("cod") == "Y",
+            "prepaid": details.get("pre_paid") == "Y",
+            "pickup": details.get("pickup") == "Y",
+            "cash_pickup": details.get("cash") == "Y" or details.get("cash_pickup") == "Y",
+            "repl": details.get("repl") == "Y",
+            "city": details.get("city"),
+            "state": details.get("state_code"),
+            "district": details.get("district")
+        })
+    return records
+
+def serviceability_response(pincode: str, record: dict) -> dict:
+    """API response for a serviceable pincode record, priced for a default parcel by the local rate engine"""
+    quote = rate_engine.quote(pincode)
+    low, high = UNKNOWN_ETA
+    return {
+        "serviceable": True,
+        "cod": record["cod"],
+        "prepaid": record["prepaid"],
+        "city": record["city"],
+        "state": record["state"],
+        "district": record["district"],
+        "cash_pickup": record["cash_pickup"],
+        "pickup": record["pickup"],
+        "repl": record["repl"],
+        # An invalid pincode gets an error instead of a quote; fall back rather than fail the lookup
+        "delivery_charge": quote.get("delivery_charge", rate_engine.fallback_charge),
+        "zone": quote.get("zone"),
+        "estimated_delivery": quote.get("estimated_delivery", f"{low}-{high} business days")
+    }
+
+def parse_shipment(shipment_data: dict) -> dict:
+    """Status and scan history from one packages API `Shipment` object"""
+    status = shipment_data.get("Status") or {}
+    tracking_history = []
+    for scan in shipment_data.get("Scans") or []:
+        # Scans come wrapped as {"ScanDetail": {...}}; accept flat ones too
+        scan = scan.get("ScanDetail") or scan
+        tracking_history.append({
+            "date": scan.get("ScanDateTime"),
+            "status": scan.get("Scan"),
+            "location": scan.get("ScannedLocation"),
+            "instructions": scan.get("Instructions"),
+            "status_code": scan.get("StatusCode")
+        })
+    return {
+        "awb": str(shipment_data.get("AWB") or ""),
+        "status": status.get("Status"),
+        "status_type": status.get("StatusType"),
+        "current_location": status.get("StatusLocation") or shipment_data.get("Origin"),
+        "destination": shipment_data.get("Destination"),
+        "expected_delivery": shipment_data.get("ExpectedDeliveryDate"),
+        "cod_amount": shipment_data.get("CODAmount"),
+        "tracking_history": tracking_history
+    }
+
 class DelhiveryService:
-    BASE_URL = "https://track.delhivery.com" # Production URL
-    # BASE_URL = "https://staging-express.delhivery.com" # Staging URL
+    # Production is https://track.delhivery.com, staging https://staging-express.delhivery.com;
+    # point DELHIVERY_BASE_URL at scripts/fake_delhivery.py for local testing
+    BASE_URL = settings.DELHIVERY_BASE_URL
     
     def __init__(self, token):
         self.token = token
@@ -17,71 +101,37 @@ class DelhiveryService:
             "Accept": "application/json"
         }
 
+    def fetch_pincodes(self, pincodes=None):
+        """
+        Pincode records straight from /c/api/pin-codes/json/, as dicts in the
+        shape of PincodeServiceability. With no `pincodes` this is the full
+        serviceable list (used for the bulk refresh). Raises
+        requests.RequestException on failure.
+        """
+        url = f"{self.BASE_URL}/c/api/pin-codes/json/"
+        params = {"filter_codes": ",".join(pincodes or [])}
+        response = delhivery_http.get(url, operation="serviceability", headers=self.headers, params=params,
+                                      timeout=None if pincodes else (settings.DELHIVERY_CONNECT_TIMEOUT, 120))
+        response.raise_for_status()
+        return parse_pincode_codes(response.json())
+
     def check_serviceability(self, pincode):
         """
-        Check if a pincode is serviceable.
+        Check if a pincode is serviceable, asking the API directly. Checkout
+        paths use app.services.pincodes.pincode_directory instead.
         API: /c/api/pin-codes/json/
         """
+        pincode = str(pincode).strip()
+        if not valid_pincode(pincode):
+            return {"serviceable": False, "error": "Invalid pincode"}
         try:
-            # For testing purposes, let's return a mock response if the API fails
-            url = f"{self.BASE_URL}/c/api/pin-codes/json/"
-            params = {"filter_codes": pincode}
-            
-            # Add timeout to prevent hanging
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
+            # Check if pin matches (comparing as string/int safely)
+            for record in self.fetch_pincodes([pincode]):
+                if record["pincode"] == pincode:
+                    return serviceability_response(record["pincode"], record)
             
-            if response.status_code == 200:
-                data = response.json()
-                delivery_codes = data.get("delivery_codes", [])
-                
-                # If API returns successfully but with no codes, it means not serviceable
-                if not delivery_codes:
-                     return {"serviceable": False}
-
-                # Delhivery returns { "delivery_codes": [ { "postal_code": { "pin": ... } } ] }
-                for item in delivery_codes:
-                    # The API response has a wrapper key 'postal_code' containing the actual details
-                    details = item.get("postal_code")
-                    if not details:
-                        # Fallback for flat structure if API varies
-                        details = item
-                        
-                    # Check if pin matches (comparing as string/int safely)
-                    api_pin = details.get("pin")
-                    if str(api_pin) == str(pincode):
-                        return {
-                            "serviceable": True,
-                            "cod": details.get("cod") == "Y",
-                            "prepaid": details.get("pre_paid") == "Y",
-                            "city": details.get("city"),
-                            "state": details.get("state_code"),
-                            "district": details.get("district"),
-                            "cash_pickup": details.get("cash") == "Y" or details.get("cash_pickup") == "Y",
-                            "pickup": details.get("pickup") == "Y",
-                            "repl": details.get("repl") == "Y",
-                            "delivery_charge": 40 if details.get("state_code") == "RJ" else 80
-                        }
-                
-                # If we iterated but didn't find exact match
-                return {"serviceable": False}
-                        
-            # If API call fails or pincode not found, return mock data for testing
-            logger.warning(f"Delhivery API returned {response.status_code}: {response.text}")
-            
-            # Return mock serviceable data for testing
-            return {
-                "serviceable": True,
-                "cod": True,
-                "prepaid": True,
-                "city": "Test City",
-                "state": "Test State",
-                "district": "Test District",
-                "cash_pickup": True,
-                "pickup": True,
-                "repl": True,
-                "delivery_charge": 60,
-                "note": "Mock data - API may be unavailable"
-            }
+            # If API returns successfully but with no matching code, it means not serviceable
+            return {"serviceable": False}
             
         except Exception as e:
             logger.error(f"Delhivery Serviceability Error: {str(e)}")
@@ -94,7 +144,7 @@ class DelhiveryService:
                 "city": "Test City",
                 "state": "Test State",
                 "district": "Test District",
-                "delivery_charge": 60,
+                "delivery_charge": rate_engine.delivery_charge(pincode),
                 "note": f"Mock data - Error: {str(e)}"
             }
 
@@ -107,8 +157,9 @@ class DelhiveryService:
             if not pincode:
                 return {"valid": False, "error": "Pincode is required"}
             
-            # Check serviceability
-            serviceability = self.check_serviceability(pincode)
+            # Check serviceability against the local pincode table
+            from app.services.pincodes import pincode_directory
+            serviceability = pincode_directory.lookup(str(pincode).strip())
             
             if not serviceability.get("serviceable"):
                 return {
@@ -135,100 +186,122 @@ class DelhiveryService:
             return {
                 "valid": True,
                 "serviceability": serviceability,
-                "estimated_delivery": self._calculate_delivery_estimate(serviceability.get("city"))
+                "estimated_delivery": self._calculate_delivery_estimate(str(pincode).strip())
             }
             
         except Exception as e:
             return {"valid": False, "error": str(e)}
 
-    def _calculate_delivery_estimate(self, city):
-        """Calculate estimated delivery days based on city"""
-        # This is a simplified estimation - in real scenario, you'd use Delhivery's API
-        metro_cities = ["Mumbai", "Delhi", "Bangalore", "Chennai", "Kolkata", "Hyderabad", "Pune", "Ahmedabad"]
-        if city in metro_cities:
-            return "1-2 business days"
-        else:
-            return "2-4 business days"
+    def _calculate_delivery_estimate(self, pincode):
+        """Estimated delivery days to a pincode from the local zone-pair ETAs"""
+        return rate_engine.quote(pincode).get("estimated_delivery", "2-4 business days")
+
+    def _validate_order_data(self, order_data):
+        """Error message for order data Delhivery would reject, else None"""
+        # Validate required fields
+        required_fields = ["name", "address", "pincode", "city", "state", "phone", "order_id", "date"]
+        missing_fields = [field for field in required_fields if not order_data.get(field)]
+        
+        if missing_fields:
+            logger.error(f"Missing required fields for Delhivery shipment: {missing_fields}")
+            return f"Missing required fields: {', '.join(missing_fields)}"
+        
+        # Validate phone number (should be 10 digits)
+        phone = str(order_data.get("phone", "")).strip()
+        if not phone or len(phone) < 10:
+            logger.error(f"Invalid phone number: {phone}")
+            return "Invalid phone number. Must be at least 10 digits."
+        
+        # Validate pincode (should be 6 digits)
+        pincode = str(order_data.get("pincode", "")).strip()
+        if not pincode or len(pincode) != 6 or not pincode.isdigit():
+            logger.error(f"Invalid pincode: {pincode}")
+            return "Invalid pincode. Must be exactly 6 digits."
+        return None
+
+    def _shipment_entry(self, order_data):
+        """One entry of the CMU `shipments` list, matching Delhivery API requirements"""
+        return {
+            "name": str(order_data["name"]).strip(),
+            "add": str(order_data["address"]).strip(),
+            "pin": str(order_data["pincode"]).strip(),
+            "city": str(order_data["city"]).strip(),
+            "state": str(order_data["state"]).strip(),
+            "country": "India",
+            "phone": str(order_data["phone"]).strip(),
+            "order": str(order_data["order_id"]).strip(),
+            "payment_mode": "COD" if order_data.get("pay_mode") == "COD" else "Prepaid",
+            "return_pin": str(order_data.get("pickup_pincode", "110001")).strip(),
+            "return_city": str(order_data.get("pickup_city", "New Delhi")).strip(),
+            "return_phone": str(order_data.get("pickup_phone", "9999999999")).strip(),
+            "return_add": str(order_data.get("pickup_address", "Warehouse Address")).strip(),
+            "return_state": str(order_data.get("pickup_state", "Delhi")).strip(),
+            "return_country": "India",
+            "products_desc": str(order_data.get("products_desc", "Goods"))[:50],
+            "hsn_code": "",
+            "cod_amount": str(order_data.get("cod_amount", 0)),
+            "order_date": order_data.get("date", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            "total_amount": str(order_data.get("total_amount", 0)),
+            "seller_add": str(order_data.get("pickup_address", "Warehouse Address")).strip(),
+            "seller_name": str(order_data.get("pickup_name", "Warehouse")).strip(),
+            "seller_inv": "",
+            "quantity": str(order_data.get("quantity", 1)),
+            "waybill": "",
+            "shipment_width": str(order_data.get("width", 10)),
+            "shipment_height": str(order_data.get("height", 10)),
+            "weight": str(order_data.get("weight", 500)),
+            "seller_gst_tin": "",
+            "shipping_mode": "Surface",
+            "address_type": "home"
+        }
+
+    def _post_manifest(self, entries, operation, read_timeout):
+        url = f"{self.BASE_URL}/api/cmu/create.json"
+        payload = {"format": "json", "data": json.dumps({"shipments": entries})}
+        
+        # Remove Content-Type: application/json from headers for form-data
+        headers = self.headers.copy()
+        headers.pop("Content-Type", None)
+        
+        logger.debug(f"Delhivery Payload: {json.dumps(payload, indent=2)}")
+        # Creating a shipment is not idempotent: only retried if the request was never sent
+        return delhivery_http.post(
+            url, operation=operation, headers=headers, data=payload,
+            timeout=(settings.DELHIVERY_CONNECT_TIMEOUT, read_timeout)
+        )
+
+    @staticmethod
+    def _package_result(pkg):
+        if pkg.get("status") == "Success":
+            return {"success": True, "awb": pkg.get("waybill"), "ref_id": pkg.get("refnum")}
+        error_msg = pkg.get("remarks") or "Unknown Error"
+        logger.error(f"Delhivery shipment creation failed: {error_msg}")
+        return {"success": False, "error": error_msg}
+
+    @staticmethod
+    def _mock_shipment():
+        # For testing purposes, return mock AWB if API fails
+        mock_awb = ''.join(random.choices(string.digits, k=10))
+        logger.warning(f"Returning mock AWB for testing: {mock_awb}")
+        return {
+            "success": True,
+            "awb": mock_awb,
+            "ref_id": f"REF{mock_awb}",
+            "note": "Mock AWB - API may be unavailable or credentials invalid"
+        }
 
     def create_surface_order(self, order_data):
         """
         Create a Surface/Express shipment.
-        API: /c/api/og/v2/shipment/
+        API: /api/cmu/create.json
         """
         try:
-            # Validate required fields
-            required_fields = ["name", "address", "pincode", "city", "state", "phone", "order_id", "date"]
-            missing_fields = [field for field in required_fields if not order_data.get(field)]
-            
-            if missing_fields:
-                logger.error(f"Missing required fields for Delhivery shipment: {missing_fields}")
-                return {"success": False, "error": f"Missing required fields: {', '.join(missing_fields)}"}
-            
-            # Validate phone number (should be 10 digits)
-            phone = str(order_data.get("phone", "")).strip()
-            if not phone or len(phone) < 10:
-                logger.error(f"Invalid phone number: {phone}")
-                return {"success": False, "error": "Invalid phone number. Must be at least 10 digits."}
-            
-            # Validate pincode (should be 6 digits)
-            pincode = str(order_data.get("pincode", "")).strip()
-            if not pincode or len(pincode) != 6 or not pincode.isdigit():
-                logger.error(f"Invalid pincode: {pincode}")
-                return {"success": False, "error": "Invalid pincode. Must be exactly 6 digits."}
-            
-            url = f"{self.BASE_URL}/api/cmu/create.json"
-            
-            # Payload construction matching Delhivery API requirements
-            payload = {
-                "format": "json",
-                "data": json.dumps({
-                    "shipments": [
-                        {
-                            "name": str(order_data["name"]).strip(),
-                            "add": str(order_data["address"]).strip(),
-                            "pin": pincode,
-                            "city": str(order_data["city"]).strip(),
-                            "state": str(order_data["state"]).strip(),
-                            "country": "India",
-                            "phone": phone,
-                            "order": str(order_data["order_id"]).strip(),
-                            "payment_mode": "COD" if order_data.get("pay_mode") == "COD" else "Prepaid",
-                            "return_pin": str(order_data.get("pickup_pincode", "110001")).strip(),
-                            "return_city": str(order_data.get("pickup_city", "New Delhi")).strip(),
-                            "return_phone": str(order_data.get("pickup_phone", "9999999999")).strip(),
-                            "return_add": str(order_data.get("pickup_address", "Warehouse Address")).strip(),
-                            "return_state": str(order_data.get("pickup_state", "Delhi")).strip(),
-                            "return_country": "India",
-                            "products_desc": str(order_data.get("products_desc", "Goods"))[:50],
-                            "hsn_code": "",
-                            "cod_amount": str(order_data.get("cod_amount", 0)),
-                            "order_date": order_data.get("date", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-                            "total_amount": str(order_data.get("total_amount", 0)),
-                            "seller_add": str(order_data.get("pickup_address", "Warehouse Address")).strip(),
-                            "seller_name": str(order_data.get("pickup_name", "Warehouse")).strip(),
-                            "seller_inv": "",
-                            "quantity": str(order_data.get("quantity", 1)),
-                            "waybill": "",
-                            "shipment_width": str(order_data.get("width", 10)),
-                            "shipment_height": str(order_data.get("height", 10)),
-                            "weight": str(order_data.get("weight", 500)),
-                            "seller_gst_tin": "",
-                            "shipping_mode": "Surface",
-                            "address_type": "home"
-                        }
-                    ]
-                })
-            }
-            
-            # Remove Content-Type: application/json from headers for form-data
-            headers = self.headers.copy()
-            headers.pop("Content-Type", None)
+            error = self._validate_order_data(order_data)
+            if error:
+                return {"success": False, "error": error}
             
             logger.info(f"Creating Delhivery Shipment for order {order_data['order_id']}")
-            logger.debug(f"Delhivery Payload: {json.dumps(payload, indent=2)}")
-            
-            response = requests.post(url, headers=headers, data=payload, timeout=30)
-            
+            response = self._post_manifest([self._shipment_entry(order_data)], "create_shipment", 30)
             logger.info(f"Delhivery Response: {response.status_code} - {response.text}")
             
             if response.status_code == 200:
@@ -236,17 +309,7 @@ class DelhiveryService:
                 
                 # Check if the response contains packages
                 if res_json.get("packages"):
-                    pkg = res_json["packages"][0]
-                    if pkg.get("status") == "Success":
-                        return {
-                            "success": True,
-                            "awb": pkg.get("waybill"),
-                            "ref_id": pkg.get("refnum")
-                        }
-                    else:
-                        error_msg = pkg.get("remarks") or "Unknown Error"
-                        logger.error(f"Delhivery shipment creation failed: {error_msg}")
-                        return {"success": False, "error": error_msg}
+                    return self._package_result(res_json["packages"][0])
                 
                 # Check for direct success response
                 elif res_json.get("success"):
@@ -263,18 +326,8 @@ class DelhiveryService:
                 error_msg = f"HTTP {response.status_code}: {response.text}"
                 logger.error(f"Delhivery HTTP error: {error_msg}")
                 
-                # For testing purposes, return mock AWB if API fails
                 if response.status_code in [401, 403, 405, 500]:
-                    import random
-                    import string
-                    mock_awb = ''.join(random.choices(string.digits, k=10))
-                    logger.warning(f"Returning mock AWB for testing: {mock_awb}")
-                    return {
-                        "success": True,
-                        "awb": mock_awb,
-                        "ref_id": f"REF{mock_awb}",
-                        "note": "Mock AWB - API may be unavailable or credentials invalid"
-                    }
+                    return self._mock_shipment()
                 
                 return {"success": False, "error": error_msg}
 
@@ -282,6 +335,46 @@ class DelhiveryService:
              logger.error(f"Delhivery Create Order Error: {str(e)}")
              return {"success": False, "error": str(e)}
 
+    def create_surface_orders(self, orders_data):
+        """
+        Create many shipments with one manifest call (the CMU API takes a list
+        of shipments). Returns one result per entry of `orders_data`, in the
+        same order and shaped like create_surface_order's; packages are
+        matched back by order reference.
+        """
+        results = [None] * len(orders_data)
+        entries, index_by_ref = [], {}
+        for index, order_data in enumerate(orders_data):
+            error = self._validate_order_data(order_data)
+            if error:
+                results[index] = {"success": False, "error": error}
+                continue
+            entries.append(self._shipment_entry(order_data))
+            index_by_ref[entries[-1]["order"]] = index
+        if not entries:
+            return results
+
+        try:
+            logger.info(f"Creating {len(entries)} Delhivery shipments in one manifest")
+            response = self._post_manifest(entries, "create_shipment_batch", 60)
+            if response.status_code == 200:
+                for pkg in response.json().get("packages") or []:
+                    index = index_by_ref.get(str(pkg.get("refnum") or "").strip())
+                    if index is not None:
+                        results[index] = self._package_result(pkg)
+                missing = {"success": False, "error": "No result returned for this shipment"}
+            else:
+                # Unlike create_surface_order there is no mock fallback here: a whole
+                # batch of orders must never be marked shipped with made-up AWBs
+                error_msg = f"HTTP {response.status_code}: {response.text}"
+                logger.error(f"Delhivery HTTP error: {error_msg}")
+                missing = {"success": False, "error": error_msg}
+        except Exception as e:
+            logger.error(f"Delhivery Create Orders Error: {str(e)}")
+            missing = {"success": False, "error": str(e)}
+
+        return [result or dict(missing) for result in results]
+
     def track_order(self, awb):
         """
         Track shipment by AWB with detailed status information.
@@ -311,37 +404,13 @@ class DelhiveryService:
 
             url = f"{self.BASE_URL}/api/v1/packages/json/"
             params = {"waybill": awb, "token": self.token}
-            response = requests.get(url, params=params)
+            response = delhivery_http.get(url, operation="track", params=params)
             
             if response.status_code == 200:
                 data = response.json()
                 if data.get("ShipmentData"):
                     shipment_data = data["ShipmentData"][0].get("Shipment", {})
-                    
-                    # Parse tracking history
-                    scans = shipment_data.get("Scans", [])
-                    tracking_history = []
-                    
-                    for scan in scans:
-                        tracking_history.append({
-                            "date": scan.get("ScanDateTime"),
-                            "status": scan.get("Scan"),
-                            "location": scan.get("ScannedLocation"),
-                            "instructions": scan.get("Instructions"),
-                            "status_code": scan.get("StatusCode")
-                        })
-                    
-                    return {
-                        "success": True,
-                        "awb": awb,
-                        "status": shipment_data.get("Status", {}).get("Status"),
-                        "current_location": shipment_data.get("Origin"),
-                        "destination": shipment_data.get("Destination"),
-                        "expected_delivery": shipment_data.get("ExpectedDeliveryDate"),
-                        "cod_amount": shipment_data.get("CODAmount"),
-                        "tracking_history": tracking_history,
-                        "raw_data": shipment_data
-                    }
+                    return {"success": True, **parse_shipment(shipment_data), "awb": awb, "raw_data": shipment_data}
                 else:
                     return {"success": False, "error": "No tracking data found"}
             return {
@@ -442,7 +511,7 @@ class DelhiveryService:
             headers.pop("Content-Type", None)
             
             logger.info(f"Creating return shipment for order {return_data['original_order_id']}")
-            response = requests.post(url, headers=headers, data=data_param)
+            response = delhivery_http.post(url, operation="create_return", headers=headers, data=data_param)
             
             if response.status_code == 200:
                 data = response.json()
@@ -483,6 +552,23 @@ class DelhiveryService:
             logger.error(f"Create return shipment error: {str(e)}")
             return {"success": False, "error": str(e)}
 
+    def track_many(self, awbs):
+        """
+        Track up to 50 AWBs with one call (the packages API takes comma-separated
+        waybills). Returns {awb: parse_shipment(...)} for the AWBs the courier
+        knows; raises requests.RequestException on failure.
+        """
+        url = f"{self.BASE_URL}/api/v1/packages/json/"
+        params = {"waybill": ",".join(awbs), "token": self.token}
+        response = delhivery_http.get(url, operation="track_batch", params=params)
+        response.raise_for_status()
+        shipments = {}
+        for item in response.json().get("ShipmentData") or []:
+            parsed = parse_shipment(item.get("Shipment", {}))
+            if parsed["awb"]:
+                shipments[parsed["awb"]] = parsed
+        return shipments
+
     def get_label(self, awb):
         """
         Fetch shipping label for printing.
@@ -491,7 +577,7 @@ class DelhiveryService:
         try:
             url = f"{self.BASE_URL}/api/p/packing_slip"
             params = {"wbns": awb, "pdf": "true"} 
-            response = requests.get(url, headers=self.headers, params=params)
+            response = delhivery_http.get(url, operation="label", headers=self.headers, params=params)
             
             if response.status_code == 200:
                 # Returns JSON with 'packages' list containing 'pdf_download_link'
@@ -521,7 +607,7 @@ class DelhiveryService:
         try:
             url = f"{self.BASE_URL}/api/p/packing_slip"
             params = {"wbns": awb, "pdf": "true", "invoice": "true"}
-            response = requests.get(url, headers=self.headers, params=params)
+            response = delhivery_http.get(url, operation="invoice", headers=self.headers, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -546,7 +632,8 @@ class DelhiveryService:
                 "cancellation": "true"
             }
             
-            response = requests.post(url, headers=self.headers, json=payload)
+            # Cancelling an already cancelled waybill is a no-op, so this is safe to retry
+            response = delhivery_http.post(url, operation="cancel", idempotent=True, headers=self.headers, json=payload)
             
             if response.status_code == 200:
                 data = response.json()
@@ -0,0 +1,427 @@
+"""
+Courier status pushes (webhooks).
+
+The endpoint does a fixed amount of work per event and never touches the
+database: it checks the HMAC signature, parses the body, drops events this
+process has seen recently (an LRU of (awb, scan_time) keys) and puts the rest
+on a bounded in-memory queue. When the queue is full it answers 503 so the
+courier retries later.
+
+A worker thread drains the queue in batches of up to WEBHOOK_BATCH_SIZE. It
+first stores each batch in courier_events and commits; the unique (awb,
+scan_time) key drops repeats across workers and restarts. It then applies the
+new events oldest first, one transaction per batch:
+- order scans go through tracking.apply_tracking (forward-only status moves);
+- return pickups move pickup_scheduled -> picked_up -> received.
+
+The courier has already had its 202, so it will not send a failed batch
+again. Stored events stay pending (result NULL) until they are applied, and
+the `apply_pending_events` scheduler job retries them.
+
+Events still queued when a process dies are lost. The tracking poller
+(app/services/tracking.py) picks the same order scans up on its next run.
+"""
+import hashlib
+import hmac
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.order import Order, ReturnRequest, CourierEvent
+from app.services import tracking
+from app.services.notifications import bulk_create_notifications
+from app.utils.common import generate_id
+
+logger = logging.getLogger(__name__)
+
+# Pending events younger than this are left to the worker that stored them
+PENDING_MIN_AGE_SECONDS = 60
+PENDING_MAX_AGE_DAYS = 7
+
+RETURN_STATUS_RANK = {"approved": 0, "pickup_scheduled": 0, "picked_up": 1, "received": 2}
+
+RETURN_NOTIFICATIONS = {
+    "picked_up": ("Return Picked Up", "Your return has been picked up by the courier."),
+    "received": ("Return Received", "We have received your returned items. Your refund will be processed shortly."),
+}
+
+def sign(body: bytes, secret: str) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def verify_signature(body: bytes, signature: Optional[str], secret: str) -> bool:
+    """`signature` is the hex HMAC-SHA256 of the raw body, optionally prefixed "sha256="."""
+    if not secret or not signature:
+        return False
+    signature = signature.strip().lower()
+    if signature.startswith("sha256="):
+        signature = signature[7:]
+    return hmac.compare_digest(sign(body, secret), signature)
+
+def _text(value, limit: int) -> Optional[str]:
+    # Cut to the courier_events column size; one over-long value would fail the whole batch insert
+    if value is None:
+        return None
+    return str(value).strip()[:limit] or None
+
+def parse_push(payload) -> Tuple[list, int]:
+    """
+    Events from a push body: one {"Shipment": {...}} object, a list of them,
+    or {"Shipments": [...]}. Returns (events, number of unusable items).
+    """
+    if isinstance(payload, dict):
+        items = payload["Shipments"] if isinstance(payload.get("Shipments"), list) else [payload]
+    elif isinstance(payload, list):
+        items = payload
+    else:
+        return [], 1
+
+    events = []
+    for item in items:
+        shipment = (item.get("Shipment") or item) if isinstance(item, dict) else {}
+        status = shipment.get("Status") or {}
+        awb = str(shipment.get("AWB") or shipment.get("Waybill") or "").strip()
+        scan_time = str(status.get("StatusDateTime") or "").strip()
+        if not awb or not scan_time:
+            continue
+        events.append({
+            "awb": awb[:50],
+            "scan_time": scan_time[:40],
+            "status": _text(status.get("Status"), 100),
+            "status_type": _text(status.get("StatusType"), 10),
+            "location": _text(status.get("StatusLocation"), 200),
+            "instructions": status.get("Instructions"),
+            "status_code": status.get("StatusCode") or status.get("StatusType"),
+            "expected_delivery": shipment.get("ExpectedDeliveryDate"),
+            "payload": item
+        })
+    return events, len(items) - len(events)
+
+def return_status(event: dict) -> Optional[str]:
+    """Return status implied by a scan on a return pickup AWB"""
+    status = (event.get("status") or "").strip().lower()
+    status_type = (event.get("status_type") or "").strip().upper()
+    if status in ("delivered", "dto") or status_type == "DL":
+        return "received"
+    if status in ("picked up", "pickedup", "in transit") or status_type == "PU":
+        return "picked_up"
+    return None
+
+def _apply_order(db: Session, order: Order, event: dict, now: datetime) -> Optional[dict]:
+    summary = order.tracking_summary or {}
+    shipment = {
+        "status": event["status"],
+        "current_location": event["location"],
+        "destination": summary.get("destination"),
+        "expected_delivery": event["expected_delivery"] or summary.get("expected_delivery"),
+        "tracking_history": [{
+            "date": event["scan_time"],
+            "status": event["status"],
+            "location": event["location"],
+            "instructions": event["instructions"],
+            "status_code": event["status_code"]
+        }]
+    }
+    _, status = tracking.apply_tracking(db, order, shipment, now)
+    return tracking.status_notification(order, status, now) if status else None
+
+def _apply_return(return_request: ReturnRequest, event: dict, now: datetime) -> Optional[dict]:
+    target = return_status(event)
+    current = RETURN_STATUS_RANK.get(return_request.status)
+    if target is None or current is None or RETURN_STATUS_RANK[target] <= current:
+        return None
+    return_request.status = target
+    return_request.updated_at = now
+    if target == "picked_up":
+        return_request.pickup_completed_date = now
+    else:
+        return_request.received_date = now
+
+    title, message = RETURN_NOTIFICATIONS[target]
+    return {
+        "id": generate_id(),
+        "type": f"return_{target}",
+        "title": title,
+        "message": message,
+        "user_id": return_request.user_id,
+        "data": {"return_id": return_request.id},
+        "for_admin": False,
+        "read": False,
+        "created_at": now
+    }
+
+def _apply(db: Session, events: list, now: datetime) -> list:
+    """Apply events (oldest first) to their orders/returns; returns each event's result."""
+    awbs = {event["awb"] for event in events}
+    returns = {row.return_awb: row for row in db.query(ReturnRequest).filter(ReturnRequest.return_awb.in_(awbs))}
+    orders = {row.tracking_number: row for row in db.query(Order).filter(Order.tracking_number.in_(awbs - returns.keys()))}
+
+    results, notifications = [], []
+    for event in events:
+        if event["awb"] in returns:
+            results.append("return")
+            notifications.append(_apply_return(returns[event["awb"]], event, now))
+        elif event["awb"] in orders:
+            results.append("order")
+            notifications.append(_apply_order(db, orders[event["awb"]], event, now))
+        else:
+            results.append("unmatched")
+    bulk_create_notifications(db, [row for row in notifications if row])
+    return results
+
+def _record_results(db: Session, ids: list, results: list, now: datetime):
+    table = CourierEvent.__table__
+    db.execute(
+        update(table).where(table.c.id == bindparam("b_id")).values(
+            applied_at=bindparam("b_applied_at"), result=bindparam("b_result")
+        ),
+        [{"b_id": row_id, "b_applied_at": now if result in ("order", "return") else None, "b_result": result}
+         for row_id, result in zip(ids, results)]
+    )
+
+def apply_events(db: Session, events: list) -> dict:
+    """
+    Store events not seen before (by awb, scan_time) and commit, then apply
+    them and record each result; commits. Returns counts. If applying raises,
+    the stored events stay pending for `apply_pending_events`.
+    """
+    now = datetime.utcnow()
+    unique = {}
+    for event in events:
+        unique.setdefault((event["awb"], event["scan_time"]), event)
+    known = {
+        (awb, scan_time) for awb, scan_time in db.query(CourierEvent.awb, CourierEvent.scan_time).filter(
+            CourierEvent.awb.in_({awb for awb, _ in unique})
+        )
+    }
+    new = sorted((event for key, event in unique.items() if key not in known), key=lambda event: event["scan_time"])
+    report = {"stored": len(new), "duplicates": len(events) - len(new), "order": 0, "return": 0, "unmatched": 0}
+    if not new:
+        return report
+
+    ids = [generate_id() for _ in new]
+    db.execute(insert(CourierEvent), [
+        {
+            "id": row_id,
+            "awb": event["awb"],
+            "scan_time": event["scan_time"],
+            "status": event["status"],
+            "status_type": event["status_type"],
+            "location": event["location"],
+            "payload": event["payload"],
+            "received_at": now,
+            "applied_at": None,
+            "result": None
+        }
+        for row_id, event in zip(ids, new)
+    ])
+    db.commit()
+
+    results = _apply(db, new, now)
+    _record_results(db, ids, results, now)
+    db.commit()
+    for result in results:
+        report[result] += 1
+    return report
+
+def _event_from_row(row: CourierEvent) -> dict:
+    events, _ = parse_push(row.payload or {})
+    return events[0] if events else {
+        "awb": row.awb, "scan_time": row.scan_time, "status": row.status, "status_type": row.status_type,
+        "location": row.location, "instructions": None, "status_code": row.status_type, "expected_delivery": None
+    }
+
+def _apply_rows(db: Session, rows: list) -> list:
+    """Apply stored events and record their results, committing; a failing batch is retried one event at a time."""
+    now = datetime.utcnow()
+    try:
+        results = _apply(db, [_event_from_row(row) for row in rows], now)
+        _record_results(db, [row.id for row in rows], results, now)
+        db.commit()
+        return results
+    except Exception:
+        db.rollback()
+        if len(rows) > 1:
+            return [result for row in rows for result in _apply_rows(db, [row])]
+        # Parked so it is not retried forever; reapply_events replays it once the cause is fixed
+        logger.exception(f"Applying courier event {rows[0].id} for AWB {rows[0].awb} failed")
+        _record_results(db, [rows[0].id], ["failed"], now)
+        db.commit()
+        return ["failed"]
+
+def apply_pending_events(db: Session, batch_size: int = 200) -> dict:
+    """
+    Scheduler job: apply stored events whose batch failed in the webhook
+    worker (result still NULL), oldest scan first.
+    """
+    now = datetime.utcnow()
+    query = db.query(CourierEvent).filter(
+        CourierEvent.received_at >= now - timedelta(days=PENDING_MAX_AGE_DAYS),
+        CourierEvent.received_at < now - timedelta(seconds=PENDING_MIN_AGE_SECONDS),
+        CourierEvent.result.is_(None)
+    ).order_by(CourierEvent.scan_time, CourierEvent.id)
+
+    report = {"events": 0, "order": 0, "return": 0, "unmatched": 0, "failed": 0}
+    while True:
+        # Every row gets a result, so each page starts at the oldest still pending
+        rows = query.limit(batch_size).all()
+        if not rows:
+            break
+        for result in _apply_rows(db, rows):
+            report[result] += 1
+        report["events"] += len(rows)
+    if report["events"]:
+        logger.info(f"Applied pending courier events: {report}")
+    return report
+
+def reapply_events(db: Session, since: datetime = None, awb: str = None, batch_size: int = 500) -> dict:
+    """
+    Apply stored events again (after fixing an order's AWB, or a bug). Safe
+    to repeat: scans are merged and statuses only move forward.
+    """
+    query = db.query(CourierEvent).order_by(CourierEvent.scan_time, CourierEvent.id)
+    if since:
+        query = query.filter(CourierEvent.received_at >= since)
+    if awb:
+        query = query.filter(CourierEvent.awb == awb)
+
+    report = {"events": 0, "order": 0, "return": 0, "unmatched": 0}
+    for offset in range(0, query.count(), batch_size):
+        rows = query.offset(offset).limit(batch_size).all()
+        now = datetime.utcnow()
+        results = _apply(db, [_event_from_row(row) for row in rows], now)
+        _record_results(db, [row.id for row in rows], results, now)
+        db.commit()
+        report["events"] += len(rows)
+        for result in results:
+            report[result] += 1
+    return report
+
+class WebhookQueue:
+    """Bounded hand-off from the webhook endpoint to one applying thread per process."""
+
+    def __init__(self, maxsize: int, batch_size: int, seen_size: int = 50_000):
+        self.batch_size = max(1, batch_size)
+        self.seen_size = seen_size
+        self._queue = queue.Queue(maxsize)
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.received = self.accepted = self.duplicates = self.rejected = 0
+        self.stored = self.db_duplicates = self.failed_batches = 0
+        self.applied = {"order": 0, "return": 0, "unmatched": 0}
+
+    def offer(self, events: list) -> Tuple[int, int]:
+        """
+        Queue the events not seen recently without blocking; returns
+        (accepted, duplicates). Raises queue.Full once the queue is full;
+        events queued before that stay queued.
+        """
+        accepted = duplicates = 0
+        with self._lock:
+            self.received += len(events)
+            try:
+                for event in events:
+                    key = (event["awb"], event["scan_time"])
+                    if key in self._seen:
+                        duplicates += 1
+                        continue
+                    self._queue.put_nowait(event)
+                    self._seen[key] = None
+                    if len(self._seen) > self.seen_size:
+                        self._seen.popitem(last=False)
+                    accepted += 1
+            except queue.Full:
+                self.rejected += len(events) - accepted - duplicates
+                raise
+            finally:
+                self.accepted += accepted
+                self.duplicates += duplicates
+        return accepted, duplicates
+
+    def _process(self, batch: list):
+        db = SessionLocal()
+        try:
+            try:
+                report = apply_events(db, batch)
+            except IntegrityError:
+                # Another worker stored some of these first; the retry sees them as known
+                db.rollback()
+                report = apply_events(db, batch)
+            with self._lock:
+                self.stored += report["stored"]
+                self.db_duplicates += report["duplicates"]
+                for result in self.applied:
+                    self.applied[result] += report[result]
+        except Exception:
+            db.rollback()
+            self.failed_batches += 1
+            logger.exception(f"Applying {len(batch)} courier events failed; stored ones are retried by the scheduler")
+        finally:
+            db.close()
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="courier-webhooks", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Apply what is still queued (up to `timeout`) and stop the thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def drain(self, timeout: float = 30) -> bool:
+        """Wait until everything queued so far has been applied."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "capacity": self._queue.maxsize,
+                "received": self.received,
+                "accepted": self.accepted,
+                "duplicates": self.duplicates,
+                "rejected": self.rejected,
+                "stored": self.stored,
+                "db_duplicates": self.db_duplicates,
+                "applied": dict(self.applied),
+                "failed_batches": self.failed_batches,
+                "running": bool(self._thread and self._thread.is_alive())
+            }
+
+webhook_queue = WebhookQueue(settings.WEBHOOK_QUEUE_SIZE, settings.WEBHOOK_BATCH_SIZE)
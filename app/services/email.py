@@ -335,3 +335,67 @@ If you have any questions, please contact our support team at support@amolias.co
     """
     
     return send_email(to_email, subject, html_body, text_body)
+
+
+def send_wishlist_alert_email(to_email: str, name: str, messages: list) -> bool:
+    """
+    Send a digest of price-drop / back-in-stock alerts for wishlisted products.
+    
+    Args:
+        to_email: Recipient email address
+        name: Customer name
+        messages: One line per alerted product
+    
+    Returns:
+        bool: True if email was sent successfully
+    """
+    subject = "Amorlias Mart - Good news about your wishlist"
+    items_html = "".join(f"<li>{message}</li>" for message in messages)
+    items_text = "\n".join(f"- {message}" for message in messages)
+    
+    html_body = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            .header {{ background-color: #3B82F6; color: white; padding: 20px; text-align: center; }}
+            .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 5px; margin-top: 20px; }}
+            .footer {{ text-align: center; margin-top: 30px; font-size: 12px; color: #666; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>Wishlist Update</h1>
+            </div>
+            <div class="content">
+                <p>Hello {name or 'there'},</p>
+                <p>Some items in your wishlist have changed:</p>
+                <ul>{items_html}</ul>
+                <p>Grab them before they are gone!</p>
+            </div>
+            <div class="footer">
+                <p>&copy; 2024 Amorlias Mart. All rights reserved.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    text_body = f"""
+Amorlias Mart - Wishlist Update
+
+Hello {name or 'there'},
+
+Some items in your wishlist have changed:
+{items_text}
+
+Grab them before they are gone!
+
+---
+© 2024 Amorlias Mart. All rights reserved.
+    """
+    
+    return send_email(to_email, subject, html_body, text_body)
@@ -0,0 +1,108 @@
+"""
+In-process pub/sub for server-sent events (GET /notifications/stream).
+
+Code that changes state queues events on its DB session with `queue_event`.
+They are published when that session commits, and dropped if it rolls back.
+Subscribers are SSE connections, one asyncio.Queue each. An idle connection
+costs a queue and a parked coroutine; it holds no thread and no DB session.
+
+With several worker processes, an event is only published in the process
+that committed it; see NotificationPoller in app/services/notifications.py
+for the cross-worker fallback.
+
+Event ids are microsecond timestamps, so a reconnecting client's
+Last-Event-ID can be resumed from `notifications.created_at`. That column is
+stamped before commit, so ids are not in commit order; resume re-reads an
+overlap window (see notifications_since).
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+
+EPOCH = datetime(1970, 1, 1)
+SUBSCRIBER_QUEUE_SIZE = 100
+
+def event_id(when: datetime) -> int:
+    return int((when - EPOCH).total_seconds() * 1_000_000)
+
+def event_time(value: int) -> datetime:
+    return datetime.utcfromtimestamp(value / 1_000_000)
+
+class Subscription:
+    __slots__ = ("channels", "queue", "loop", "overflowed")
+
+    def __init__(self, channels: Iterable[str], loop: asyncio.AbstractEventLoop):
+        self.channels = tuple(channels)
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.loop = loop
+        self.overflowed = False
+
+    def _push(self, item: dict):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # A stalled client: end its stream so it reconnects and resumes from Last-Event-ID
+            self.overflowed = True
+
+class EventBroker:
+    def __init__(self):
+        self._channels = defaultdict(set)
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.published = 0
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        subscription = Subscription(channels, asyncio.get_running_loop())
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels[channel].add(subscription)
+            self.connections += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+            self.connections -= 1
+
+    def publish(self, channel: str, item: dict):
+        """Thread-safe; may be called from sync endpoints and background jobs."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription._push, item)
+        self.published += 1
+
+broker = EventBroker()
+
+def queue_event(db: Session, channel: str, kind: str, payload: dict, when: datetime = None):
+    """Publish an event to `channel` once `db` commits."""
+    if not channel:
+        return
+    item = {"id": event_id(when or datetime.utcnow()), "event": kind, "data": payload}
+    db.info.setdefault("pending_events", []).append((channel, item))
+
+# Both hooks also fire when a SAVEPOINT is released or rolled back (e.g. the
+# insert race in increment_counter); pending events belong to the outer transaction.
+@sa_event.listens_for(SessionLocal, "after_commit")
+def _publish_committed_events(session):
+    if session.in_nested_transaction():
+        return
+    for channel, item in session.info.pop("pending_events", ()):
+        broker.publish(channel, item)
+
+@sa_event.listens_for(SessionLocal, "after_rollback")
+def _discard_pending_events(session):
+    if not session.in_nested_transaction():
+        session.info.pop("pending_events", None)
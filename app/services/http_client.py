@@ -0,0 +1,198 @@
+"""
+Shared outbound HTTP client for third-party APIs (courier, payments, ...).
+
+`ResilientClient` wraps one pooled `requests.Session`, so calls reuse
+keep-alive connections instead of paying a TCP + TLS handshake each time,
+and adds:
+
+* a (connect, read) timeout on every call, so a hung upstream cannot pin a
+  worker thread;
+* retries with full-jitter exponential backoff. Idempotent calls are
+  retried on connection errors, timeouts and 429/502/503/504. Other calls
+  are retried only when the connection could not be established, i.e. the
+  request was never sent;
+* a circuit breaker. After `failure_threshold` consecutive failures, calls
+  fail fast with `CircuitOpenError` for `reset_seconds`, then one trial call
+  is let through (half-open) to decide whether to close the breaker again;
+* per-operation metrics (`metrics()`).
+
+`CircuitOpenError` subclasses `requests.RequestException`, so callers that
+already handle request failures handle an open circuit the same way.
+"""
+import random
+import threading
+import time
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class _OperationStats:
+    __slots__ = ("calls", "failures", "retries", "short_circuited", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.calls = self.failures = self.retries = self.short_circuited = 0
+        self.total_seconds = self.max_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        completed = self.calls - self.short_circuited
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "short_circuited": self.short_circuited,
+            "avg_ms": round(self.total_seconds / completed * 1000, 2) if completed else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2)
+        }
+
+class ResilientClient:
+    def __init__(self, name: str, timeout: Tuple[float, float], max_retries: int = 2,
+                 backoff_base: float = 0.2, backoff_max: float = 2.0, pool_size: int = 20,
+                 failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.session = requests.Session()
+        # Retries are done here, not by urllib3, so they respect idempotency and the breaker
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, operation: str, **changes):
+        with self._lock:
+            stats = self._stats.setdefault(operation, _OperationStats())
+            for field, value in changes.items():
+                if field == "seconds":
+                    stats.total_seconds += value
+                    stats.max_seconds = max(stats.max_seconds, value)
+                else:
+                    setattr(stats, field, getattr(stats, field) + value)
+
+    def request(self, method: str, url: str, operation: str = None, idempotent: bool = None,
+                timeout: Optional[Tuple[float, float]] = None, **kwargs) -> requests.Response:
+        """
+        Send a request through the pool. Returns the final response (which may
+        be an error status), or raises the last exception / CircuitOpenError.
+        """
+        operation = operation or method.upper()
+        if idempotent is None:
+            idempotent = method.upper() in ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+        timeout = timeout or self.timeout
+        self._record(operation, calls=1)
+
+        if not self.breaker.allow():
+            self._record(operation, short_circuited=1)
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+                except requests.exceptions.ConnectTimeout:
+                    # Never reached the server, so safe to retry any method
+                    if attempt >= self.max_retries:
+                        raise
+                    response = None
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if not idempotent or attempt >= self.max_retries:
+                        raise
+                    response = None
+                else:
+                    if not (idempotent and response.status_code in RETRY_STATUSES) or attempt >= self.max_retries:
+                        break
+
+                attempt += 1
+                self._record(operation, retries=1)
+                retry_after = ""
+                if response is not None:
+                    retry_after = response.headers.get("Retry-After", "")
+                    response.close()
+                delay = float(retry_after) if retry_after.isdigit() else self._backoff(attempt)
+                time.sleep(min(delay, self.backoff_max))
+        except requests.RequestException:
+            self.breaker.record_failure()
+            self._record(operation, failures=1, seconds=time.perf_counter() - started)
+            raise
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+            self._record(operation, failures=1, seconds=time.perf_counter() - started)
+        else:
+            self.breaker.record_success()
+            self._record(operation, seconds=time.perf_counter() - started)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            operations = {operation: stats.as_dict() for operation, stats in self._stats.items()}
+        return {
+            "name": self.name,
+            "circuit": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "times_opened": self.breaker.times_opened
+            },
+            "operations": operations
+        }
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.orm import Session
+
+from app.models.product import Product, InventoryLog
+from app.utils.common import generate_id
+
+def restock(db: Session, quantities: dict, log_type: str = "return", notes: str = None, created_by: str = None) -> dict:
+    """
+    Add `quantities` ({product_id: qty}) back to stock with one executemany
+    UPDATE (stock_qty = stock_qty + :q) and one bulk InventoryLog insert.
+    Products that no longer exist are skipped. Runs in the caller's
+    transaction; returns the quantities actually applied.
+    """
+    quantities = {product_id: qty for product_id, qty in quantities.items() if product_id and qty}
+    if not quantities:
+        return {}
+
+    # Lock the rows so the logged previous/new quantities match what the UPDATE does
+    current = dict(
+        db.query(Product.id, Product.stock_qty).filter(Product.id.in_(quantities)).with_for_update().all()
+    )
+    skus = dict(db.query(Product.id, Product.sku).filter(Product.id.in_(current)).all())
+    applied = {product_id: qty for product_id, qty in quantities.items() if product_id in current}
+    if not applied:
+        return {}
+
+    now = datetime.utcnow()
+    table = Product.__table__
+    db.execute(
+        update(table).where(table.c.id == bindparam("product_id")).values(
+            stock_qty=table.c.stock_qty + bindparam("qty"),
+            updated_at=now
+        ),
+        [{"product_id": product_id, "qty": qty} for product_id, qty in applied.items()]
+    )
+    db.execute(insert(InventoryLog), [
+        {
+            "id": generate_id(),
+            "product_id": product_id,
+            "sku": skus.get(product_id),
+            "type": log_type,
+            "quantity": qty,
+            "previous_qty": current[product_id] or 0,
+            "new_qty": (current[product_id] or 0) + qty,
+            "notes": notes,
+            "created_by": created_by,
+            "created_at": now
+        }
+        for product_id, qty in applied.items()
+    ])
+    return applied
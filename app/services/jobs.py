@@ -0,0 +1,218 @@
+"""
+Background jobs for long admin operations.
+
+`submit` stores a BackgroundJob row and hands it to the thread pool of its
+kind, so the request returns the job id straight away. Each pool has a
+fixed number of workers and admits only a bounded number of waiting jobs;
+beyond that submit answers 503 rather than piling up work:
+
+- "bulk": long multi-order runs (JOB_WORKERS, JOB_QUEUE_LIMIT)
+- "courier": single courier calls such as shipping or cancelling one order
+  (COURIER_JOB_WORKERS, COURIER_JOB_QUEUE_LIMIT), so they never wait behind
+  a bulk run
+
+Handlers are registered per kind with `@job_handler(kind, pool)` and called
+as `handler(db, job, progress)` on their own session. `JobProgress.add`
+writes counts and per-item results to the job row inside the handler's own
+transaction, so progress is visible to every process and always matches
+the work that was committed. A handler raises JobFailed to end its job as
+failed after committing its own outcome; any other exception rolls back and
+notifies the admins. A job row that stops moving for JOB_STALE_MINUTES (its
+process died) is marked failed by `fail_stale_jobs`.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.settings import BackgroundJob
+from app.services.notifications import create_notification
+from app.utils.common import generate_id
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+HANDLERS: Dict[str, Tuple[Callable, str]] = {}
+
+class JobFailed(Exception):
+    """Ends a job as failed; the handler has already committed whatever it recorded."""
+
+def job_handler(kind: str, pool: str = "bulk"):
+    def register(func):
+        HANDLERS[kind] = (func, pool)
+        return func
+    return register
+
+def _update_job(db: Session, job_id: str, **values):
+    values.setdefault("updated_at", datetime.utcnow())
+    db.execute(update(BackgroundJob).where(BackgroundJob.id == job_id).values(**values))
+
+class JobProgress:
+    """Running totals of a job; each `add` is committed by the handler with its batch."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.processed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.results = []
+
+    def add(self, db: Session, results: list, succeeded: int = 0, failed: int = 0):
+        self.results.extend(results)
+        self.processed += succeeded + failed
+        self.succeeded += succeeded
+        self.failed += failed
+        _update_job(
+            db, self.job_id, processed=self.processed, succeeded=self.succeeded,
+            failed=self.failed, results=list(self.results)
+        )
+
+class JobRunner:
+    def __init__(self, name: str, workers: int, queue_limit: int):
+        self.name = name
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"jobs-{name}")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+
+    def submit(self, db: Session, kind: str, params: dict, total: int = 0, created_by: str = None) -> BackgroundJob:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many background jobs in progress, please retry shortly",
+                headers={"Retry-After": "5"}
+            )
+        try:
+            now = datetime.utcnow()
+            job = BackgroundJob(
+                id=generate_id(), kind=kind, status="queued", params=params, created_by=created_by,
+                total=total, processed=0, succeeded=0, failed=0, results=[],
+                created_at=now, updated_at=now
+            )
+            db.add(job)
+            db.commit()
+            with self._lock:
+                self.submitted += 1
+                self.in_flight += 1
+            self._executor.submit(self._run, job.id)
+        except Exception:
+            self._slots.release()
+            raise
+        return job
+
+    def _run(self, job_id: str):
+        db = SessionLocal()
+        kind = "background"
+        try:
+            job = db.get(BackgroundJob, job_id)
+            kind = job.kind
+            _update_job(db, job_id, status="running", started_at=datetime.utcnow())
+            db.commit()
+            HANDLERS[kind][0](db, job, JobProgress(job_id))
+            _update_job(db, job_id, status="completed", finished_at=datetime.utcnow())
+            db.commit()
+            outcome = "completed"
+        except Exception as e:
+            db.rollback()
+            if not isinstance(e, JobFailed):
+                logger.exception(f"Background job {job_id} failed")
+            try:
+                _update_job(db, job_id, status="failed", error=str(e)[:2000], finished_at=datetime.utcnow())
+                if not isinstance(e, JobFailed):
+                    create_notification(
+                        db, type="background_job", title="Background job failed",
+                        message=f"A {kind.replace('_', ' ')} job stopped with an error: {str(e)[:200]}",
+                        data={"job_id": job_id, "kind": kind}, for_admin=True
+                    )
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception(f"Could not record failure of background job {job_id}")
+            outcome = "failed"
+        finally:
+            db.close()
+            self._slots.release()
+        with self._lock:
+            self.in_flight -= 1
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def metrics(self) -> dict:
+        return {
+            "pool": self.name,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+runners = {
+    "bulk": JobRunner("bulk", workers=max(1, settings.JOB_WORKERS), queue_limit=max(0, settings.JOB_QUEUE_LIMIT)),
+    "courier": JobRunner(
+        "courier", workers=max(1, settings.COURIER_JOB_WORKERS), queue_limit=max(0, settings.COURIER_JOB_QUEUE_LIMIT)
+    ),
+}
+
+def submit(db: Session, kind: str, params: dict, total: int = 0, created_by: str = None) -> BackgroundJob:
+    if kind not in HANDLERS:
+        raise ValueError(f"No handler for job kind {kind!r}")
+    return runners[HANDLERS[kind][1]].submit(db, kind, params, total=total, created_by=created_by)
+
+def metrics() -> list:
+    return [runner.metrics() for runner in runners.values()]
+
+def active_jobs(db: Session, kinds: tuple) -> list:
+    return db.query(BackgroundJob).filter(
+        BackgroundJob.kind.in_(kinds), BackgroundJob.status.in_(ACTIVE_STATUSES)
+    ).all()
+
+def fail_stale_jobs(db: Session) -> int:
+    """Mark jobs whose row has not moved for JOB_STALE_MINUTES as failed (scheduler job)."""
+    now = datetime.utcnow()
+    result = db.execute(update(BackgroundJob).where(
+        BackgroundJob.status.in_(ACTIVE_STATUSES),
+        BackgroundJob.updated_at < now - timedelta(minutes=settings.JOB_STALE_MINUTES)
+    ).values(status="failed", error="Interrupted: no progress recorded", finished_at=now, updated_at=now))
+    db.commit()
+    if result.rowcount:
+        logger.warning(f"Marked {result.rowcount} stale background jobs as failed")
+    return result.rowcount
+
+def job_view(job: BackgroundJob, include_results: bool = True) -> dict:
+    view = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "succeeded": job.succeeded,
+        "failed": job.failed,
+        "progress": round(100 * job.processed / job.total, 1) if job.total else None,
+        "error": job.error,
+        "created_by": job.created_by,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "updated_at": job.updated_at,
+    }
+    if include_results:
+        view["results"] = job.results or []
+    return view
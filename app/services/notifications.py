@@ -0,0 +1,327 @@
+"""
+Notification creation and unread counters.
+
+Every inbox (a user, or the shared admin inbox) has a row in
+`notification_counters` that is adjusted with `unread = unread + delta` in
+the same transaction that creates, reads or deletes notifications, so the
+unread-count endpoints never COUNT(*) the notifications table. Counts are
+additionally cached in-process for a few seconds and the cache entry is
+dropped when a transaction touching that inbox commits.
+
+`reconcile_unread_counters` recounts from `notifications` and repairs any
+drift (e.g. rows changed outside these helpers).
+
+New notifications and order status changes are also queued as server-sent
+events (app/services/events.py) on the inbox's channel.
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, List
+
+from sqlalchemy import event, insert, update, delete, select, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.counters import increment_counter
+from app.db.session import SessionLocal
+from app.models.user import Notification, NotificationCounter
+from app.services.events import broker, queue_event, event_id
+from app.utils.common import generate_id
+from app.utils.pagination import keyset_page
+
+logger = logging.getLogger(__name__)
+
+ADMIN_OWNER = "admin"
+
+def owner_key(user_id: Optional[str], for_admin: bool) -> Optional[str]:
+    return ADMIN_OWNER if for_admin else user_id
+
+def owner_criteria(owner: str) -> tuple:
+    """Filter selecting the notifications that belong to an inbox."""
+    if owner == ADMIN_OWNER:
+        return (Notification.for_admin == True,)
+    return (Notification.user_id == owner, Notification.for_admin == False)
+
+class UnreadCountCache:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, owner: str) -> Optional[int]:
+        entry = self._entries.get(owner)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def put(self, owner: str, count: int):
+        if self.ttl_seconds > 0:
+            with self._lock:
+                self._entries[owner] = (count, time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, owners: Iterable[str]):
+        with self._lock:
+            for owner in owners:
+                self._entries.pop(owner, None)
+
+unread_cache = UnreadCountCache(settings.NOTIFICATION_COUNT_CACHE_SECONDS)
+
+def _adjust(db: Session, owner: Optional[str], delta: int):
+    if not owner or not delta:
+        return
+    increment_counter(db, NotificationCounter.__table__, {"owner": owner}, {"unread": delta})
+    db.info.setdefault("notification_owners", set()).add(owner)
+
+# Savepoints (increment_counter, reconcile_unread_counters) fire these hooks
+# too; the pending owners belong to the outer transaction
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_committed_counts(session):
+    if session.in_nested_transaction():
+        return
+    owners = session.info.pop("notification_owners", None)
+    if owners:
+        unread_cache.invalidate(owners)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_pending_counts(session):
+    if not session.in_nested_transaction():
+        session.info.pop("notification_owners", None)
+
+def notification_event(row) -> dict:
+    """SSE payload for a Notification (ORM object or column dict)."""
+    get = row.get if isinstance(row, dict) else lambda name, default=None: getattr(row, name, default)
+    created_at = get("created_at") or datetime.utcnow()
+    return {
+        "id": event_id(created_at),
+        "event": "notification",
+        "data": {
+            "id": get("id"),
+            "type": get("type"),
+            "title": get("title"),
+            "message": get("message"),
+            "data": get("data"),
+            "for_admin": bool(get("for_admin")),
+            "read": bool(get("read")),
+            "created_at": created_at.isoformat()
+        }
+    }
+
+def _queue_notification_event(db: Session, row):
+    user_id = row.get("user_id") if isinstance(row, dict) else row.user_id
+    event_item = notification_event(row)
+    owner = owner_key(user_id, event_item["data"]["for_admin"])
+    if owner:
+        db.info.setdefault("pending_events", []).append((owner, event_item))
+
+def create_notification(db: Session, user_id: str = None, type: str = "", title: str = "", message: str = "", data: dict = None, for_admin: bool = False):
+    """Helper function to create notifications"""
+    notification = Notification(
+        id=generate_id(),
+        type=type,
+        title=title,
+        message=message,
+        user_id=user_id,
+        data=data or {},
+        for_admin=for_admin,
+        read=False,
+        created_at=datetime.utcnow()
+    )
+    db.add(notification)
+    _adjust(db, owner_key(user_id, for_admin), 1)
+    _queue_notification_event(db, notification)
+    return notification
+
+def bulk_create_notifications(db: Session, rows: list):
+    """Insert many notification dicts with one executemany and one counter update per inbox."""
+    if not rows:
+        return
+    db.execute(insert(Notification), rows)
+    per_owner = {}
+    for row in rows:
+        owner = owner_key(row.get("user_id"), row.get("for_admin", False))
+        per_owner[owner] = per_owner.get(owner, 0) + 1
+        _queue_notification_event(db, row)
+    for owner, count in per_owner.items():
+        _adjust(db, owner, count)
+
+def queue_order_status(db: Session, order, status: str):
+    """Push an order status change to the customer's and the admin stream on commit."""
+    payload = {"order_id": order.id, "order_number": order.order_number, "status": status}
+    if order.user_id:
+        queue_event(db, order.user_id, "order_status", payload)
+    queue_event(db, ADMIN_OWNER, "order_status", payload)
+
+def mark_read(db: Session, owner: str, *criteria) -> int:
+    """Mark an inbox's unread notifications matching `criteria` read; returns how many changed."""
+    changed = db.query(Notification).filter(
+        *owner_criteria(owner), Notification.read == False, *criteria
+    ).update({"read": True}, synchronize_session=False)
+    _adjust(db, owner, -changed)
+    return changed
+
+def delete_notifications(db: Session, owner: str, *criteria) -> int:
+    """Delete an inbox's notifications matching `criteria`; returns how many were deleted."""
+    if db.get_bind().dialect.delete_returning:
+        # One statement; RETURNING tells us how many of the deleted rows were unread
+        flags = db.execute(
+            delete(Notification).where(*owner_criteria(owner), *criteria).returning(Notification.read),
+            execution_options={"synchronize_session": False}
+        ).scalars().all()
+        deleted, unread = len(flags), sum(1 for read in flags if not read)
+    else:
+        base = db.query(Notification).filter(*owner_criteria(owner), *criteria)
+        unread = base.filter(Notification.read == False).delete(synchronize_session=False)
+        deleted = unread + base.delete(synchronize_session=False)
+    _adjust(db, owner, -unread)
+    return deleted
+
+def drop_unread_counts(db: Session, ids: list):
+    """Take notifications about to be deleted by id (e.g. by retention) off their inboxes' unread counters."""
+    rows = db.query(Notification.user_id, Notification.for_admin, func.count(Notification.id)).filter(
+        Notification.id.in_(ids), Notification.read == False
+    ).group_by(Notification.user_id, Notification.for_admin).all()
+    for user_id, for_admin, count in rows:
+        _adjust(db, owner_key(user_id, for_admin), -count)
+
+def list_notifications(db: Session, owner: str, cursor: Optional[str] = None, limit: int = 50, unread_only: bool = False):
+    """One page of an inbox, newest first; returns (notifications, next_cursor)."""
+    query = db.query(Notification).filter(*owner_criteria(owner))
+    if unread_only:
+        query = query.filter(Notification.read == False)
+    return keyset_page(query, Notification.created_at, Notification.id, cursor, limit)
+
+def unread_count(db: Session, owner: str) -> int:
+    count = unread_cache.get(owner)
+    if count is None:
+        count = db.query(NotificationCounter.unread).filter(NotificationCounter.owner == owner).scalar() or 0
+        unread_cache.put(owner, max(0, count))
+    return max(0, count)
+
+def reconcile_unread_counters(db: Session) -> dict:
+    """Recount unread notifications per inbox and repair counters that drifted."""
+    actual = dict(
+        db.query(Notification.user_id, func.count(Notification.id)).filter(
+            Notification.for_admin == False,
+            Notification.read == False,
+            Notification.user_id.isnot(None)
+        ).group_by(Notification.user_id).all()
+    )
+    actual[ADMIN_OWNER] = db.query(func.count(Notification.id)).filter(
+        Notification.for_admin == True,
+        Notification.read == False
+    ).scalar() or 0
+    stored = dict(db.query(NotificationCounter.owner, NotificationCounter.unread).all())
+
+    drifted = [owner for owner in set(actual) | set(stored) if actual.get(owner, 0) != (stored.get(owner) or 0)]
+    for owner in drifted:
+        if owner not in stored:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(NotificationCounter).values(owner=owner, unread=0))
+            except IntegrityError:
+                pass
+        # Recount inside the UPDATE so increments racing with this job are not lost
+        recount = select(func.count(Notification.id)).where(
+            *owner_criteria(owner), Notification.read == False
+        ).scalar_subquery()
+        db.execute(update(NotificationCounter).where(NotificationCounter.owner == owner).values(unread=recount))
+        db.info.setdefault("notification_owners", set()).add(owner)
+    db.commit()
+
+    if drifted:
+        logger.warning(f"Repaired {len(drifted)} drifted unread notification counters")
+    return {"inboxes_checked": len(set(actual) | set(stored)), "repaired": len(drifted)}
+
+def _commit_overlap() -> timedelta:
+    return timedelta(seconds=settings.SSE_COMMIT_OVERLAP_SECONDS)
+
+def notifications_since(db: Session, since: datetime, owners: List[str], limit: int = 200) -> list:
+    """
+    Notification events for Last-Event-ID resume in the given inboxes, oldest
+    first. created_at is set before commit, so a row committed after the
+    client's last event can carry an earlier stamp; rows up to
+    SSE_COMMIT_OVERLAP_SECONDS before `since` are sent again and clients drop
+    repeats by the notification id in the payload.
+    """
+    rows = db.query(Notification).filter(
+        Notification.created_at > since - _commit_overlap(),
+        or_(*[and_(*owner_criteria(owner)) for owner in owners])
+    ).order_by(Notification.created_at, Notification.id).limit(limit).all()
+    return [notification_event(row) for row in rows]
+
+class NotificationPoller:
+    """
+    Cross-worker fallback for the event stream. Each process runs at most one
+    poll query per interval, and only while it has connected subscribers, so
+    the cost does not grow with the number of connections. Subscribers drop
+    events they already received from the in-process broker.
+
+    created_at is stamped before commit, so each poll re-reads
+    SSE_COMMIT_OVERLAP_SECONDS behind the newest row seen and skips the ids it
+    already published; a transaction that commits later than that is missed.
+    """
+
+    def __init__(self, interval_seconds: float, batch_size: int = 500):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._task = None
+
+    def start(self):
+        if self.interval_seconds > 0 and not self._task:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _poll(self, since: datetime) -> list:
+        db = SessionLocal()
+        try:
+            rows, after = [], None
+            # Keyset pages over (created_at, id): the overlap window alone may exceed one page
+            while True:
+                query = db.query(Notification).filter(Notification.created_at > since)
+                if after:
+                    query = query.filter(or_(
+                        Notification.created_at > after[0],
+                        and_(Notification.created_at == after[0], Notification.id > after[1])
+                    ))
+                page = query.order_by(Notification.created_at, Notification.id).limit(self.batch_size).all()
+                rows.extend((row.id, owner_key(row.user_id, row.for_admin), notification_event(row), row.created_at) for row in page)
+                if len(page) < self.batch_size:
+                    return rows
+                after = (page[-1].created_at, page[-1].id)
+        finally:
+            db.close()
+
+    async def _run(self):
+        from starlette.concurrency import run_in_threadpool
+
+        overlap = _commit_overlap()
+        watermark = datetime.utcnow()
+        published = {}  # notification id -> created_at, for rows inside the overlap window
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            if not broker.connections:
+                watermark = datetime.utcnow()
+                published.clear()
+                continue
+            try:
+                for row_id, owner, event_item, created_at in await run_in_threadpool(self._poll, watermark - overlap):
+                    if row_id in published:
+                        continue
+                    published[row_id] = created_at
+                    if owner:
+                        broker.publish(owner, event_item)
+                    watermark = max(watermark, created_at)
+                horizon = watermark - overlap
+                published = {row_id: created_at for row_id, created_at in published.items() if created_at > horizon}
+            except Exception:
+                logger.exception("Notification poll failed")
+
+notification_poller = NotificationPoller(settings.SSE_POLL_SECONDS)
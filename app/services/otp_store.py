@@ -0,0 +1,180 @@
+"""
+OTP storage.
+
+Endpoints talk to `otp_store`, which is either:
+
+* `DatabaseOTPStore` (OTP_STORE=db, default) - one row per phone in `otps`,
+  looked up through the (phone, expiry) index. Expired rows are removed by a
+  periodic sweeper job. Works across multiple workers.
+* `MemoryOTPStore` (OTP_STORE=memory) - a per-process dict with an expiry
+  heap, evicting expired entries as new ones are written. For single-worker
+  deployments and development.
+
+Both keep a failed-attempt counter on the entry itself, so enforcing
+OTP_MAX_ATTEMPTS costs no extra queries.
+"""
+import heapq
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import update, delete, func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.user import OTP
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 1000
+
+# Results of OTPStore.check()
+OTP_OK = "ok"
+OTP_MISSING = "missing"
+OTP_INVALID = "invalid"
+OTP_EXPIRED = "expired"
+OTP_LOCKED = "locked"
+
+class OTPStore(ABC):
+    @abstractmethod
+    def issue(self, db: Session, phone: str, otp: str, ttl: timedelta):
+        """Store a fresh OTP for `phone`, replacing any previous one and resetting its attempt counter."""
+
+    @abstractmethod
+    def check(self, db: Session, phone: str, otp: str, allow_verified: bool = True) -> str:
+        """Verify `otp`, marking the entry verified on success and counting the attempt on failure."""
+
+    @abstractmethod
+    def is_verified(self, db: Session, phone: str) -> bool:
+        """True if `phone` has an unexpired, verified OTP."""
+
+    @abstractmethod
+    def discard(self, db: Session, phone: str):
+        """Forget the OTP of `phone`."""
+
+    @abstractmethod
+    def sweep(self, db: Session) -> int:
+        """Remove expired entries; returns how many were removed."""
+
+class _MemoryEntry:
+    __slots__ = ("otp", "expiry", "verified", "attempts")
+
+    def __init__(self, otp: str, expiry: datetime):
+        self.otp = otp
+        self.expiry = expiry
+        self.verified = False
+        self.attempts = 0
+
+class MemoryOTPStore(OTPStore):
+    def __init__(self):
+        self._entries = {}
+        self._expiries = []  # min-heap of (expiry, phone); stale pairs are skipped on pop
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: datetime) -> int:
+        removed = 0
+        while self._expiries and self._expiries[0][0] <= now:
+            expiry, phone = heapq.heappop(self._expiries)
+            entry = self._entries.get(phone)
+            if entry and entry.expiry == expiry:
+                del self._entries[phone]
+                removed += 1
+        return removed
+
+    def issue(self, db, phone, otp, ttl):
+        now = datetime.utcnow()
+        with self._lock:
+            self._evict_expired(now)
+            entry = _MemoryEntry(otp, now + ttl)
+            self._entries[phone] = entry
+            heapq.heappush(self._expiries, (entry.expiry, phone))
+
+    def check(self, db, phone, otp, allow_verified=True):
+        with self._lock:
+            entry = self._entries.get(phone)
+            if not entry or (entry.verified and not allow_verified):
+                return OTP_MISSING
+            if datetime.utcnow() > entry.expiry:
+                del self._entries[phone]
+                return OTP_EXPIRED
+            if entry.attempts >= settings.OTP_MAX_ATTEMPTS:
+                return OTP_LOCKED
+            if entry.otp != otp:
+                entry.attempts += 1
+                return OTP_INVALID
+            entry.verified = True
+            return OTP_OK
+
+    def is_verified(self, db, phone):
+        entry = self._entries.get(phone)
+        return bool(entry and entry.verified and entry.expiry >= datetime.utcnow())
+
+    def discard(self, db, phone):
+        with self._lock:
+            self._entries.pop(phone, None)
+
+    def sweep(self, db):
+        with self._lock:
+            return self._evict_expired(datetime.utcnow())
+
+class DatabaseOTPStore(OTPStore):
+    def _latest(self, db: Session, phone: str) -> Optional[OTP]:
+        return db.query(OTP).filter(OTP.phone == phone).order_by(OTP.expiry.desc()).first()
+
+    def issue(self, db, phone, otp, ttl):
+        values = {"otp": otp, "expiry": datetime.utcnow() + ttl, "verified": False, "attempts": 0}
+        if not db.execute(update(OTP).where(OTP.phone == phone).values(**values)).rowcount:
+            db.add(OTP(phone=phone, **values))
+        db.commit()
+
+    def check(self, db, phone, otp, allow_verified=True):
+        otp_doc = self._latest(db, phone)
+        if not otp_doc or (otp_doc.verified and not allow_verified):
+            return OTP_MISSING
+        if datetime.utcnow() > otp_doc.expiry:
+            return OTP_EXPIRED
+        if (otp_doc.attempts or 0) >= settings.OTP_MAX_ATTEMPTS:
+            return OTP_LOCKED
+        if otp_doc.otp != otp:
+            # Counted in SQL so concurrent guesses cannot overwrite each other
+            otp_doc.attempts = func.coalesce(OTP.attempts, 0) + 1
+            db.commit()
+            return OTP_INVALID
+        otp_doc.verified = True
+        db.commit()
+        return OTP_OK
+
+    def is_verified(self, db, phone):
+        return db.query(OTP.id).filter(
+            OTP.phone == phone,
+            OTP.expiry >= datetime.utcnow(),
+            OTP.verified == True
+        ).first() is not None
+
+    def discard(self, db, phone):
+        db.execute(delete(OTP).where(OTP.phone == phone))
+        db.commit()
+
+    def sweep(self, db):
+        # Batched so a large backlog never holds a long lock on the table OTP requests write to
+        now = datetime.utcnow()
+        removed = 0
+        while True:
+            ids = [row.id for row in db.query(OTP.id).filter(OTP.expiry < now).limit(SWEEP_BATCH_SIZE)]
+            if ids:
+                removed += db.execute(delete(OTP).where(OTP.id.in_(ids))).rowcount
+            db.commit()
+            if len(ids) < SWEEP_BATCH_SIZE:
+                break
+        if removed:
+            logger.info(f"Removed {removed} expired OTPs")
+        return removed
+
+def _create_store() -> OTPStore:
+    if settings.OTP_STORE == "memory":
+        return MemoryOTPStore()
+    return DatabaseOTPStore()
+
+otp_store = _create_store()
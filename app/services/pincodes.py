@@ -0,0 +1,295 @@
+"""
+Pincode serviceability from a local table instead of one API call per lookup.
+
+PincodeServiceability holds the courier's pincode list (about 19k rows). It
+is bulk-loaded by `refresh_from_api` (a full-list pull, also run on a
+schedule) or `import_file` (CSV or a saved pin-codes API response, see
+scripts/import_pincodes.py).
+
+Each worker keeps the whole table in a dict (`pincode_directory`). Once it
+is older than PINCODE_CACHE_TTL_SECONDS it is reloaded from the table in the
+background while the old copy keeps serving. A pincode the table does not
+know is fetched from the API on a small background pool (one fetch per
+pincode, however many requests miss on it at once) and saved to the table;
+the request waits up to PINCODE_MISS_WAIT_SECONDS for that fetch and
+otherwise gets a provisional answer.
+"""
+import csv
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.settings import PincodeServiceability
+from app.services.checkpoints import load_checkpoint, advance_checkpoint
+from app.services.courier import DelhiveryService, parse_pincode_codes, serviceability_response
+from app.services.shipping_rates import rate_engine
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "pincode_refresh"
+
+# Column order of the tuples kept in memory (tuples are far smaller than dicts for 19k entries)
+FIELDS = ("serviceable", "cod", "prepaid", "pickup", "cash_pickup", "repl", "city", "state", "district")
+FLAGS = FIELDS[:6]
+
+def _values(record: dict) -> tuple:
+    return tuple(bool(record.get(field)) if field in FLAGS else record.get(field) for field in FIELDS)
+
+def _is_pincode(pincode: str) -> bool:
+    return len(pincode) == 6 and pincode.isdigit() and pincode[0] != "0"
+
+def save_records(db: Session, records: list, source: str, full: bool = False) -> dict:
+    """
+    Upsert pincode records (one bulk INSERT for new pincodes, one executemany
+    UPDATE for known ones). With `full`, `records` is the complete
+    serviceable list and any other serviceable pincode is marked
+    unserviceable. Runs in the caller's transaction.
+    """
+    table = PincodeServiceability.__table__
+    now = datetime.utcnow()
+    rows = {}
+    for record in records:
+        pincode = str(record.get("pincode", "")).strip()
+        if _is_pincode(pincode):
+            rows[pincode] = {"pincode": pincode, **dict(zip(FIELDS, _values(record))), "source": source, "updated_at": now}
+
+    query = db.query(PincodeServiceability.pincode)
+    if len(rows) <= 500:
+        query = query.filter(PincodeServiceability.pincode.in_(rows))
+    existing = {pincode for (pincode,) in query}
+
+    new = [row for pincode, row in rows.items() if pincode not in existing]
+    known = [{f"b_{key}": value for key, value in row.items()} for pincode, row in rows.items() if pincode in existing]
+    if new:
+        db.execute(insert(table), new)
+    if known:
+        db.execute(
+            update(table).where(table.c.pincode == bindparam("b_pincode")).values(
+                {column: bindparam(f"b_{column}") for column in FIELDS + ("source", "updated_at")}
+            ),
+            known
+        )
+
+    withdrawn = 0
+    if full and rows:
+        serviceable = {pincode for (pincode,) in db.query(PincodeServiceability.pincode).filter(
+            PincodeServiceability.serviceable == True
+        )}
+        gone = list(serviceable - rows.keys())
+        for start in range(0, len(gone), 500):
+            db.execute(update(table).where(table.c.pincode.in_(gone[start:start + 500])).values(
+                serviceable=False, source=source, updated_at=now
+            ))
+        withdrawn = len(gone)
+
+    return {"inserted": len(new), "updated": len(known), "withdrawn": withdrawn}
+
+def _record_refresh(db: Session, checkpoint, source: str, counts: dict, started: float) -> dict:
+    result = {**counts, "source": source, "seconds": round(time.monotonic() - started, 3)}
+    advance_checkpoint(checkpoint, datetime.utcnow(), last_run=result)
+    db.commit()
+    pincode_directory.expire()
+    rate_engine.expire()
+    logger.info(f"Pincode table refreshed from {source}: {result}")
+    return result
+
+def refresh_from_api(db: Session, force: bool = False) -> dict:
+    """
+    Pull the full pincode list from the courier and replace the table's
+    serviceable set (scheduler job). Unless forced, skipped when the table was
+    refreshed less than PINCODE_REFRESH_HOURS ago (e.g. by another worker).
+    """
+    checkpoint = load_checkpoint(db, CHECKPOINT_NAME)
+    if not force and checkpoint.watermark and settings.PINCODE_REFRESH_HOURS > 0 and \
+            datetime.utcnow() - checkpoint.watermark < timedelta(hours=settings.PINCODE_REFRESH_HOURS * 0.9):
+        return (checkpoint.data or {}).get("last_run")
+
+    started = time.monotonic()
+    records = DelhiveryService(settings.DELHIVERY_TOKEN).fetch_pincodes()
+    if not records:
+        # Never wipe the table because the courier returned an empty list
+        raise ValueError("Courier returned an empty pincode list")
+    return _record_refresh(db, checkpoint, "api", save_records(db, records, "api", full=True), started)
+
+def _flag(value) -> bool:
+    return str(value or "").strip().lower() in ("y", "yes", "true", "1")
+
+def read_pincode_file(path: Path) -> list:
+    """
+    Records from a saved pin-codes API response (.json) or a CSV with a
+    header row: pincode (or pin), city, state (or state_code), district, and
+    Y/N columns cod, prepaid (or pre_paid), pickup, cash_pickup (or cash),
+    repl and optionally serviceable.
+    """
+    if path.suffix.lower() == ".json":
+        return parse_pincode_codes(json.loads(path.read_text()))
+
+    records = []
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        for row in csv.DictReader(handle):
+            row = {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+            records.append({
+                "pincode": row.get("pincode") or row.get("pin"),
+                "serviceable": _flag(row.get("serviceable", "Y")),
+                "cod": _flag(row.get("cod")),
+                "prepaid": _flag(row.get("prepaid", row.get("pre_paid"))),
+                "pickup": _flag(row.get("pickup")),
+                "cash_pickup": _flag(row.get("cash_pickup", row.get("cash"))),
+                "repl": _flag(row.get("repl")),
+                "city": row.get("city") or None,
+                "state": row.get("state") or row.get("state_code") or None,
+                "district": row.get("district") or None
+            })
+    return records
+
+def import_file(db: Session, path: Path, replace: bool = False) -> dict:
+    """Load a pincode file; `replace` treats it as the complete serviceable list."""
+    started = time.monotonic()
+    records = read_pincode_file(Path(path))
+    if not records:
+        raise ValueError(f"No pincodes found in {path}")
+    checkpoint = load_checkpoint(db, CHECKPOINT_NAME)
+    return _record_refresh(db, checkpoint, "import", save_records(db, records, "import", full=replace), started)
+
+def last_pincode_refresh(db: Session):
+    checkpoint = load_checkpoint(db, CHECKPOINT_NAME)
+    return (checkpoint.data or {}).get("last_run")
+
+class PincodeDirectory:
+    """In-memory pincode -> FIELDS tuple map over PincodeServiceability, one per worker."""
+
+    def __init__(self, ttl_seconds: float, miss_wait_seconds: float, workers: int = 2):
+        self.ttl_seconds = ttl_seconds
+        self.miss_wait_seconds = miss_wait_seconds
+        self._entries = {}
+        self._loaded_at = None
+        self._reloading = False
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pincode")
+        self.hits = self.misses = self.fetches = self.fetch_errors = 0
+
+    def _load(self):
+        db = SessionLocal()
+        try:
+            columns = [PincodeServiceability.pincode] + [getattr(PincodeServiceability, field) for field in FIELDS]
+            entries = {row[0]: tuple(row[1:]) for row in db.query(*columns)}
+        finally:
+            db.close()
+        with self._lock:
+            # Rows are never deleted, so anything only in memory was fetched while this load ran
+            for pincode, values in self._entries.items():
+                entries.setdefault(pincode, values)
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+
+    def _reload(self):
+        try:
+            self._load()
+        except Exception:
+            logger.exception("Reloading the pincode table failed")
+        finally:
+            self._reloading = False
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None:
+            self._load()
+        elif time.monotonic() - self._loaded_at >= self.ttl_seconds and not self._reloading:
+            # Serve the current copy while the new one loads
+            self._reloading = True
+            self._executor.submit(self._reload)
+
+    def expire(self):
+        """Reload from the table on next use (after a bulk refresh in this process)."""
+        self._loaded_at = None
+
+    def _fetch(self, pincode: str) -> tuple:
+        try:
+            self.fetches += 1
+            records = DelhiveryService(settings.DELHIVERY_TOKEN).fetch_pincodes([pincode])
+            record = next((record for record in records if record["pincode"] == pincode),
+                          {"pincode": pincode, "serviceable": False})
+            db = SessionLocal()
+            try:
+                save_records(db, [record], "lookup")
+                db.commit()
+            finally:
+                db.close()
+            values = _values(record)
+            with self._lock:
+                self._entries[pincode] = values
+            return values
+        except Exception:
+            self.fetch_errors += 1
+            logger.exception(f"Pincode lookup for {pincode} failed")
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(pincode, None)
+
+    def _fetch_in_background(self, pincode: str):
+        with self._lock:
+            future = self._pending.get(pincode)
+            if future is None:
+                future = self._pending[pincode] = self._executor.submit(self._fetch, pincode)
+        return future
+
+    def lookup(self, pincode: str) -> dict:
+        """Serviceability response for `pincode` (see DelhiveryService.check_serviceability)."""
+        if not _is_pincode(pincode):
+            return {"serviceable": False}
+        self._ensure_fresh()
+
+        values = self._entries.get(pincode)
+        if values is None:
+            self.misses += 1
+            try:
+                values = self._fetch_in_background(pincode).result(timeout=self.miss_wait_seconds)
+            except FutureTimeout:
+                return self._provisional(pincode, "Serviceability check in progress")
+            except Exception:
+                return self._provisional(pincode, "Serviceability could not be checked")
+        else:
+            self.hits += 1
+
+        record = dict(zip(FIELDS, values))
+        return serviceability_response(pincode, record) if record["serviceable"] else {"serviceable": False}
+
+    def _provisional(self, pincode: str, note: str) -> dict:
+        # Unknown pincodes are accepted for now, as before; shipping re-checks with the courier
+        return {
+            "serviceable": True,
+            "provisional": True,
+            "cod": True,
+            "prepaid": True,
+            "city": None,
+            "state": None,
+            "district": None,
+            "delivery_charge": rate_engine.delivery_charge(pincode),
+            "note": note
+        }
+
+    def stats(self) -> dict:
+        age = time.monotonic() - self._loaded_at if self._loaded_at is not None else None
+        return {
+            "entries": len(self._entries),
+            "serviceable": sum(1 for values in self._entries.values() if values[0]),
+            "age_seconds": round(age, 1) if age is not None else None,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "api_fetches": self.fetches,
+            "api_fetch_errors": self.fetch_errors,
+            "pending": len(self._pending)
+        }
+
+pincode_directory = PincodeDirectory(settings.PINCODE_CACHE_TTL_SECONDS, settings.PINCODE_MISS_WAIT_SECONDS)
@@ -0,0 +1,217 @@
+"""
+Per-product sales velocity.
+
+Order events update two small tables inside the order's own transaction:
+
+* `product_sales_daily` - units per product per day, used to roll the 7/30/90
+  day windows forward without touching `orders`.
+* `product_sales_stats` - the window counters plus a forward-decayed
+  popularity score.
+
+Forward decay: each sale adds `units * 2 ** ((t - landmark) / half_life)` to
+`popularity_score`. Because every product is scaled by the same landmark, the
+stored value can be ORDER BY-ed directly; `decayed_score()` divides the
+landmark factor back out for display.
+
+The landmark and half-life the stored scores use are kept in the
+"popularity_scale" checkpoint. `refresh_windows` moves the landmark to the
+start of the current day, scaling every score down by the same factor in one
+UPDATE, so the exponent stays small whatever the half-life. A write that
+straddles that UPDATE is off by at most 2 ** (1 day / half_life). When
+POPULARITY_HALF_LIFE_DAYS changes, stored scores cannot be rescaled, so they
+are rebuilt from orders under the new half-life.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import func, case, update
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.db.counters import increment_counter
+from app.models.order import Order
+from app.models.product import ProductSalesStats, ProductSalesDaily
+from app.models.settings import JobCheckpoint
+from app.services.checkpoints import load_checkpoint, advance_checkpoint
+from app.services.retention import with_archive
+
+logger = logging.getLogger(__name__)
+
+# Landmark of scores written before the scale was recorded in a checkpoint
+LANDMARK = datetime(2025, 1, 1)
+SCALE_CHECKPOINT = "popularity_scale"
+# With the landmark moved daily, the exponent stays far below float overflow (~1024)
+MIN_HALF_LIFE_DAYS = 1.0
+WINDOWS = (7, 30, 90)
+TERMINAL_STATUSES = ("cancelled",)
+
+class Scale(NamedTuple):
+    landmark: datetime
+    half_life_days: float
+
+    def weight(self, when: datetime) -> float:
+        return 2 ** ((when - self.landmark).total_seconds() / (self.half_life_days * 86400))
+
+def configured_half_life_days() -> float:
+    return max(MIN_HALF_LIFE_DAYS, settings.POPULARITY_HALF_LIFE_DAYS)
+
+def load_scale(db: Session) -> Scale:
+    """The landmark and half-life the stored scores use (read in the writer's transaction)."""
+    checkpoint = db.get(JobCheckpoint, SCALE_CHECKPOINT) if db else None
+    data = (checkpoint.data or {}) if checkpoint else {}
+    if checkpoint and checkpoint.watermark and data.get("half_life_days"):
+        return Scale(checkpoint.watermark, float(data["half_life_days"]))
+    return Scale(LANDMARK, configured_half_life_days())
+
+def decayed_score(stored_score: float, scale: Scale, now: datetime = None) -> float:
+    """Convert a stored forward-decay score into units-equivalent as of `now`."""
+    now = now or datetime.utcnow()
+    return round((stored_score or 0) / scale.weight(now), 4)
+
+def record_sales(db: Session, items: Iterable[dict], when: datetime, sign: int = 1):
+    """
+    Apply an order event to the sales counters. `sign` is +1 when an order is
+    placed and -1 when it is cancelled; pass the order's created_at as `when`
+    on cancellation so the decayed contribution is removed exactly.
+    """
+    units_by_product = {}
+    for item in items or []:
+        product_id = item.get("product_id")
+        if product_id:
+            units_by_product[product_id] = units_by_product.get(product_id, 0) + int(item.get("quantity", 0) or 0)
+
+    now = datetime.utcnow()
+    age_days = (now.date() - when.date()).days
+    weight = load_scale(db).weight(when)
+    stats_table = ProductSalesStats.__table__
+    daily_table = ProductSalesDaily.__table__
+
+    for product_id, units in units_by_product.items():
+        units *= sign
+        deltas = {"units_total": units, "popularity_score": units * weight}
+        for days in WINDOWS:
+            if age_days < days:
+                deltas[f"units_{days}d"] = units
+        extra = {"last_sold_at": when} if sign > 0 else {}
+        increment_counter(db, stats_table, {"product_id": product_id}, deltas, extra)
+        if age_days < max(WINDOWS):
+            increment_counter(db, daily_table, {"product_id": product_id, "day": when.date()}, {"units": units})
+
+def record_status_change(db: Session, order: Order, old_status: str):
+    """
+    Apply `order`'s move from `old_status` to its current status to the sales
+    counters. Every status change that can enter or leave a terminal status
+    goes through here, so the counters always match what
+    `rebuild_from_orders` would produce.
+    """
+    was_terminal = old_status in TERMINAL_STATUSES
+    is_terminal = order.status in TERMINAL_STATUSES
+    if was_terminal != is_terminal:
+        record_sales(db, order.items, order.created_at or datetime.utcnow(), sign=-1 if is_terminal else 1)
+
+def rebase_scores(db: Session, now: datetime = None) -> dict:
+    """
+    Move the score landmark to the start of today, or rebuild the scores if
+    the configured half-life no longer matches the stored one. Commits.
+    """
+    now = now or datetime.utcnow()
+    scale = load_scale(db)
+    half_life_days = configured_half_life_days()
+    if scale.half_life_days != half_life_days:
+        logger.warning(f"Popularity half-life changed from {scale.half_life_days} to {half_life_days} days; rebuilding scores")
+        return {"rebuilt": rebuild_from_orders(db)}
+
+    landmark = datetime.combine(now.date(), datetime.min.time())
+    if landmark <= scale.landmark:
+        return {"landmark": scale.landmark.isoformat()}
+    checkpoint = load_checkpoint(db, SCALE_CHECKPOINT)
+    db.flush()
+    # Conditional on the old landmark, so two concurrent rebases cannot both rescale
+    moved = db.execute(update(JobCheckpoint).where(
+        JobCheckpoint.name == SCALE_CHECKPOINT,
+        JobCheckpoint.watermark == checkpoint.watermark
+    ).values(
+        watermark=landmark, data={"half_life_days": half_life_days}, updated_at=now
+    ).execution_options(synchronize_session=False)).rowcount
+    if moved == 1:
+        # weight(landmark) itself may overflow after a long gap; its inverse only underflows to 0
+        factor = Scale(landmark, scale.half_life_days).weight(scale.landmark)
+        stats_table = ProductSalesStats.__table__
+        db.execute(update(stats_table).values(popularity_score=stats_table.c.popularity_score * factor))
+    db.commit()
+    return {"landmark": landmark.isoformat(), "rebased": moved == 1}
+
+def refresh_windows(db: Session):
+    """
+    Roll the 7/30/90 day counters forward from the daily buckets and drop
+    buckets that have left the largest window, after moving the score
+    landmark (`rebase_scores`). Reads at most products x 90 bucket rows;
+    never scans orders.
+    """
+    scale = rebase_scores(db)
+    today = datetime.utcnow().date()
+    starts = {days: today - timedelta(days=days - 1) for days in WINDOWS}
+    oldest = starts[max(WINDOWS)]
+
+    sums = db.query(
+        ProductSalesDaily.product_id,
+        *[
+            func.sum(case((ProductSalesDaily.day >= starts[days], ProductSalesDaily.units), else_=0))
+            for days in WINDOWS
+        ]
+    ).filter(ProductSalesDaily.day >= oldest).group_by(ProductSalesDaily.product_id).all()
+
+    windows = {row[0]: [max(0, int(value or 0)) for value in row[1:]] for row in sums}
+    stats = db.query(ProductSalesStats).all()
+    for stat in stats:
+        counts = windows.get(stat.product_id, [0] * len(WINDOWS))
+        for days, count in zip(WINDOWS, counts):
+            setattr(stat, f"units_{days}d", count)
+
+    removed = db.query(ProductSalesDaily).filter(ProductSalesDaily.day < oldest).delete(synchronize_session=False)
+    db.commit()
+    logger.info(f"Refreshed sales windows for {len(stats)} products, dropped {removed} old buckets")
+    return {"products": len(stats), "buckets_removed": removed, "scale": scale}
+
+def rebuild_from_orders(db: Session):
+    """
+    One-off backfill of both tables from order history (archived orders
+    included), for installs that predate the counters. This is the only code
+    path that scans `orders`.
+    """
+    db.query(ProductSalesDaily).delete(synchronize_session=False)
+    db.query(ProductSalesStats).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    advance_checkpoint(
+        load_checkpoint(db, SCALE_CHECKPOINT), datetime.combine(now.date(), datetime.min.time()),
+        half_life_days=configured_half_life_days()
+    )
+    db.flush()
+
+    orders = with_archive(Order)
+    query = db.query(orders.items, orders.created_at).filter(
+        orders.status.notin_(TERMINAL_STATUSES)
+    ).order_by(orders.id)
+
+    # Paged rather than streamed: the counter writes share this connection
+    count = 0
+    while True:
+        page = query.offset(count).limit(1000).all()
+        for items, created_at in page:
+            record_sales(db, items, created_at or datetime.utcnow())
+        count += len(page)
+        if len(page) < 1000:
+            break
+    db.commit()
+    return {"orders_applied": count}
+
+def stats_dict(stat: ProductSalesStats) -> dict:
+    if not stat:
+        return {"units_7d": 0, "units_30d": 0, "units_90d": 0, "popularity": 0}
+    return {
+        "units_7d": stat.units_7d or 0,
+        "units_30d": stat.units_30d or 0,
+        "units_90d": stat.units_90d or 0,
+        "popularity": decayed_score(stat.popularity_score, load_scale(object_session(stat)))
+    }
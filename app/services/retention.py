@@ -0,0 +1,198 @@
+"""
+Retention and archival for tables that otherwise grow forever.
+
+Each RetentionPolicy picks rows older than N days (plus policy-specific
+conditions) and either deletes them or moves them into an archive table
+(app/models/archive.py). Rows are handled in batches of at most
+RETENTION_BATCH_SIZE primary keys, each batch its own short transaction,
+with a pause between batches so hot tables are never locked for long. A run
+gives up after RETENTION_MAX_SECONDS; whatever is left is simply picked up
+by the next run.
+
+Order tables are processed children first (returns, cancellations, then
+orders that no longer have live returns or cancellations), so live rows
+never reference an archived order.
+
+Read endpoints fall back to the archive through `find_with_archive` and
+`list_with_archive`. Reports and aggregates over order history (exports,
+the analytics cube, dashboard reports, popularity backfill) read through
+`with_archive(Order)`, so archiving never changes their totals.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import insert, delete, select, literal, DateTime, exists, union_all
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.models.archive import ArchivedOrder, ArchivedReturnRequest, ArchivedOrderCancellation
+from app.models.order import Order, ReturnRequest, OrderCancellation
+from app.models.settings import BackgroundJob
+from app.models.user import Notification
+from app.services.checkpoints import load_checkpoint, advance_checkpoint
+from app.services.notifications import drop_unread_counts
+from app.services.otp_store import otp_store
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "retention"
+
+ARCHIVE_OF = {
+    Order: ArchivedOrder,
+    ReturnRequest: ArchivedReturnRequest,
+    OrderCancellation: ArchivedOrderCancellation,
+}
+
+ARCHIVABLE_ORDER_STATUSES = ("delivered", "cancelled", "returned")
+ARCHIVABLE_RETURN_STATUSES = ("completed", "rejected")
+
+class RetentionPolicy:
+    __slots__ = ("name", "model", "age_column", "days", "archive", "criteria", "before_delete")
+
+    def __init__(self, name: str, model, age_column, days: float, archive=None, criteria: tuple = (),
+                 before_delete: Optional[Callable[[Session, list], None]] = None):
+        self.name = name
+        self.model = model
+        self.age_column = age_column
+        self.days = days  # 0 disables the policy
+        self.archive = archive
+        self.criteria = criteria
+        self.before_delete = before_delete
+
+    @property
+    def action(self) -> str:
+        return "archive" if self.archive is not None else "delete"
+
+def default_policies() -> list:
+    return [
+        RetentionPolicy(
+            "notifications", Notification, Notification.created_at, settings.NOTIFICATION_RETENTION_DAYS,
+            before_delete=drop_unread_counts
+        ),
+        RetentionPolicy(
+            "background_jobs", BackgroundJob, BackgroundJob.created_at, settings.JOB_RETENTION_DAYS,
+            criteria=(BackgroundJob.status.in_(("completed", "failed")),)
+        ),
+        RetentionPolicy(
+            "returns", ReturnRequest, ReturnRequest.created_at, settings.RETURN_ARCHIVE_DAYS,
+            archive=ArchivedReturnRequest,
+            criteria=(ReturnRequest.status.in_(ARCHIVABLE_RETURN_STATUSES),)
+        ),
+        RetentionPolicy(
+            "order_cancellations", OrderCancellation, OrderCancellation.created_at, settings.ORDER_ARCHIVE_DAYS,
+            archive=ArchivedOrderCancellation
+        ),
+        RetentionPolicy(
+            "orders", Order, Order.created_at, settings.ORDER_ARCHIVE_DAYS,
+            archive=ArchivedOrder,
+            criteria=(
+                Order.status.in_(ARCHIVABLE_ORDER_STATUSES),
+                ~exists().where(ReturnRequest.order_id == Order.id),
+                ~exists().where(OrderCancellation.order_id == Order.id),
+            )
+        ),
+    ]
+
+def _run_policy(db: Session, policy: RetentionPolicy, now: datetime, deadline: float) -> dict:
+    started = time.monotonic()
+    table = policy.model.__table__
+    primary_key = table.primary_key.columns.values()[0]
+    cutoff = now - timedelta(days=policy.days)
+    batch_size = settings.RETENTION_BATCH_SIZE
+    rows = batches = 0
+
+    while time.monotonic() < deadline:
+        ids = [row[0] for row in db.query(primary_key).filter(
+            policy.age_column < cutoff, *policy.criteria
+        ).limit(batch_size)]
+        if not ids:
+            break
+
+        if policy.archive is not None:
+            names = [column.name for column in table.columns]
+            copy = select(*table.columns, literal(now, DateTime).label("archived_at")).where(primary_key.in_(ids))
+            db.execute(insert(policy.archive.__table__).from_select(names + ["archived_at"], copy))
+        if policy.before_delete:
+            policy.before_delete(db, ids)
+        db.execute(delete(table).where(primary_key.in_(ids)))
+        db.commit()
+
+        rows += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        time.sleep(settings.RETENTION_BATCH_PAUSE_MS / 1000)
+
+    return {"action": policy.action, "rows": rows, "batches": batches, "seconds": round(time.monotonic() - started, 3)}
+
+def run_retention(db: Session, policies: list = None) -> dict:
+    """Apply every enabled policy; returns rows moved and time spent per table."""
+    started_at = datetime.utcnow()
+    started = time.monotonic()
+    deadline = started + settings.RETENTION_MAX_SECONDS
+    report = {}
+
+    for policy in policies or default_policies():
+        if policy.days <= 0:
+            continue
+        try:
+            report[policy.name] = _run_policy(db, policy, started_at, deadline)
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"Retention policy {policy.name} failed")
+            report[policy.name] = {"action": policy.action, "error": str(e)}
+
+    otp_started = time.monotonic()
+    report["otps"] = {"action": "delete", "rows": otp_store.sweep(db), "seconds": round(time.monotonic() - otp_started, 3)}
+
+    result = {
+        "started_at": started_at.isoformat(),
+        "seconds": round(time.monotonic() - started, 3),
+        "rows": sum(entry.get("rows", 0) for entry in report.values()),
+        "tables": report
+    }
+    checkpoint = load_checkpoint(db, CHECKPOINT_NAME)
+    advance_checkpoint(checkpoint, started_at, last_run=result)
+    db.commit()
+
+    logger.info(f"Retention: moved {result['rows']} rows in {result['seconds']}s {report}")
+    return result
+
+def last_retention_run(db: Session) -> Optional[dict]:
+    checkpoint = load_checkpoint(db, CHECKPOINT_NAME)
+    return (checkpoint.data or {}).get("last_run")
+
+def find_with_archive(db: Session, model, **filters):
+    """First row of `model` matching `filters`, falling back to its archive table."""
+    row = db.query(model).filter_by(**filters).first()
+    if row is None and model in ARCHIVE_OF:
+        row = db.query(ARCHIVE_OF[model]).filter_by(**filters).first()
+    return row
+
+def list_with_archive(db: Session, model, limit: int = None, **filters) -> list:
+    """Rows matching `filters`, newest first; archived rows fill whatever the live table leaves of `limit`."""
+    query = db.query(model).filter_by(**filters).order_by(model.created_at.desc())
+    rows = query.limit(limit).all() if limit else query.all()
+    if model in ARCHIVE_OF and (not limit or len(rows) < limit):
+        archive = ARCHIVE_OF[model]
+        archived = db.query(archive).filter_by(**filters).order_by(archive.created_at.desc())
+        rows += archived.limit(limit - len(rows)).all() if limit else archived.all()
+    return rows
+
+def with_archive(model):
+    """
+    `model` mapped over the union of its live and archive tables, for queries
+    that must cover the full history. Use it like the model itself:
+    `orders = with_archive(Order); db.query(orders.grand_total).filter(orders.status != "cancelled")`.
+    """
+    if model not in ARCHIVE_OF:
+        return model
+    live = model.__table__
+    archive = ARCHIVE_OF[model].__table__
+    union = union_all(
+        select(*live.columns),
+        select(*(archive.c[column.name] for column in live.columns))
+    ).subquery(f"all_{live.name}")
+    return aliased(model, union)
@@ -0,0 +1,144 @@
+"""
+Periodic maintenance jobs.
+
+Every worker process runs this scheduler, but each job runs in only one
+of them at a time: before running, a process takes the job's lease in
+job_checkpoints (app/services/checkpoints.py) with a conditional UPDATE.
+Other processes skip the job until the lease runs out.
+
+A lease is taken for at least SCHEDULER_LEASE_MINUTES, or the job's
+interval if that is longer. After the run it is shortened to end 90% of an
+interval later, so the job runs about once per interval across all
+processes whichever one wins.
+"""
+import heapq
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.checkpoints import acquire_lease, release_lease
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process as a lease holder
+LEASE_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# Slack so that a process checking exactly one interval later still finds the lease free
+NEXT_RUN_FRACTION = 0.9
+
+class PeriodicJob:
+    """A maintenance task run every `interval_seconds` with its own DB session, in one process at a time."""
+    __slots__ = ("name", "interval_seconds", "initial_delay", "func", "runs", "skipped", "failures",
+                 "last_duration", "last_error")
+
+    def __init__(self, name: str, interval_seconds: float, func: Callable, initial_delay: float = None):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.initial_delay = interval_seconds if initial_delay is None else initial_delay
+        self.func = func
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_duration = None
+        self.last_error = None
+
+    def run(self):
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            lease = max(self.interval_seconds, settings.SCHEDULER_LEASE_MINUTES * 60)
+            acquired = acquire_lease(db, self.name, LEASE_OWNER, now + timedelta(seconds=lease), now)
+        except Exception:
+            db.rollback()
+            acquired = None
+            self.failures += 1
+            logger.exception(f"Could not take the lease of scheduled job {self.name}")
+        if not acquired:
+            # Another process holds the lease; try again next interval
+            db.close()
+            if acquired is False:
+                self.skipped += 1
+            return
+
+        started = time.perf_counter()
+        try:
+            self.func(db)
+            self.last_error = None
+        except Exception as e:
+            db.rollback()
+            self.failures += 1
+            self.last_error = str(e)
+            logger.exception(f"Scheduled job {self.name} failed")
+        finally:
+            try:
+                next_run = datetime.utcnow() + timedelta(seconds=self.interval_seconds * NEXT_RUN_FRACTION)
+                release_lease(db, self.name, LEASE_OWNER, next_run)
+            except Exception:
+                db.rollback()
+                logger.exception(f"Could not release the lease of scheduled job {self.name}")
+            db.close()
+            self.runs += 1
+            self.last_duration = time.perf_counter() - started
+
+_jobs: List[PeriodicJob] = []
+_stop = threading.Event()
+_thread = None
+
+def register_job(name: str, interval_seconds: float, func: Callable, initial_delay: float = None) -> PeriodicJob:
+    """
+    Register `func(db)` to run periodically once the scheduler is started. The
+    first run happens after `initial_delay` (default: one interval). A
+    non-positive interval disables the job.
+    """
+    for existing in _jobs:
+        if existing.name == name:
+            return existing
+    job = PeriodicJob(name, interval_seconds, func, initial_delay)
+    if interval_seconds > 0:
+        _jobs.append(job)
+    return job
+
+def _loop():
+    # Min-heap of (next_run_at, index); jobs run one at a time on this thread
+    queue = [(time.monotonic() + job.initial_delay, index) for index, job in enumerate(_jobs)]
+    heapq.heapify(queue)
+    while queue and not _stop.is_set():
+        next_run, index = queue[0]
+        if _stop.wait(max(0.0, next_run - time.monotonic())):
+            break
+        heapq.heappop(queue)
+        job = _jobs[index]
+        job.run()
+        heapq.heappush(queue, (time.monotonic() + job.interval_seconds, index))
+
+def start_scheduler():
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="maintenance-scheduler", daemon=True)
+    _thread.start()
+    logger.info(f"Scheduler started with jobs: {', '.join(job.name for job in _jobs) or 'none'}")
+
+def stop_scheduler():
+    _stop.set()
+
+def job_status() -> list:
+    return [
+        {
+            "name": job.name,
+            "interval_seconds": job.interval_seconds,
+            "runs": job.runs,
+            "skipped": job.skipped,
+            "failures": job.failures,
+            "last_duration": job.last_duration,
+            "last_error": job.last_error
+        }
+        for job in _jobs
+    ]
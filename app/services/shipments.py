@@ -0,0 +1,341 @@
+"""
+Courier work for orders, run as background jobs (app/services/jobs.py) so
+no admin request waits on Delhivery.
+
+Shipping, cancelling and scheduling a return pickup for one order run on the
+"courier" job pool. The endpoints check the order up front, the handler
+checks it again when it runs, and its outcome is stored on the job and sent
+to the admins as a notification. Only one unfinished job may touch an order
+at a time (`busy_orders`), and a customer cannot cancel it meanwhile. The
+status change after the courier call is a conditional UPDATE, so an order
+that moved on while Delhivery answered is left alone and the job reports the
+issued AWB instead.
+
+The bulk path (`bulk_ship`, a background job) validates every order with
+one query and builds the pickup details once. It then sends the valid
+orders to Delhivery SHIP_BATCH_SIZE at a time, one multi-shipment manifest
+call per batch. Each batch's AWBs, status changes and job progress are
+written in a single transaction, so an AWB the courier has issued is
+recorded as soon as possible and never left behind by a later failure.
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.order import Order, ReturnRequest
+from app.models.settings import Settings
+from app.services import popularity
+from app.services.courier import DelhiveryService
+from app.services.jobs import job_handler, active_jobs, JobFailed
+from app.services.notifications import queue_order_status, create_notification
+from app.utils.common import generate_id
+
+logger = logging.getLogger(__name__)
+
+UNSHIPPABLE_STATUSES = ("shipped", "delivered", "cancelled")
+CANCELLABLE_STATUSES = ("shipped", "processing")
+RETURNABLE_STATUSES = ("delivered", "shipped")
+REQUIRED_ADDRESS_FIELDS = ["name", "phone", "line1", "city", "state", "pincode"]
+
+ORDER_JOB_KINDS = ("ship_order", "bulk_ship", "cancel_shipment", "return_pickup")
+
+def busy_orders(db: Session, order_ids: list) -> set:
+    """Those of `order_ids` that an unfinished courier job is already working on."""
+    wanted, busy = set(order_ids), set()
+    for job in active_jobs(db, ORDER_JOB_KINDS):
+        params = job.params or {}
+        busy.update(wanted.intersection(params.get("order_ids") or [params.get("order_id")]))
+    return busy
+
+def shipping_problem(order: Order) -> Optional[str]:
+    """Why `order` cannot be handed to the courier, or None if it can."""
+    if order.status in UNSHIPPABLE_STATUSES:
+        return f"Cannot ship order with status: {order.status}"
+
+    shipping_address = order.shipping_address
+    if not shipping_address:
+        return "Order has no shipping address"
+
+    missing_fields = [field for field in REQUIRED_ADDRESS_FIELDS if not shipping_address.get(field)]
+    if missing_fields:
+        return f"Missing required shipping address fields: {', '.join(missing_fields)}"
+
+    if len(str(shipping_address.get("phone", "")).strip()) < 10:
+        return "Invalid phone number in shipping address"
+
+    pincode = str(shipping_address.get("pincode", "")).strip()
+    if len(pincode) != 6 or not pincode.isdigit():
+        return "Invalid pincode in shipping address"
+    return None
+
+def cancel_problem(order: Order) -> Optional[str]:
+    if not order.tracking_number:
+        return "Order has not been shipped yet"
+    if order.status not in CANCELLABLE_STATUSES:
+        return "Cannot cancel order in current status"
+    return None
+
+def return_pickup_problem(order: Order) -> Optional[str]:
+    if order.status not in RETURNABLE_STATUSES:
+        return "Can only create returns for delivered/shipped orders"
+    if not order.shipping_address:
+        return "No shipping address found for return pickup"
+    return None
+
+def pickup_details(db: Session) -> dict:
+    """Pickup / return fields of the Delhivery order data, from the business settings."""
+    pickup = {
+        "pickup_name": "Amorlias Mart",
+        "pickup_address": "Warehouse Address",
+        "pickup_city": "New Delhi",
+        "pickup_pincode": "110001",
+        "pickup_phone": "9999999999"
+    }
+
+    business = db.query(Settings).first()
+    if business:
+        pickup["pickup_name"] = business.business_name or "Amorlias Mart"
+        if business.address:
+            address_line = f"{business.address.get('line1', '')} {business.address.get('line2', '')}".strip()
+            if address_line:
+                pickup["pickup_address"] = address_line
+            if business.address.get('city'):
+                pickup["pickup_city"] = business.address.get('city')
+            if business.address.get('pincode'):
+                pickup["pickup_pincode"] = business.address.get('pincode')
+        if business.phone:
+            pickup["pickup_phone"] = business.phone
+    return pickup
+
+def shipment_data(order: Order, pickup: dict) -> dict:
+    """Order data for DelhiveryService.create_surface_order(s); `order` must pass shipping_problem."""
+    shipping_address = order.shipping_address
+    return {
+        "order_id": order.order_number,
+        "date": order.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "pay_mode": "Pre-paid" if order.payment_method == "online" else "COD",
+        "address": f"{shipping_address.get('line1', '')} {shipping_address.get('line2', '')}".strip(),
+        "phone": str(shipping_address.get("phone", "")).strip(),
+        "name": shipping_address.get("name"),
+        "city": shipping_address.get("city"),
+        "state": shipping_address.get("state"),
+        "pincode": str(shipping_address.get("pincode", "")).strip(),
+        "total_amount": float(order.grand_total),
+        "cod_amount": float(order.grand_total) if order.payment_method != "online" else 0,
+        "quantity": sum(item.get("quantity", 1) for item in order.items) if order.items else 1,
+        "products_desc": ", ".join(item.get("product_name", "Item") for item in order.items)[:50] if order.items else "Products",
+        **pickup
+    }
+
+def mark_shipped(db: Session, shipped: list) -> list:
+    """
+    Record the AWBs of `shipped` [(order, awb)] with one executemany UPDATE
+    and queue the status events. The caller commits. Orders that moved to an
+    unshippable status since they were validated (e.g. cancelled while the
+    manifest call ran) are left alone and returned, as [(order, awb)].
+    """
+    if not shipped:
+        return []
+    now = datetime.utcnow()
+    table = Order.__table__
+    db.execute(
+        update(table).where(
+            # Plain comparisons: an expanding NOT IN cannot be used with executemany
+            table.c.id == bindparam("b_id"), *(table.c.status != status for status in UNSHIPPABLE_STATUSES)
+        ).values(
+            tracking_number=bindparam("b_awb"), courier_provider="Delhivery",
+            status="shipped", updated_at=now
+        ),
+        [{"b_id": order.id, "b_awb": awb} for order, awb in shipped]
+    )
+    # executemany gives no per-row counts; an order carries its new AWB only if its row matched
+    applied = dict(db.query(Order.id, Order.tracking_number).filter(Order.id.in_([order.id for order, _ in shipped])))
+    skipped = []
+    for order, awb in shipped:
+        if applied.get(order.id) == awb:
+            queue_order_status(db, order, "shipped")
+        else:
+            skipped.append((order, awb))
+    return skipped
+
+def stale_awb_error(awb: str) -> str:
+    return (
+        f"Order changed while the shipment was being created; AWB {awb} "
+        "was issued but not recorded and should be cancelled with the courier"
+    )
+
+@job_handler("bulk_ship")
+def bulk_ship(db: Session, job, progress):
+    order_ids = list(dict.fromkeys(job.params["order_ids"]))
+    orders = {order.id: order for order in db.query(Order).filter(Order.id.in_(order_ids))}
+
+    valid, rejected = [], []
+    for order_id in order_ids:
+        order = orders.get(order_id)
+        problem = shipping_problem(order) if order else "Order not found"
+        if problem:
+            rejected.append({
+                "order_id": order_id, "order_number": order.order_number if order else None,
+                "success": False, "error": problem
+            })
+        else:
+            valid.append(order)
+    if rejected:
+        progress.add(db, rejected, failed=len(rejected))
+        db.commit()
+
+    pickup = pickup_details(db)
+    service = DelhiveryService(settings.DELHIVERY_TOKEN)
+    size = max(1, settings.SHIP_BATCH_SIZE)
+    for start in range(0, len(valid), size):
+        batch = valid[start:start + size]
+        outcomes = service.create_surface_orders([shipment_data(order, pickup) for order in batch])
+        shipped, results = [], []
+        for order, outcome in zip(batch, outcomes):
+            result = {"order_id": order.id, "order_number": order.order_number, "success": bool(outcome.get("success"))}
+            if result["success"]:
+                shipped.append((order, outcome.get("awb")))
+                result["awb"] = outcome.get("awb")
+                if outcome.get("note"):
+                    result["note"] = outcome["note"]
+            else:
+                result["error"] = outcome.get("error")
+            results.append(result)
+        stale = {order.id for order, _ in mark_shipped(db, shipped)}
+        for result in results:
+            if result["order_id"] in stale:
+                result["success"] = False
+                result["error"] = stale_awb_error(result["awb"])
+        succeeded = sum(1 for result in results if result["success"])
+        progress.add(db, results, succeeded=succeeded, failed=len(batch) - succeeded)
+        db.commit()
+        logger.info(f"Bulk ship job {job.id}: {succeeded}/{len(batch)} shipped in batch")
+
+    create_notification(
+        db, type="shipment", title="Bulk shipping finished",
+        message=f"{progress.succeeded} of {len(order_ids)} orders shipped, {progress.failed} failed.",
+        data={"job_id": job.id, "kind": job.kind}, for_admin=True
+    )
+    db.commit()
+
+def _finish(db: Session, job, progress, result: dict, title: str, message: str):
+    """Store a single-order job's outcome with the caller's changes, notify the admins and commit."""
+    progress.add(db, [result], succeeded=int(result["success"]), failed=int(not result["success"]))
+    create_notification(
+        db, type="shipment", title=title, message=message,
+        data={"job_id": job.id, "kind": job.kind, "order_id": result["order_id"]}, for_admin=True
+    )
+    db.commit()
+    if not result["success"]:
+        raise JobFailed(result["error"])
+
+def _load_order(db: Session, job, progress, check) -> Order:
+    """The job's order, re-checked now that the job runs; it may have changed while queued."""
+    order_id = job.params["order_id"]
+    order = db.get(Order, order_id)
+    problem = check(order) if order else "Order not found"
+    if problem:
+        label = order.order_number if order else order_id
+        _finish(db, job, progress, {"order_id": order_id, "success": False, "error": problem},
+                "Courier request not sent", f"Order #{label}: {problem}")
+    return order
+
+@job_handler("ship_order", pool="courier")
+def ship_order(db: Session, job, progress):
+    order = _load_order(db, job, progress, shipping_problem)
+    outcome = DelhiveryService(settings.DELHIVERY_TOKEN).create_surface_order(shipment_data(order, pickup_details(db)))
+    result = {"order_id": order.id, "order_number": order.order_number, "success": bool(outcome.get("success"))}
+
+    if result["success"]:
+        result.update(awb=outcome.get("awb"), ref_id=outcome.get("ref_id"))
+        if outcome.get("note"):
+            result["note"] = outcome["note"]
+        if mark_shipped(db, [(order, result["awb"])]):
+            result.update(success=False, error=stale_awb_error(result["awb"]))
+            _finish(db, job, progress, result, "Shipment not recorded", f"Order #{order.order_number}: {result['error']}")
+        _finish(db, job, progress, result, "Shipment created",
+                f"Order #{order.order_number} shipped with AWB {result['awb']}.")
+    else:
+        result["error"] = f"Shipment Creation Failed: {outcome.get('error')}"
+        _finish(db, job, progress, result, "Shipment failed", f"Order #{order.order_number}: {result['error']}")
+
+@job_handler("cancel_shipment", pool="courier")
+def cancel_shipment(db: Session, job, progress):
+    order = _load_order(db, job, progress, cancel_problem)
+    outcome = DelhiveryService(settings.DELHIVERY_TOKEN).cancel_shipment(order.tracking_number)
+    result = {
+        "order_id": order.id, "order_number": order.order_number, "awb": order.tracking_number,
+        "success": bool(outcome.get("success"))
+    }
+
+    if result["success"]:
+        now = datetime.utcnow()
+        old_status = order.status
+        table = Order.__table__
+        changed = db.execute(
+            update(table).where(
+                table.c.id == order.id, table.c.tracking_number == order.tracking_number,
+                table.c.status.in_(CANCELLABLE_STATUSES)
+            ).values(status="cancelled", updated_at=now)
+        ).rowcount
+        if changed != 1:
+            db.refresh(order)
+            result.update(success=False, error=(
+                f"Order changed while the shipment was being cancelled (now {order.status}); "
+                f"the courier cancelled AWB {result['awb']} but the order was not updated"
+            ))
+            _finish(db, job, progress, result, "Cancellation not recorded", f"Order #{order.order_number}: {result['error']}")
+        db.refresh(order)
+        result["cancelled_at"] = now.isoformat()
+        queue_order_status(db, order, "cancelled")
+        popularity.record_status_change(db, order, old_status)
+        _finish(db, job, progress, result, "Shipment cancelled",
+                f"Shipment {order.tracking_number} for order #{order.order_number} was cancelled.")
+    else:
+        result["error"] = f"Cancellation failed: {outcome.get('error')}"
+        _finish(db, job, progress, result, "Cancellation failed", f"Order #{order.order_number}: {result['error']}")
+
+@job_handler("return_pickup", pool="courier")
+def return_pickup(db: Session, job, progress):
+    order = _load_order(db, job, progress, return_pickup_problem)
+    return_data = job.params.get("return_data") or {}
+    shipping_address = order.shipping_address
+    return_shipment_data = {
+        "original_order_id": order.order_number,
+        "customer_name": shipping_address.get("name"),
+        "customer_phone": shipping_address.get("phone"),
+        "pickup_address": f"{shipping_address.get('line1', '')} {shipping_address.get('line2', '')}".strip(),
+        "pickup_city": shipping_address.get("city"),
+        "pickup_state": shipping_address.get("state"),
+        "pickup_pincode": shipping_address.get("pincode"),
+        "return_amount": return_data.get("return_amount", order.grand_total),
+        "quantity": return_data.get("quantity", 1),
+        "products_desc": return_data.get("reason", "Return Items"),
+        "weight": return_data.get("weight", "500")
+    }
+    outcome = DelhiveryService(settings.DELHIVERY_TOKEN).create_return_shipment(return_shipment_data)
+    result = {"order_id": order.id, "order_number": order.order_number, "success": bool(outcome.get("success"))}
+
+    if result["success"]:
+        now = datetime.utcnow()
+        return_request = ReturnRequest(
+            id=generate_id(),
+            order_id=order.id,
+            user_id=order.user_id,
+            reason=return_data.get("reason", "Customer return"),
+            status="pickup_scheduled",
+            return_awb=outcome.get("return_awb"),
+            created_at=now,
+            updated_at=now
+        )
+        db.add(return_request)
+        result.update(return_id=return_request.id, return_awb=outcome.get("return_awb"))
+        _finish(db, job, progress, result, "Return pickup scheduled",
+                f"Return pickup for order #{order.order_number} scheduled (AWB {result['return_awb']}).")
+    else:
+        result["error"] = f"Return creation failed: {outcome.get('error')}"
+        _finish(db, job, progress, result, "Return pickup failed", f"Order #{order.order_number}: {result['error']}")
@@ -0,0 +1,273 @@
+"""
+Local shipping rate and delivery estimate engine.
+
+Every pincode maps to a state through one byte per possible pincode (a 1 MB
+bytearray indexed by the pincode itself). The map is seeded from postal
+prefix ranges and refined with the state codes the courier reports in the
+local pincode table (app/services/pincodes.py); the high bit marks metro
+sorting districts.
+
+A quote places the origin/destination pair in a rate zone:
+
+- A: same sorting district (first three digits)
+- B: same state
+- C: metro to metro
+- D: rest of India
+- E: special destinations (north-east, J&K, Ladakh, Sikkim, islands)
+
+Freight comes from the zone's weight-slab rate card on the chargeable
+weight (actual or volumetric, whichever is higher), plus a COD fee.
+Delivery days come from a region-pair matrix. Quotes never touch the
+database or the courier. The map and origin reload in the background every
+PINCODE_CACHE_TTL_SECONDS.
+"""
+import json
+import logging
+import threading
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.settings import PincodeServiceability, Settings
+
+logger = logging.getLogger(__name__)
+
+STATES = (
+    None, "DL", "HR", "PB", "CH", "HP", "JK", "LA", "UP", "UK", "RJ",
+    "GJ", "MH", "GA", "MP", "CG", "DN", "TG", "AP", "KA", "TN", "PY", "KL", "LD",
+    "WB", "SK", "AN", "OD", "BR", "JH", "AS", "AR", "ML", "MN", "MZ", "NL", "TR",
+)
+STATE_INDEX = {code: index for index, code in enumerate(STATES) if code}
+# Other spellings of state codes seen in courier data
+STATE_ALIASES = {"TS": "TG", "OR": "OD", "UT": "UK", "CT": "CG", "DD": "DN"}
+
+REGIONS = {
+    "N": ("DL", "HR", "PB", "CH", "HP", "JK", "LA", "UP", "UK", "RJ"),
+    "W": ("GJ", "MH", "GA", "MP", "CG", "DN"),
+    "S": ("TG", "AP", "KA", "TN", "PY", "KL", "LD"),
+    "E": ("WB", "SK", "AN", "OD", "BR", "JH"),
+    "NE": ("AS", "AR", "ML", "MN", "MZ", "NL", "TR"),
+}
+REGION_OF = {code: region for region, codes in REGIONS.items() for code in codes}
+SPECIAL_STATES = frozenset(("JK", "LA", "SK", "AN", "LD") + REGIONS["NE"])
+
+# Inclusive pincode ranges; later entries override earlier ones
+PINCODE_RANGES = (
+    (110000, 110999, "DL"), (121000, 136999, "HR"), (140000, 159999, "PB"), (160000, 160999, "CH"),
+    (171000, 177999, "HP"), (180000, 193999, "JK"), (194000, 194999, "LA"),
+    (201000, 285999, "UP"), (246000, 246999, "UK"), (248000, 249999, "UK"), (262000, 263999, "UK"),
+    (301000, 345999, "RJ"), (360000, 396999, "GJ"), (396200, 396240, "DN"),
+    (400000, 445999, "MH"), (403000, 403999, "GA"), (450000, 488999, "MP"), (490000, 497999, "CG"),
+    (500000, 509999, "TG"), (515000, 535999, "AP"), (560000, 591999, "KA"),
+    (600000, 643999, "TN"), (605000, 605999, "PY"), (670000, 695999, "KL"), (682550, 682559, "LD"),
+    (700000, 743999, "WB"), (737000, 737999, "SK"), (744000, 744999, "AN"), (751000, 770999, "OD"),
+    (781000, 788999, "AS"), (790000, 792999, "AR"), (793000, 794999, "ML"), (795000, 795999, "MN"),
+    (796000, 796999, "MZ"), (797000, 798999, "NL"), (799000, 799999, "TR"),
+    (800000, 855999, "BR"), (814000, 816999, "JH"), (822000, 835999, "JH"),
+)
+# Sorting districts of the metro cities
+METRO_PREFIXES = (110, 400, 560, 600, 700, 500, 411, 380)
+METRO_BIT = 0x80
+STATE_MASK = 0x7F
+
+ZONE_NAMES = {"A": "Local", "B": "Within state", "C": "Metro to metro", "D": "Rest of India", "E": "Special"}
+
+DEFAULT_RATE_CARD = {
+    "slab_grams": 500,
+    # zone: [first slab, each additional slab] in rupees
+    "zones": {"A": [35, 15], "B": [40, 20], "C": [60, 25], "D": [80, 30], "E": [100, 40]},
+    "cod_flat": 30,
+    "cod_percent": 1.5,
+}
+
+# Business days (min, max) between regions; same sorting district is always 1-2
+ETA_DAYS = {
+    "N": {"N": (2, 3), "W": (3, 4), "S": (4, 6), "E": (3, 5), "NE": (5, 7)},
+    "W": {"N": (3, 4), "W": (2, 3), "S": (3, 5), "E": (4, 6), "NE": (6, 8)},
+    "S": {"N": (4, 6), "W": (3, 5), "S": (2, 3), "E": (4, 6), "NE": (6, 8)},
+    "E": {"N": (3, 5), "W": (4, 6), "S": (4, 6), "E": (2, 3), "NE": (3, 5)},
+    "NE": {"N": (5, 7), "W": (6, 8), "S": (6, 8), "E": (3, 5), "NE": (2, 4)},
+}
+LOCAL_ETA = (1, 2)
+UNKNOWN_ETA = (4, 7)
+# Remote destinations outside the north-east (J&K, Ladakh, Sikkim, islands) take longer than their region
+REMOTE_EXTRA_DAYS = (1, 2)
+
+def valid_pincode(pincode: str) -> bool:
+    return len(pincode) == 6 and pincode.isdigit() and pincode[0] != "0"
+
+def _state_code(code) -> Optional[str]:
+    code = str(code or "").strip().upper()
+    code = STATE_ALIASES.get(code, code)
+    return code if code in STATE_INDEX else None
+
+def _prefix_map() -> bytearray:
+    zones = bytearray(1_000_000)
+    for start, end, code in PINCODE_RANGES:
+        zones[start:end + 1] = bytes([STATE_INDEX[code]]) * (end - start + 1)
+    for prefix in METRO_PREFIXES:
+        for pincode in range(prefix * 1000, prefix * 1000 + 1000):
+            zones[pincode] |= METRO_BIT
+    return zones
+
+def load_rate_card() -> dict:
+    """DEFAULT_RATE_CARD, with any keys from the JSON file at SHIPPING_RATE_CARD_PATH."""
+    card = json.loads(json.dumps(DEFAULT_RATE_CARD))
+    if settings.SHIPPING_RATE_CARD_PATH:
+        with open(settings.SHIPPING_RATE_CARD_PATH) as handle:
+            overrides = json.load(handle)
+        card["zones"].update(overrides.pop("zones", {}))
+        card.update(overrides)
+    return card
+
+class RateEngine:
+    def __init__(self, ttl_seconds: float, rate_card: dict):
+        self.ttl_seconds = ttl_seconds
+        self.rate_card = rate_card
+        self._base = _prefix_map()
+        self._zones = self._base
+        self._origin = settings.SHIPPING_ORIGIN_PINCODE or "110001"
+        self._loaded_at = None
+        self._reloading = False
+        self.refined = 0
+        self.quotes = 0
+
+    def _load(self):
+        zones = bytearray(self._base)
+        origin = settings.SHIPPING_ORIGIN_PINCODE
+        refined = 0
+        db = SessionLocal()
+        try:
+            for pincode, state in db.query(PincodeServiceability.pincode, PincodeServiceability.state).filter(
+                PincodeServiceability.state.isnot(None)
+            ):
+                code = _state_code(state)
+                if code and pincode.isdigit() and len(pincode) == 6:
+                    zones[int(pincode)] = STATE_INDEX[code] | (zones[int(pincode)] & METRO_BIT)
+                    refined += 1
+            if not origin:
+                business = db.query(Settings).filter(Settings.type == "business").first()
+                origin = str((business.address or {}).get("pincode") or "").strip() if business else ""
+        finally:
+            db.close()
+        self._zones = zones
+        if valid_pincode(origin):
+            self._origin = origin
+        self.refined = refined
+        self._loaded_at = time.monotonic()
+
+    def _reload(self):
+        try:
+            self._load()
+        except Exception:
+            logger.exception("Reloading the shipping zone map failed")
+        finally:
+            self._reloading = False
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None:
+            try:
+                self._load()
+            except Exception:
+                # Prefix ranges alone still give usable quotes
+                logger.exception("Loading the shipping zone map failed")
+                self._loaded_at = time.monotonic()
+        elif time.monotonic() - self._loaded_at >= self.ttl_seconds and not self._reloading:
+            # Serve the current map while the new one loads
+            self._reloading = True
+            threading.Thread(target=self._reload, name="shipping-zones", daemon=True).start()
+
+    def expire(self):
+        """Reload on next use (after the pincode table or business address changed in this process)."""
+        self._loaded_at = None
+
+    def zone(self, origin: str, pincode: str, zones: bytearray = None) -> str:
+        zones = zones if zones is not None else self._zones
+        if origin[:3] == pincode[:3]:
+            return "A"
+        origin_byte, destination_byte = zones[int(origin)], zones[int(pincode)]
+        origin_state, destination_state = STATES[origin_byte & STATE_MASK], STATES[destination_byte & STATE_MASK]
+        if destination_state and destination_state == origin_state:
+            return "B"
+        if destination_state in SPECIAL_STATES:
+            return "E"
+        if origin_byte & destination_byte & METRO_BIT:
+            return "C"
+        return "D"
+
+    def eta_days(self, origin: str, pincode: str, zone: str, zones: bytearray = None) -> tuple:
+        zones = zones if zones is not None else self._zones
+        if zone == "A":
+            return LOCAL_ETA
+        origin_state, destination_state = STATES[zones[int(origin)] & STATE_MASK], STATES[zones[int(pincode)] & STATE_MASK]
+        if not origin_state or not destination_state:
+            return UNKNOWN_ETA
+        low, high = ETA_DAYS[REGION_OF[origin_state]][REGION_OF[destination_state]]
+        if zone == "C":
+            low, high = max(1, low - 1), max(1, high - 1)
+        elif destination_state in SPECIAL_STATES and REGION_OF[destination_state] != "NE":
+            low, high = low + REMOTE_EXTRA_DAYS[0], high + REMOTE_EXTRA_DAYS[1]
+        return low, high
+
+    def quote(self, pincode: str, weight_grams: float = None, payment_method: str = "prepaid",
+              order_value: float = 0, dimensions_cm: tuple = None) -> dict:
+        """
+        Shipping charge and delivery estimate for a parcel to `pincode`.
+        `dimensions_cm` is (length, breadth, height) for volumetric weight.
+        """
+        pincode = str(pincode).strip()
+        if not valid_pincode(pincode):
+            return {"pincode": pincode, "error": "Invalid pincode"}
+        self._ensure_fresh()
+        self.quotes += 1
+        zones, origin, card = self._zones, self._origin, self.rate_card
+
+        weight = max(float(weight_grams or settings.SHIPPING_DEFAULT_WEIGHT_GRAMS), 1.0)
+        if dimensions_cm:
+            length, breadth, height = dimensions_cm
+            weight = max(weight, length * breadth * height / settings.SHIPPING_VOLUMETRIC_DIVISOR * 1000)
+        slabs = -(-int(weight) // card["slab_grams"])  # ceiling
+
+        zone = self.zone(origin, pincode, zones)
+        first, additional = card["zones"][zone]
+        freight = first + additional * (slabs - 1)
+        cod_charge = 0
+        if str(payment_method).lower() == "cod":
+            cod_charge = round(max(card["cod_flat"], float(order_value or 0) * card["cod_percent"] / 100), 2)
+        low, high = self.eta_days(origin, pincode, zone, zones)
+
+        return {
+            "pincode": pincode,
+            "origin_pincode": origin,
+            "zone": zone,
+            "zone_name": ZONE_NAMES[zone],
+            "chargeable_weight_grams": slabs * card["slab_grams"],
+            "freight": freight,
+            "cod_charge": cod_charge,
+            "delivery_charge": round(freight + cod_charge, 2),
+            "eta_days": [low, high],
+            "estimated_delivery": f"{low}-{high} business days" if low != high else f"{low} business day{'s' if low > 1 else ''}"
+        }
+
+    @property
+    def fallback_charge(self) -> float:
+        """Charge used where a pincode cannot be quoted: the rest-of-India first slab."""
+        return self.rate_card["zones"]["D"][0]
+
+    def delivery_charge(self, pincode: str) -> float:
+        """Charge for a default parcel to `pincode`, or `fallback_charge` if it cannot be quoted."""
+        return self.quote(pincode).get("delivery_charge", self.fallback_charge)
+
+    def stats(self) -> dict:
+        age = time.monotonic() - self._loaded_at if self._loaded_at is not None else None
+        return {
+            "origin_pincode": self._origin,
+            "refined_pincodes": self.refined,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "ttl_seconds": self.ttl_seconds,
+            "quotes": self.quotes,
+            "rate_card": self.rate_card,
+        }
+
+rate_engine = RateEngine(settings.PINCODE_CACHE_TTL_SECONDS, load_rate_card())
@@ -0,0 +1,184 @@
+"""
+Scheduled shipment tracking.
+
+`poll_shipments` (every TRACKING_POLL_MINUTES) collects the AWBs of shipped
+and out-for-delivery orders, least recently checked first, and asks the
+courier about them TRACKING_BATCH_SIZE at a time; the packages API takes
+comma-separated waybills. Batches are fetched on TRACKING_POLL_CONCURRENCY
+threads that share one token bucket of TRACKING_RATE_PER_MINUTE calls, and
+are written back on the calling thread, one transaction per batch.
+
+`apply_tracking` appends only scans the order has not seen yet and moves the
+order forward (shipped -> out_for_delivery -> delivered, never back). The
+/courier/track view goes through it too, and serves the stored history
+while it is younger than one poll interval.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.rate_limit import TokenBucket
+from app.models.order import Order
+from app.services.checkpoints import load_checkpoint, advance_checkpoint
+from app.services.courier import DelhiveryService
+from app.services.notifications import bulk_create_notifications, queue_order_status
+from app.utils.common import generate_id
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "tracking_poll"
+
+IN_TRANSIT = ("shipped", "out_for_delivery")
+STATUS_RANK = {"shipped": 0, "out_for_delivery": 1, "delivered": 2}
+
+STATUS_NOTIFICATIONS = {
+    "out_for_delivery": ("Out for Delivery", "Your order #{order_number} is out for delivery."),
+    "delivered": ("Order Delivered", "Your order #{order_number} has been delivered successfully. Thank you for shopping with us!"),
+}
+
+# Shared by scheduled and manual runs, so together they stay under the courier's limit
+tracking_bucket = TokenBucket(
+    capacity=max(1, min(settings.TRACKING_POLL_CONCURRENCY, settings.TRACKING_RATE_PER_MINUTE)),
+    rate=settings.TRACKING_RATE_PER_MINUTE / 60
+)
+
+def courier_status(shipment: dict) -> Optional[str]:
+    """Order status implied by the courier's current status; None leaves the order as it is."""
+    status = (shipment.get("status") or "").strip().lower()
+    if status == "delivered":
+        return "delivered"
+    if status in ("dispatched", "out for delivery"):
+        return "out_for_delivery"
+    return None
+
+def apply_tracking(db: Session, order: Order, shipment: dict, now: datetime) -> Tuple[int, Optional[str]]:
+    """
+    Merge a parsed shipment (courier.parse_shipment) into `order`. Returns
+    the number of new scans and the new order status, if it moved.
+    """
+    history = list(order.tracking_history or [])
+    seen = {(entry.get("date"), entry.get("status")) for entry in history if entry.get("date")}
+    new_scans = []
+    for scan in shipment["tracking_history"]:
+        key = (scan["date"], scan["status"])
+        if key not in seen:
+            seen.add(key)
+            new_scans.append(scan)
+    if new_scans:
+        order.tracking_history = history + new_scans
+    order.tracking_summary = {
+        key: shipment.get(key) for key in ("status", "current_location", "destination", "expected_delivery")
+    }
+    order.tracking_checked_at = now
+
+    target = courier_status(shipment)
+    if order.status not in IN_TRANSIT or target is None or STATUS_RANK[target] <= STATUS_RANK[order.status]:
+        return len(new_scans), None
+    order.status = target
+    order.updated_at = now
+    queue_order_status(db, order, target)
+    return len(new_scans), target
+
+def status_notification(order: Order, status: str, now: datetime) -> Optional[dict]:
+    if not order.user_id:
+        return None
+    title, message = STATUS_NOTIFICATIONS[status]
+    return {
+        "id": generate_id(),
+        "type": "order_status",
+        "title": title,
+        "message": message.format(order_number=order.order_number),
+        "user_id": order.user_id,
+        "data": {"order_id": order.id},
+        "for_admin": False,
+        "read": False,
+        "created_at": now
+    }
+
+def is_fresh(order: Order) -> bool:
+    """Whether the stored tracking can be served without asking the courier."""
+    if order.tracking_checked_at is None:
+        return False
+    if order.status not in IN_TRANSIT:
+        return True
+    return datetime.utcnow() - order.tracking_checked_at < timedelta(minutes=settings.TRACKING_POLL_MINUTES)
+
+def record_tracking(db: Session, order: Order, shipment: dict):
+    """Apply one live tracking result (the /courier/track view) and commit."""
+    now = datetime.utcnow()
+    _, status = apply_tracking(db, order, shipment, now)
+    if status:
+        bulk_create_notifications(db, [row for row in [status_notification(order, status, now)] if row])
+    db.commit()
+
+def _apply_batch(db: Session, awbs: list, shipments: dict, report: dict):
+    now = datetime.utcnow()
+    orders = db.query(Order).filter(Order.tracking_number.in_(awbs), Order.status.in_(IN_TRANSIT)).all()
+    notifications = []
+    for order in orders:
+        shipment = shipments.get(order.tracking_number)
+        if shipment is None:
+            # Unknown to the courier (yet); check it again after the others
+            order.tracking_checked_at = now
+            report["missing"] += 1
+            continue
+        scans, status = apply_tracking(db, order, shipment, now)
+        report["new_scans"] += scans
+        if status:
+            report["status_changes"][status] = report["status_changes"].get(status, 0) + 1
+            notifications.append(status_notification(order, status, now))
+    bulk_create_notifications(db, [row for row in notifications if row])
+    db.commit()
+
+def poll_shipments(db: Session) -> dict:
+    """Refresh tracking for every in-transit shipment (scheduler job); returns a run report."""
+    started_at = datetime.utcnow()
+    started = time.monotonic()
+    awbs = list(dict.fromkeys(awb for (awb,) in db.query(Order.tracking_number).filter(
+        Order.status.in_(IN_TRANSIT),
+        Order.tracking_number.isnot(None),
+        or_(Order.courier_provider.is_(None), Order.courier_provider == "Delhivery")
+    ).order_by(Order.tracking_checked_at)))
+    size = max(1, settings.TRACKING_BATCH_SIZE)
+    batches = [awbs[start:start + size] for start in range(0, len(awbs), size)]
+    report = {
+        "shipments": len(awbs), "batches": len(batches), "failed_batches": 0,
+        "new_scans": 0, "missing": 0, "status_changes": {}, "throttled_seconds": 0.0
+    }
+
+    if batches:
+        service = DelhiveryService(settings.DELHIVERY_TOKEN)
+
+        def fetch(batch):
+            waited = tracking_bucket.acquire()
+            return batch, service.track_many(batch), waited
+
+        with ThreadPoolExecutor(max_workers=max(1, settings.TRACKING_POLL_CONCURRENCY), thread_name_prefix="tracking") as pool:
+            for future in as_completed([pool.submit(fetch, batch) for batch in batches]):
+                try:
+                    batch, shipments, waited = future.result()
+                    report["throttled_seconds"] += waited
+                    _apply_batch(db, batch, shipments, report)
+                except Exception as e:
+                    db.rollback()
+                    report["failed_batches"] += 1
+                    logger.warning(f"Tracking batch failed: {e}")
+
+    report["throttled_seconds"] = round(report["throttled_seconds"], 3)
+    report["seconds"] = round(time.monotonic() - started, 3)
+    report["started_at"] = started_at.isoformat()
+    checkpoint = load_checkpoint(db, CHECKPOINT_NAME)
+    advance_checkpoint(checkpoint, started_at, last_run=report)
+    db.commit()
+    logger.info(f"Tracking poll: {report}")
+    return report
+
+def last_tracking_poll(db: Session) -> Optional[dict]:
+    checkpoint = load_checkpoint(db, CHECKPOINT_NAME)
+    return (checkpoint.data or {}).get("last_run")
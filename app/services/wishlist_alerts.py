@@ -0,0 +1,136 @@
+"""
+Price-drop and back-in-stock alerts for wishlisted products.
+
+Each run only looks at products whose `updated_at` moved since the previous
+run (indexed range scan from the job checkpoint), compares them with the
+price/stock last seen in `product_alert_states`, and fans the changed
+product ids out to wishlists with one IN query per batch. Notifications are
+bulk-inserted. Work is proportional to the number of changed products and
+the wishlists that hold them, never to the number of users.
+
+The first run only records a baseline for every product and sends nothing.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.product import Product, Wishlist, ProductAlertState
+from app.models.user import User
+from app.services import email as email_utils
+from app.services.checkpoints import load_checkpoint, advance_checkpoint
+from app.services.notifications import bulk_create_notifications
+from app.utils.common import generate_id
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "wishlist_alerts"
+BATCH_SIZE = 500
+
+def _batches(values: list, size: int = BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _diff_changed_products(db: Session, changed: list, alerting: bool):
+    """Compare changed products with their last seen state and store the new state."""
+    previous = {}
+    for batch in _batches([row.id for row in changed]):
+        rows = db.query(
+            ProductAlertState.product_id, ProductAlertState.selling_price, ProductAlertState.stock_qty
+        ).filter(ProductAlertState.product_id.in_(batch))
+        for product_id, old_price, old_stock in rows:
+            previous[product_id] = (old_price, old_stock or 0)
+
+    threshold = 1 - settings.PRICE_DROP_MIN_PERCENT / 100
+    alerts = {}
+    new_states, updated_states = [], []
+    for row in changed:
+        price, stock = row.selling_price, row.stock_qty or 0
+        if row.id not in previous:
+            new_states.append({"product_id": row.id, "selling_price": price, "stock_qty": stock})
+            continue
+        old_price, old_stock = previous[row.id]
+        if old_price == price and old_stock == stock:
+            continue
+        updated_states.append({"product_id": row.id, "selling_price": price, "stock_qty": stock})
+        if not alerting or stock <= 0:
+            continue
+        if old_stock <= 0:
+            alerts[row.id] = ("back_in_stock", row, old_price)
+        elif old_price and price is not None and price <= old_price * threshold:
+            alerts[row.id] = ("price_drop", row, old_price)
+
+    if new_states:
+        db.execute(insert(ProductAlertState), new_states)
+    if updated_states:
+        db.execute(update(ProductAlertState), updated_states)
+    return alerts
+
+def _alert_text(kind: str, row, old_price: float):
+    if kind == "back_in_stock":
+        return "Back in Stock", f"{row.name} from your wishlist is back in stock"
+    return "Price Drop", f"{row.name} from your wishlist is now ₹{row.selling_price} (was ₹{old_price})"
+
+def run_wishlist_alerts(db: Session) -> dict:
+    started = datetime.utcnow()
+    checkpoint = load_checkpoint(db, CHECKPOINT_NAME)
+    since = checkpoint.watermark
+
+    query = db.query(Product.id, Product.name, Product.selling_price, Product.stock_qty).filter(Product.is_active == True)
+    if since is not None:
+        query = query.filter(Product.updated_at >= since)
+    changed = query.all()
+
+    alerts = _diff_changed_products(db, changed, alerting=since is not None)
+
+    notifications = []
+    emails = {}
+    for batch in _batches(list(alerts)):
+        watchers = db.query(
+            Wishlist.user_id, Wishlist.product_id, Wishlist.priority, User.email, User.name
+        ).join(User, User.id == Wishlist.user_id).filter(Wishlist.product_id.in_(batch)).all()
+
+        for user_id, product_id, priority, user_email, user_name in watchers:
+            kind, row, old_price = alerts[product_id]
+            title, message = _alert_text(kind, row, old_price)
+            notifications.append({
+                "id": generate_id(),
+                "type": kind,
+                "title": title,
+                "message": message,
+                "user_id": user_id,
+                "data": {
+                    "product_id": product_id,
+                    "old_price": old_price,
+                    "new_price": row.selling_price,
+                    "stock_qty": row.stock_qty,
+                    "priority": priority
+                },
+                "for_admin": False,
+                "read": False,
+                "created_at": started
+            })
+            if user_email:
+                emails.setdefault(user_email, (user_name, []))[1].append(message)
+
+    bulk_create_notifications(db, notifications)
+    advance_checkpoint(checkpoint, started, changed_products=len(changed), alerts=len(alerts), notifications=len(notifications))
+    db.commit()
+
+    emails_sent = 0
+    if settings.WISHLIST_ALERT_EMAILS:
+        for to_email, (name, messages) in emails.items():
+            if email_utils.send_wishlist_alert_email(to_email, name, messages):
+                emails_sent += 1
+
+    result = {
+        "changed_products": len(changed),
+        "alerts": len(alerts),
+        "notifications": len(notifications),
+        "emails_sent": emails_sent,
+        "baseline": since is None
+    }
+    logger.info(f"Wishlist alerts: {result}")
+    return result
@@ -0,0 +1,53 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.product import Wishlist
+
+# product_id -> (wishlist item id, category_id)
+Membership = Dict[str, Tuple[str, str]]
+
+class WishlistMembershipCache:
+    """
+    Per-user wishlist membership, loaded with one query and kept for a short
+    TTL. Add/remove/clear endpoints invalidate the user's entry; the TTL
+    bounds staleness across worker processes. Least recently used users are
+    evicted beyond `max_users`.
+    """
+
+    def __init__(self, ttl_seconds: float, max_users: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: str) -> Membership:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+
+        rows = db.query(Wishlist.product_id, Wishlist.id, Wishlist.category_id).filter(
+            Wishlist.user_id == user_id
+        ).all()
+        membership = {product_id: (item_id, category_id) for product_id, item_id, category_id in rows}
+
+        if self.ttl_seconds > 0:
+            with self._lock:
+                self._entries[user_id] = (membership, now + self.ttl_seconds)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        return membership
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+wishlist_membership = WishlistMembershipCache(settings.WISHLIST_CACHE_TTL_SECONDS)
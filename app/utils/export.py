@@ -0,0 +1,68 @@
+import csv
+import io
+import tempfile
+from typing import Iterable, Iterator, Sequence
+
+from fastapi import HTTPException
+
+EXPORT_CHUNK_ROWS = 500
+EXPORT_READ_BYTES = 64 * 1024
+
+def iter_csv(header: Sequence[str], rows: Iterable[Sequence], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[str]:
+    """
+    Encode rows as CSV text chunks.
+
+    The header is yielded before `rows` is touched, so the client receives the
+    first byte before the database query has even been executed.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    if pending:
+        yield buffer.getvalue()
+
+def ensure_xlsx_support():
+    """Fail before streaming starts if the optional XLSX writer is missing."""
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=400, detail="XLSX export requires the 'openpyxl' package. Use format=csv instead.")
+
+def iter_xlsx(header: Sequence[str], rows: Iterable[Sequence], sheet_title: str = "Export") -> Iterator[bytes]:
+    """
+    Encode rows as an XLSX workbook.
+
+    XLSX is a zip container and cannot be emitted incrementally, so rows are
+    written with openpyxl's write-only mode into a spooled temp file (constant
+    memory) and the finished file is then streamed back in fixed-size chunks.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title[:31])
+    sheet.append(list(header))
+    for row in rows:
+        sheet.append(list(row))
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(EXPORT_READ_BYTES)
+            if not chunk:
+                break
+            yield chunk
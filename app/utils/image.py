@@ -1,19 +1,40 @@
-import shutil
 import logging
 from pathlib import Path
 from fastapi import UploadFile, HTTPException
 from PIL import Image
 from app.core.config import settings
 
-def save_uploaded_file(file: UploadFile, folder: str = "general", image_type: str = None) -> str:
-    """Save uploaded file and return the URL"""
+# Content type -> stored extension for evidence images; files are served from /uploads by extension
+IMAGE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+
+def _copy_limited(source, destination, max_bytes: int):
+    """Stream `source` into `destination` in 1 MB pieces, failing once more than `max_bytes` arrive."""
+    copied = 0
+    while piece := source.read(1024 * 1024):
+        copied += len(piece)
+        if copied > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
+        destination.write(piece)
+
+def save_uploaded_file(file: UploadFile, folder: str = "general", image_type: str = None, max_bytes: int = None,
+                       extension: str = None) -> str:
+    """Save uploaded file and return the URL; `extension` overrides the one in the client's filename"""
+    max_bytes = max_bytes or settings.UPLOAD_MAX_MB * 1024 * 1024
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
+    
     try:
         # Create folder if it doesn't exist
         folder_path = settings.UPLOAD_DIR / folder
         folder_path.mkdir(parents=True, exist_ok=True)
         
         # Generate unique filename
-        file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
+        file_extension = extension or (file.filename.split('.')[-1] if '.' in file.filename else 'jpg')
         
         # We need a way to generate unique ID. 
         # Since this module doesn't import from server or utils, let's just use uuid here.
@@ -22,8 +43,12 @@ def save_uploaded_file(file: UploadFile, folder: str = "general", image_type: st
         file_path = folder_path / unique_filename
         
         # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        try:
+            with open(file_path, "wb") as buffer:
+                _copy_limited(file.file, buffer, max_bytes)
+        except HTTPException:
+            file_path.unlink(missing_ok=True)
+            raise
         
         # Optimize image if it's an image file
         if file_extension.lower() in ['jpg', 'jpeg', 'png', 'webp']:
@@ -44,6 +69,8 @@ def save_uploaded_file(file: UploadFile, folder: str = "general", image_type: st
         # Return URL
         return f"/uploads/{folder}/{unique_filename}"
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
@@ -0,0 +1,153 @@
+"""
+Shipping label content and storage, shared by the PDF (app/utils/pdf.py)
+and ZPL (app/utils/zpl.py) renderers.
+
+`label_content` gathers everything the 4x6 label shows into plain data, so
+both renderers draw the same label. The hash of that data (plus the
+renderer and its layout version) names the rendered file under
+uploads/labels: printing an unchanged label again serves the stored file
+without rendering, and each order keeps only the files of its current label.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Callable, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings as config_settings
+from app.models.order import Order
+from app.models.product import Product
+from app.models.settings import Settings
+
+LABEL_DIR = os.path.join(config_settings.UPLOAD_DIR, "labels")
+
+# Bump a format's version when its layout changes so stored labels are re-rendered
+RENDERER_VERSIONS = {"pdf": 1, "zpl": 1}
+
+# Placeholder routing values printed on every label until the courier provides them
+COURIER_NAME = "Shadowfax"
+DESTINATION_CODE = "S46_PSA"
+RETURN_CODE = "303702,348"
+DEFAULT_HSN = "960390"
+
+def label_content(db: Session, order: Order) -> dict:
+    """Everything the shipping label of `order` shows, as JSON-serialisable data."""
+    business = db.query(Settings).filter(Settings.type == "business").first()
+    items = (order.items or [])[:3]
+    product_ids = [item["product_id"] for item in items]
+    products = {product.id: product for product in db.query(Product).filter(Product.id.in_(product_ids))}
+
+    customer_lines = []
+    addr = order.shipping_address or {}
+    if order.shipping_address:
+        if addr.get('line1'): customer_lines.append(addr['line1'])
+        if addr.get('line2'): customer_lines.append(addr['line2'])
+        location = [str(addr[key]) for key in ('city', 'state', 'pincode') if addr.get(key)]
+        if location: customer_lines.append(", ".join(location))
+        if order.customer_phone:
+            customer_lines.append(f"Tel: {order.customer_phone}")
+
+    return_lines = []
+    if business and business.address:
+        ret = business.address
+        if ret.get('line1'): return_lines.append(ret['line1'].upper())
+        if ret.get('line2'): return_lines.append(ret['line2'].upper())
+        if ret.get('city'): return_lines.append(f"{ret['city'].upper()}, {ret.get('state', '').upper()}")
+        if ret.get('pincode'): return_lines.append(f"{ret.get('pincode')}")
+    else:
+        return_lines.append("WAREHOUSE ADDRESS")
+
+    product_rows, invoice_rows = [], []
+    total_taxable = total_tax = 0
+    for item in items:
+        product = products.get(item['product_id'])
+        product_rows.append({
+            "sku": product.sku if product else "N/A",
+            "name": product.name[:15] if product else "Item",
+            "quantity": item['quantity'],
+            "order_ref": order.order_number[-8:]
+        })
+
+        # Simple tax calc (inclusive)
+        item_total = item['quantity'] * (product.selling_price if product else item.get('price', 0))
+        tax_rate = product.gst_rate if product else 18.0
+        taxable = item_total / (1 + (tax_rate / 100))
+        tax_amount = item_total - taxable
+        total_taxable += taxable
+        total_tax += tax_amount
+        invoice_rows.append({
+            "description": product.name[:10] if product else "Item",
+            "hsn": product.hsn_code if product and product.hsn_code else DEFAULT_HSN,
+            "quantity": item['quantity'],
+            "gross": round(item_total, 2),
+            "taxable": round(taxable, 2),
+            "tax": round(tax_amount, 2)
+        })
+
+    return {
+        "order_number": order.order_number,
+        "customer_name": addr.get('name', '') if order.shipping_address else None,
+        "customer_lines": customer_lines[:6],
+        "payment": f"COD: Rs.{order.grand_total}" if order.payment_method == 'cod' else "PREPAID",
+        "courier": COURIER_NAME,
+        "destination_code": DESTINATION_CODE,
+        "return_code": RETURN_CODE,
+        "qr_data": f"{order.order_number}|{order.grand_total}",
+        "barcode": order.tracking_number or order.order_number,
+        "return_name": (business.company_name if business and business.company_name else "BharatBazaar").upper()[:35],
+        "return_lines": return_lines[:4],
+        "products": product_rows,
+        "bill_to": f"{addr.get('name', '')}, {addr.get('city', '')}" if order.shipping_address else None,
+        "bill_to_state": addr.get('state', '') if order.shipping_address else None,
+        "sold_by": business.business_name if business and business.business_name else "BharatBazaar",
+        "sold_by_address": f"{business.address.get('line1', '')}, {business.address.get('city', '')}"
+            if business and business.address else None,
+        "gstin": business.gst_number if business and business.gst_number else None,
+        "invoice_rows": invoice_rows,
+        "total_taxable": round(total_taxable, 2),
+        "total_tax": round(total_tax, 2),
+        "grand_total": float(order.grand_total)
+    }
+
+def content_hash(content: dict, fmt: str) -> str:
+    canonical = json.dumps([fmt, RENDERER_VERSIONS[fmt], content], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def _file_prefix(order_number: str) -> str:
+    return "label_" + re.sub(r"[^A-Za-z0-9-]", "_", order_number or "order")
+
+def stored_label(content: dict, fmt: str, render: Callable[[dict], bytes]) -> Tuple[str, str]:
+    """
+    Path and /uploads URL of the rendered label for `content`, rendering and
+    writing it only if no file with the same content hash exists yet.
+    """
+    prefix = _file_prefix(content["order_number"])
+    filename = f"{prefix}_{content_hash(content, fmt)[:20]}.{fmt}"
+    path = os.path.join(LABEL_DIR, filename)
+
+    if not os.path.exists(path):
+        os.makedirs(LABEL_DIR, exist_ok=True)
+        data = render(content)
+        # Written under a temporary name and renamed, so a concurrent print never sees half a file
+        fd, temp_path = tempfile.mkstemp(dir=LABEL_DIR, prefix=".label_")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        # Older renders of this order's label are outdated now
+        own_file = re.compile(rf"{re.escape(prefix)}_[0-9a-f]{{20}}\.{fmt}")
+        for old_path in glob.glob(os.path.join(LABEL_DIR, f"{glob.escape(prefix)}_*.{fmt}")):
+            if old_path != path and own_file.fullmatch(os.path.basename(old_path)):
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+    return path, f"/uploads/labels/{filename}"
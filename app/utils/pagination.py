@@ -0,0 +1,43 @@
+"""
+Keyset (cursor) pagination over (created_at, id), newest first.
+
+The cursor is the position of the last row of the previous page, so each
+page is an index range scan from that point instead of an OFFSET that reads
+and discards every earlier row. Rows inserted while a client is paging do
+not shift later pages.
+"""
+import base64
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import or_, and_
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Returns (created_at, id); raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), row_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def keyset_page(query, created_column, id_column, cursor: Optional[str], limit: int):
+    """Apply the cursor to `query` and fetch one page; returns (rows, next_cursor)."""
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            created_column < created_at,
+            and_(created_column == created_at, id_column < row_id)
+        ))
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
@@ -9,15 +9,18 @@ import qrcode
 from io import BytesIO as QRBytesIO
 from fastapi import HTTPException
 from app.models.order import Order
+from app.models.archive import ArchivedOrder
 from app.models.settings import Settings
 from app.models.product import Product
 from app.core.config import settings as config_settings
+from app.utils.labels import label_content
 
 def generate_invoice_pdf(order_id: str, db):
     """Generate professional invoice PDF for an order"""
     try:
-        # Get order details
-        order = db.query(Order).filter(Order.id == order_id).first()
+        # Get order details (invoices stay available after the order is archived)
+        order = db.query(Order).filter(Order.id == order_id).first() or \
+            db.query(ArchivedOrder).filter(ArchivedOrder.id == order_id).first()
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
         
@@ -205,315 +208,243 @@ def generate_invoice_pdf(order_id: str, db):
 
 def generate_shipping_label_pdf(order_id: str, db):
     """Generate professional shipping label PDF for an order"""
+    order = db.query(Order).filter(Order.id == order_id).first()
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
     try:
-        # Get order details
-        order = db.query(Order).filter(Order.id == order_id).first()
-        if not order:
-            raise HTTPException(status_code=404, detail="Order not found")
-        
-        # Get settings for company info
-        settings = db.query(Settings).filter(Settings.type == "business").first()
-        
-        # Create PDF buffer - Standard 4x6 inch shipping label
-        buffer = io.BytesIO()
-        width, height = 4*inch, 6*inch
-        p = canvas.Canvas(buffer, pagesize=(width, height))
-        
-        # Company details
-        company_name = settings.company_name if settings and settings.company_name else "BharatBazaar"
-        business_name = settings.business_name if settings and settings.business_name else "BharatBazaar"
-        
-        # --- SEPARATOR LINES ---
-        # Main Border
-        p.setStrokeColor(colors.black)
-        p.setLineWidth(1.5)
-        
-        # Horizontal Separators
-        y_line1 = height - 110
-        y_line2 = height - 190
-        y_line3 = height - 240
-        y_line4 = height - 255
-        
-        p.setLineWidth(1)
-        p.line(5, y_line1, width - 5, y_line1)
-        p.line(5, y_line2, width - 5, y_line2)
-        p.line(5, y_line3, width - 5, y_line3)
-        p.line(5, y_line4, width - 5, y_line4)
-        
-        # Vertical Separator (Top Section)
-        p.line(width * 0.45, height - 5, width * 0.45, y_line1)
+        return io.BytesIO(render_label_pdf(label_content(db, order)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate shipping label: {str(e)}")
 
-        # --- TOP SECTION ---
-        
-        # Customer Address
-        p.setFont("Helvetica-Bold", 7)
-        p.drawString(10, height - 15, "Customer Address")
-        
-        if order.shipping_address:
-            addr = order.shipping_address
-            p.setFont("Helvetica-Bold", 10)
-            p.drawString(10, height - 30, addr.get('name', '')[:25])
-            
-            p.setFont("Helvetica", 8)
-            y_addr = height - 42
-            line_height = 9
-            
-            address_lines = []
-            if addr.get('line1'): address_lines.append(addr['line1'])
-            if addr.get('line2'): address_lines.append(addr['line2'])
-            location = []
-            if addr.get('city'): location.append(addr['city'])
-            if addr.get('state'): location.append(addr['state'])
-            if addr.get('pincode'): location.append(str(addr['pincode']))
-            if location: address_lines.append(", ".join(location))
-             
-            # Phone
-            if order.customer_phone:
-                address_lines.append(f"Tel: {order.customer_phone}")
-            
-            for line in address_lines[:6]:
-                if len(line) > 30: line = line[:28] + "..."
-                p.drawString(10, y_addr, line)
-                y_addr -= line_height
+def render_label_pdf(label: dict) -> bytes:
+    """Draw a 4x6 inch shipping label from app.utils.labels.label_content data"""
+    buffer = io.BytesIO()
+    width, height = 4*inch, 6*inch
+    p = canvas.Canvas(buffer, pagesize=(width, height))
+    
+    # --- SEPARATOR LINES ---
+    # Main Border
+    p.setStrokeColor(colors.black)
+    p.setLineWidth(1.5)
+    
+    # Horizontal Separators
+    y_line1 = height - 110
+    y_line2 = height - 190
+    y_line3 = height - 240
+    y_line4 = height - 255
+    
+    p.setLineWidth(1)
+    p.line(5, y_line1, width - 5, y_line1)
+    p.line(5, y_line2, width - 5, y_line2)
+    p.line(5, y_line3, width - 5, y_line3)
+    p.line(5, y_line4, width - 5, y_line4)
+    
+    # Vertical Separator (Top Section)
+    p.line(width * 0.45, height - 5, width * 0.45, y_line1)
 
-        # COD / Courier Section (Right)
-        x_right = width * 0.45 + 5
-        
-        # COD Amount Header
-        p.setFillColor(colors.black)
-        p.rect(x_right, height - 20, width - x_right - 5, 15, fill=1)
-        p.setFillColor(colors.white)
-        p.setFont("Helvetica-Bold", 8)
-        
-        cod_text = "COD: Check amount on app"
-        if order.payment_method == 'cod':
-            cod_text = f"COD: Rs.{order.grand_total}"
-        else:
-             cod_text = "PREPAID"
-             
-        p.drawCentredString(x_right + (width - x_right - 5)/2, height - 16, cod_text)
-        
-        p.setFillColor(colors.black)
-        
-        # Courier Name
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(x_right, height - 35, "Shadowfax")
-        
-        # Pickup Badge
-        p.setFillColor(colors.black)
-        p.rect(x_right, height - 48, 35, 10, fill=1)
-        p.setFillColor(colors.white)
-        p.setFont("Helvetica-Bold", 7)
-        p.drawCentredString(x_right + 17.5, height - 45, "Pickup")
-        p.setFillColor(colors.black)
-        
-        # Destination Code
-        p.setFont("Helvetica", 7)
-        p.drawString(x_right, height - 58, "Destination Code")
-        
-        # Mock Codes
-        dest_code = "S46_PSA"
-        p.setFillColor(colors.lightgrey)
-        p.rect(x_right, height - 72, 60, 12, fill=1)
-        p.setFillColor(colors.black)
-        p.setFont("Helvetica-Bold", 9)
-        p.drawString(x_right + 2, height - 69, dest_code)
-        
-        # Return Code
-        p.setFont("Helvetica", 7)
-        p.drawString(x_right, height - 80, "Return Code")
-        return_code = "303702,348"
-        p.setFont("Helvetica-Bold", 8)
-        p.drawString(x_right, height - 90, return_code)
-        
-        # QR Code
-        qr_size = 50
-        qr_x = width - qr_size - 5
-        
-         # Generate QR code
-        qr_data = f"{order.order_number}|{order.grand_total}"
-        qr = qrcode.QRCode(version=1, box_size=2, border=1)
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        qr_buffer = QRBytesIO()
-        img.save(qr_buffer, format='PNG')
-        qr_buffer.seek(0)
-        
-        p.drawImage(ImageReader(qr_buffer), qr_x, height - 80, width=qr_size, height=qr_size)
-        
-        # --- MIDDLE SECTION ---
-        
-        # Return Address (Left)
-        p.setFont("Helvetica-Bold", 7)
-        p.drawString(10, y_line1 - 10, "")
-        
-        p.setFont("Helvetica-Bold", 8)
-        y_ret = y_line1 - 22
-        p.drawString(10, y_ret, company_name.upper()[:35])
-        y_ret -= 10
-        
-        p.setFont("Helvetica", 7)
-        ret_lines = []
-        if settings and settings.address:
-            addr = settings.address
-            if addr.get('line1'): ret_lines.append(addr['line1'].upper())
-            if addr.get('line2'): ret_lines.append(addr['line2'].upper())
-            if addr.get('city'): ret_lines.append(f"{addr['city'].upper()}, {addr.get('state', '').upper()}")
-            if addr.get('pincode'): ret_lines.append(f"{addr.get('pincode')}")
-        else:
-            ret_lines.append("WAREHOUSE ADDRESS")
-            
-        for line in ret_lines[:4]:
-             if len(line) > 40: line = line[:38] + "..."
-             p.drawString(10, y_ret, line)
-             y_ret -= 8
-             
-        # Tracking Barcode
-        barcode_val = order.tracking_number or order.order_number
-        p.setFont("Helvetica-Bold", 9)
-        p.drawCentredString(width * 0.75, y_line1 - 70, barcode_val)
-        
-        # Simulated Barcode
-        bc_x = width * 0.55
-        bc_y = y_line1 - 50
-        bc_w = 120
-        bc_h = 30
-        
-        import random
-        random.seed(barcode_val)
-        curr_x = bc_x
-        while curr_x < bc_x + bc_w:
-            w = random.choice([1, 2, 3])
-            if curr_x + w > bc_x + bc_w: break
-            if random.choice([True, False]):
-                p.rect(curr_x, bc_y, w, bc_h, fill=1, stroke=0)
-            curr_x += w
-            
-        # --- PRODUCT DETAILS SECTION ---
-        p.setFont("Helvetica-Bold", 8)
-        p.drawString(10, y_line2 - 10, "Product Details")
-        
-        # Table Data
-        data = [['SKU', 'Size', 'Qty', 'Color', 'Order No.']]
+    # --- TOP SECTION ---
+    
+    # Customer Address
+    p.setFont("Helvetica-Bold", 7)
+    p.drawString(10, height - 15, "Customer Address")
+    
+    if label["customer_name"] is not None:
+        p.setFont("Helvetica-Bold", 10)
+        p.drawString(10, height - 30, label["customer_name"][:25])
         
-        # Items
-        items_to_show = order.items[:3]
-        for item in items_to_show:
-            prod = db.query(Product).filter(Product.id == item['product_id']).first()
-            sku = prod.sku if prod else "N/A"
-            name = prod.name[:15] if prod else "Item"
-            data.append([
-                f"{sku}\n{name}", 
-                "Free", 
-                str(item['quantity']), 
-                "Multi", 
-                order.order_number[-8:]
-            ])
-            
-        t = Table(data, colWidths=[80, 40, 30, 40, 80])
-        t.setStyle(TableStyle([
-            ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
-            ('FONTSIZE', (0,0), (-1,-1), 7),
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('TOPPADDING', (0,0), (-1,-1), 1),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 1),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.gray), 
-        ]))
-        
-        w, h = t.wrapOn(p, width, height)
-        t.drawOn(p, 5, y_line2 - h - 15)
+        p.setFont("Helvetica", 8)
+        y_addr = height - 42
+        line_height = 9
+        for line in label["customer_lines"]:
+            if len(line) > 30: line = line[:28] + "..."
+            p.drawString(10, y_addr, line)
+            y_addr -= line_height
 
-        # --- TAX INVOICE SECTION (Bottom) ---
-        
-        # Header
-        p.setFillColor(colors.lightgrey)
-        p.rect(5, y_line3 - 12, width - 10, 12, fill=1, stroke=0)
-        p.setFillColor(colors.black)
-        p.setFont("Helvetica-Bold", 8)
-        p.drawCentredString(width/2, y_line3 - 9, "TAX INVOICE")
-        p.setFont("Helvetica", 6)
-        p.drawRightString(width - 10, y_line3 - 9, "Original For Recipient")
-        
-        # Bill To / Sold By
-        y_inv = y_line4 - 10
-        p.setFont("Helvetica-Bold", 6)
-        p.drawString(10, y_inv, "BILL TO / SHIP TO")
-        p.drawString(width/2 + 5, y_inv, f"Sold by : {business_name}")
-        
-        y_inv -= 8
-        p.setFont("Helvetica", 6)
-        
-        # Bill To Address (Simplified)
-        if order.shipping_address:
-            addr_str = f"{order.shipping_address.get('name', '')}, {order.shipping_address.get('city', '')}"
-            p.drawString(10, y_inv, addr_str[:45])
-            p.drawString(10, y_inv - 7, f"State: {order.shipping_address.get('state', '')}")
-            
-        # Sold By Address
-        if settings and settings.address:
-            sold_addr = f"{settings.address.get('line1', '')}, {settings.address.get('city', '')}"
-            p.drawString(width/2 + 5, y_inv, sold_addr[:45])
-            
-        if settings and settings.gst_number:
-            p.drawString(width/2 + 5, y_inv - 7, f"GSTIN - {settings.gst_number}")
-            
-        # Invoice Table
-        inv_data = [['Description', 'HSN', 'Qty', 'Gross', 'Disc', 'Taxable', 'Tax', 'Total']]
-        
-        total_taxable = 0
-        total_tax = 0
-        
-        for item in items_to_show:
-            prod = db.query(Product).filter(Product.id == item['product_id']).first()
-            item_total = item['quantity'] * prod.selling_price
-            
-            # Simple tax calc (inclusive)
-            tax_rate = prod.gst_rate if prod else 18.0
-            taxable = item_total / (1 + (tax_rate/100))
-            tax_amt = item_total - taxable
-            
-            total_taxable += taxable
-            total_tax += tax_amt
-            
-            inv_data.append([
-                prod.name[:10] if prod else "Item",
-                prod.hsn_code if prod and prod.hsn_code else "960390",
-                str(item['quantity']),
-                f"{item_total:.0f}",
-                "0",
-                f"{taxable:.1f}",
-                f"{tax_amt:.1f}",
-                f"{item_total:.0f}"
-            ])
-            
-        # Totals Row
-        inv_data.append(['Total', '', '', '', '', f"{total_taxable:.1f}", f"{total_tax:.1f}", f"{order.grand_total:.1f}"])
-            
-        inv_table = Table(inv_data, colWidths=[70, 30, 20, 30, 25, 35, 30, 35])
-        inv_table.setStyle(TableStyle([
-            ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
-            ('FONTSIZE', (0,0), (-1,-1), 5),
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('ALIGN', (3,0), (-1,-1), 'RIGHT'),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
-            ('BACKGROUND', (0,0), (-1,0), colors.whitesmoke),
-            ('FONTNAME', (0,-1), (-1,-1), 'Helvetica-Bold'),
-        ]))
-        
-        w_inv, h_inv = inv_table.wrapOn(p, width, height)
-        inv_table.drawOn(p, 5, y_inv - h_inv - 25)
-        
-        # Footer Disclaimer
-        p.setFont("Helvetica", 5)
-        p.drawString(10, 10, "Tax is not payable on reverse charge basis. Computer generated invoice.")
+    # COD / Courier Section (Right)
+    x_right = width * 0.45 + 5
+    
+    # COD Amount Header
+    p.setFillColor(colors.black)
+    p.rect(x_right, height - 20, width - x_right - 5, 15, fill=1)
+    p.setFillColor(colors.white)
+    p.setFont("Helvetica-Bold", 8)
+    p.drawCentredString(x_right + (width - x_right - 5)/2, height - 16, label["payment"])
+    
+    p.setFillColor(colors.black)
+    
+    # Courier Name
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(x_right, height - 35, label["courier"])
+    
+    # Pickup Badge
+    p.setFillColor(colors.black)
+    p.rect(x_right, height - 48, 35, 10, fill=1)
+    p.setFillColor(colors.white)
+    p.setFont("Helvetica-Bold", 7)
+    p.drawCentredString(x_right + 17.5, height - 45, "Pickup")
+    p.setFillColor(colors.black)
+    
+    # Destination Code
+    p.setFont("Helvetica", 7)
+    p.drawString(x_right, height - 58, "Destination Code")
+    
+    p.setFillColor(colors.lightgrey)
+    p.rect(x_right, height - 72, 60, 12, fill=1)
+    p.setFillColor(colors.black)
+    p.setFont("Helvetica-Bold", 9)
+    p.drawString(x_right + 2, height - 69, label["destination_code"])
+    
+    # Return Code
+    p.setFont("Helvetica", 7)
+    p.drawString(x_right, height - 80, "Return Code")
+    p.setFont("Helvetica-Bold", 8)
+    p.drawString(x_right, height - 90, label["return_code"])
+    
+    # QR Code
+    qr_size = 50
+    qr_x = width - qr_size - 5
+    
+    qr = qrcode.QRCode(version=1, box_size=2, border=1)
+    qr.add_data(label["qr_data"])
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    qr_buffer = QRBytesIO()
+    img.save(qr_buffer, format='PNG')
+    qr_buffer.seek(0)
+    
+    p.drawImage(ImageReader(qr_buffer), qr_x, height - 80, width=qr_size, height=qr_size)
+    
+    # --- MIDDLE SECTION ---
+    
+    # Return Address (Left)
+    p.setFont("Helvetica-Bold", 8)
+    y_ret = y_line1 - 22
+    p.drawString(10, y_ret, label["return_name"])
+    y_ret -= 10
+    
+    p.setFont("Helvetica", 7)
+    for line in label["return_lines"]:
+         if len(line) > 40: line = line[:38] + "..."
+         p.drawString(10, y_ret, line)
+         y_ret -= 8
+         
+    # Tracking Barcode
+    barcode_val = label["barcode"]
+    p.setFont("Helvetica-Bold", 9)
+    p.drawCentredString(width * 0.75, y_line1 - 70, barcode_val)
+    
+    # Simulated Barcode
+    bc_x = width * 0.55
+    bc_y = y_line1 - 50
+    bc_w = 120
+    bc_h = 30
+    
+    import random
+    random.seed(barcode_val)
+    curr_x = bc_x
+    while curr_x < bc_x + bc_w:
+        w = random.choice([1, 2, 3])
+        if curr_x + w > bc_x + bc_w: break
+        if random.choice([True, False]):
+            p.rect(curr_x, bc_y, w, bc_h, fill=1, stroke=0)
+        curr_x += w
+        
+    # --- PRODUCT DETAILS SECTION ---
+    p.setFont("Helvetica-Bold", 8)
+    p.drawString(10, y_line2 - 10, "Product Details")
+    
+    # Table Data
+    data = [['SKU', 'Size', 'Qty', 'Color', 'Order No.']]
+    for row in label["products"]:
+        data.append([
+            f"{row['sku']}\n{row['name']}", 
+            "Free", 
+            str(row['quantity']), 
+            "Multi", 
+            row['order_ref']
+        ])
+        
+    t = Table(data, colWidths=[80, 40, 30, 40, 80])
+    t.setStyle(TableStyle([
+        ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
+        ('FONTSIZE', (0,0), (-1,-1), 7),
+        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('TOPPADDING', (0,0), (-1,-1), 1),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 1),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.gray), 
+    ]))
+    
+    w, h = t.wrapOn(p, width, height)
+    t.drawOn(p, 5, y_line2 - h - 15)
 
-        p.showPage()
-        p.save()
-        
-        buffer.seek(0)
-        return buffer
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate shipping label: {str(e)}")
+    # --- TAX INVOICE SECTION (Bottom) ---
+    
+    # Header
+    p.setFillColor(colors.lightgrey)
+    p.rect(5, y_line3 - 12, width - 10, 12, fill=1, stroke=0)
+    p.setFillColor(colors.black)
+    p.setFont("Helvetica-Bold", 8)
+    p.drawCentredString(width/2, y_line3 - 9, "TAX INVOICE")
+    p.setFont("Helvetica", 6)
+    p.drawRightString(width - 10, y_line3 - 9, "Original For Recipient")
+    
+    # Bill To / Sold By
+    y_inv = y_line4 - 10
+    p.setFont("Helvetica-Bold", 6)
+    p.drawString(10, y_inv, "BILL TO / SHIP TO")
+    p.drawString(width/2 + 5, y_inv, f"Sold by : {label['sold_by']}")
+    
+    y_inv -= 8
+    p.setFont("Helvetica", 6)
+    
+    # Bill To Address (Simplified)
+    if label["bill_to"] is not None:
+        p.drawString(10, y_inv, label["bill_to"][:45])
+        p.drawString(10, y_inv - 7, f"State: {label['bill_to_state']}")
+        
+    # Sold By Address
+    if label["sold_by_address"]:
+        p.drawString(width/2 + 5, y_inv, label["sold_by_address"][:45])
+        
+    if label["gstin"]:
+        p.drawString(width/2 + 5, y_inv - 7, f"GSTIN - {label['gstin']}")
+        
+    # Invoice Table
+    inv_data = [['Description', 'HSN', 'Qty', 'Gross', 'Disc', 'Taxable', 'Tax', 'Total']]
+    for row in label["invoice_rows"]:
+        inv_data.append([
+            row["description"],
+            row["hsn"],
+            str(row["quantity"]),
+            f"{row['gross']:.0f}",
+            "0",
+            f"{row['taxable']:.1f}",
+            f"{row['tax']:.1f}",
+            f"{row['gross']:.0f}"
+        ])
+        
+    # Totals Row
+    inv_data.append(['Total', '', '', '', '', f"{label['total_taxable']:.1f}", f"{label['total_tax']:.1f}", f"{label['grand_total']:.1f}"])
+        
+    inv_table = Table(inv_data, colWidths=[70, 30, 20, 30, 25, 35, 30, 35])
+    inv_table.setStyle(TableStyle([
+        ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
+        ('FONTSIZE', (0,0), (-1,-1), 5),
+        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+        ('ALIGN', (3,0), (-1,-1), 'RIGHT'),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
+        ('BACKGROUND', (0,0), (-1,0), colors.whitesmoke),
+        ('FONTNAME', (0,-1), (-1,-1), 'Helvetica-Bold'),
+    ]))
+    
+    w_inv, h_inv = inv_table.wrapOn(p, width, height)
+    inv_table.drawOn(p, 5, y_inv - h_inv - 25)
+    
+    # Footer Disclaimer
+    p.setFont("Helvetica", 5)
+    p.drawString(10, 10, "Tax is not payable on reverse charge basis. Computer generated invoice.")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
@@ -0,0 +1,157 @@
+"""
+ZPL (Zebra Programming Language) rendering of the 4x6 shipping label, for
+thermal printers that would otherwise have to rasterise the PDF.
+
+The layout follows app/utils/pdf.py section by section; positions are kept
+in PDF points measured from the top of the label and converted to printer
+dots here. The tracking number is a real Code 128 barcode and the order QR
+code is drawn by the printer, so a label is a few kilobytes of text.
+"""
+
+DPI = 203
+SCALE = DPI / 72  # dots per PDF point
+WIDTH, HEIGHT = 4 * 72, 6 * 72  # label size in points
+
+def _d(points: float) -> int:
+    return round(points * SCALE)
+
+def _escape(value) -> str:
+    # Field data goes through ^FH, so the ZPL control characters are sent as hex
+    return str(value).replace("_", "_5F").replace("^", "_5E").replace("~", "_7E")
+
+def _fit(value, width: float, size: float) -> str:
+    """Cut `value` to roughly what fits `width` points at font `size` (font 0 is condensed)."""
+    value = str(value)
+    limit = max(1, int(width / (size * 0.5)))
+    return value if len(value) <= limit else value[:max(1, limit - 2)] + ".."
+
+class _Zpl:
+    def __init__(self):
+        self.commands = ["^XA", "^CI28", f"^PW{_d(WIDTH)}", f"^LL{_d(HEIGHT)}", "^LH0,0"]
+
+    def text(self, x: float, baseline: float, size: float, value, width: float = None,
+             align: str = "L", reverse: bool = False):
+        """Text whose baseline sits `baseline` points from the top, like canvas.drawString."""
+        top = baseline - size * 0.8
+        block = f"^FB{_d(width)},1,0,{align},0" if width else ""
+        self.commands.append(
+            f"^FO{_d(x)},{_d(top)}^A0N,{_d(size)},{_d(size * 0.9)}{block}{'^FR' if reverse else ''}"
+            f"^FH^FD{_escape(value)}^FS"
+        )
+
+    def box(self, x: float, top: float, width: float, height: float, thickness: float = 1, filled: bool = False):
+        border = min(width, height) if filled else thickness
+        self.commands.append(f"^FO{_d(x)},{_d(top)}^GB{_d(width)},{_d(height)},{max(1, _d(border))}^FS")
+
+    def hline(self, x1: float, x2: float, top: float):
+        self.box(x1, top, x2 - x1, 1, filled=True)
+
+    def vline(self, x: float, top: float, bottom: float):
+        self.box(x, top, 1, bottom - top, filled=True)
+
+    def barcode(self, x: float, top: float, height: float, value):
+        self.commands.append(f"^FO{_d(x)},{_d(top)}^BY2,3^BCN,{_d(height)},N,N,N,A^FH^FD{_escape(value)}^FS")
+
+    def qr(self, x: float, top: float, value, magnification: int = 5):
+        self.commands.append(f"^FO{_d(x)},{_d(top)}^BQN,2,{magnification}^FH^FDMA,{_escape(value)}^FS")
+
+    def render(self) -> bytes:
+        return "\n".join(self.commands + ["^XZ", ""]).encode("utf-8")
+
+def render_label_zpl(label: dict) -> bytes:
+    """Draw a 4x6 inch shipping label from app.utils.labels.label_content data"""
+    z = _Zpl()
+    y_line1, y_line2, y_line3, y_line4 = 110, 190, 240, 255
+    x_split = WIDTH * 0.45
+
+    # --- SEPARATOR LINES ---
+    for y in (y_line1, y_line2, y_line3, y_line4):
+        z.hline(5, WIDTH - 5, y)
+    z.vline(x_split, 5, y_line1)
+
+    # --- TOP SECTION ---
+    z.text(10, 15, 7, "Customer Address")
+    if label["customer_name"] is not None:
+        z.text(10, 30, 10, _fit(label["customer_name"], x_split - 12, 10))
+        y_addr = 42
+        for line in label["customer_lines"]:
+            z.text(10, y_addr, 8, _fit(line, x_split - 12, 8))
+            y_addr += 9
+
+    x_right = x_split + 5
+    right_width = WIDTH - x_right - 5
+    z.box(x_right, 5, right_width, 15, filled=True)
+    z.text(x_right, 16, 8, label["payment"], width=right_width, align="C", reverse=True)
+
+    z.text(x_right, 35, 12, label["courier"])
+    z.box(x_right, 38, 35, 10, filled=True)
+    z.text(x_right, 45, 7, "Pickup", width=35, align="C", reverse=True)
+
+    z.text(x_right, 58, 7, "Destination Code")
+    z.box(x_right, 60, 60, 12)
+    z.text(x_right + 2, 69, 9, label["destination_code"])
+    z.text(x_right, 80, 7, "Return Code")
+    z.text(x_right, 90, 8, label["return_code"])
+
+    z.qr(WIDTH - 55, 26, label["qr_data"], magnification=4)
+
+    # --- MIDDLE SECTION ---
+    z.text(10, y_line1 + 22, 8, _fit(label["return_name"], WIDTH * 0.5 - 12, 8))
+    y_ret = y_line1 + 32
+    for line in label["return_lines"]:
+        z.text(10, y_ret, 7, _fit(line, WIDTH * 0.5 - 12, 7))
+        y_ret += 8
+
+    z.barcode(WIDTH * 0.52, y_line1 + 20, 30, label["barcode"])
+    z.text(WIDTH * 0.5, y_line1 + 70, 9, label["barcode"], width=WIDTH * 0.5 - 5, align="C")
+
+    # --- PRODUCT DETAILS SECTION ---
+    z.text(10, y_line2 + 10, 8, "Product Details")
+    columns = [(5, 80, "SKU"), (85, 40, "Size"), (125, 30, "Qty"), (155, 40, "Color"), (195, 80, "Order No.")]
+    for x, width, heading in columns:
+        z.text(x + 2, y_line2 + 20, 6, heading)
+    y_row = y_line2 + 28
+    for row in label["products"]:
+        values = [f"{row['sku']} {row['name']}", "Free", row["quantity"], "Multi", row["order_ref"]]
+        for (x, width, _), value in zip(columns, values):
+            z.text(x + 2, y_row, 6, _fit(value, width - 4, 6))
+        y_row += 8
+
+    # --- TAX INVOICE SECTION (Bottom) ---
+    z.box(5, y_line3 + 1, WIDTH - 10, 12, filled=True)
+    z.text(5, y_line3 + 10, 8, "TAX INVOICE", width=WIDTH - 10, align="C", reverse=True)
+    z.text(5, y_line3 + 10, 6, "Original For Recipient", width=WIDTH - 15, align="R", reverse=True)
+
+    z.text(10, y_line4 + 10, 6, "BILL TO / SHIP TO")
+    z.text(WIDTH / 2 + 5, y_line4 + 10, 6, _fit(f"Sold by : {label['sold_by']}", WIDTH / 2 - 10, 6))
+    if label["bill_to"] is not None:
+        z.text(10, y_line4 + 18, 6, _fit(label["bill_to"], WIDTH / 2 - 15, 6))
+        z.text(10, y_line4 + 25, 6, f"State: {label['bill_to_state']}")
+    if label["sold_by_address"]:
+        z.text(WIDTH / 2 + 5, y_line4 + 18, 6, _fit(label["sold_by_address"], WIDTH / 2 - 10, 6))
+    if label["gstin"]:
+        z.text(WIDTH / 2 + 5, y_line4 + 25, 6, f"GSTIN - {label['gstin']}")
+
+    widths = [70, 30, 20, 30, 25, 35, 30, 35]
+    rows = [["Description", "HSN", "Qty", "Gross", "Disc", "Taxable", "Tax", "Total"]]
+    for row in label["invoice_rows"]:
+        rows.append([
+            row["description"], row["hsn"], row["quantity"], f"{row['gross']:.0f}", "0",
+            f"{row['taxable']:.1f}", f"{row['tax']:.1f}", f"{row['gross']:.0f}"
+        ])
+    rows.append(["Total", "", "", "", "", f"{label['total_taxable']:.1f}", f"{label['total_tax']:.1f}", f"{label['grand_total']:.1f}"])
+
+    y_table = y_line4 + 40
+    z.box(5, y_table, sum(widths), 9 * len(rows))
+    for row in rows:
+        x = 5
+        for index, (width, value) in enumerate(zip(widths, row)):
+            if value != "":
+                z.text(x + 1, y_table + 7, 5, _fit(value, width - 2, 5), width=width - 2,
+                       align="R" if index >= 3 else "L")
+            x += width
+        y_table += 9
+        z.hline(5, 5 + sum(widths), y_table)
+
+    z.text(10, HEIGHT - 10, 5, "Tax is not payable on reverse charge basis. Computer generated invoice.")
+    return z.render()
@@ -0,0 +1,107 @@
+"""
+Benchmark the order-line analytics cube on synthetic data.
+
+    python -m scripts.bench_analytics --lines 1000000
+
+Builds a cube of N synthetic order lines (about 3 lines per order) directly
+through OrderLineCube.append_lines and times a set of typical admin slices.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.analytics import OrderLineCube, COLUMNS
+
+STATES = ["Rajasthan", "Maharashtra", "Delhi", "Karnataka", "Tamil Nadu", "Gujarat",
+          "Uttar Pradesh", "West Bengal", "Telangana", "Kerala", "Punjab", "Haryana"]
+PAYMENT_METHODS = ["cod", "online"]
+STATUSES = ["pending", "confirmed", "shipped", "delivered", "cancelled", "returned"]
+GST_RATES = [0.0, 5.0, 12.0, 18.0, 28.0]
+
+QUERIES = {
+    "revenue by category x week": dict(group_by=["category", "week"], metrics=["revenue", "orders"]),
+    "gst by rate": dict(group_by=["gst_rate"], metrics=["gst", "revenue"]),
+    "wholesale vs retail": dict(group_by=["wholesale"], metrics=["revenue", "quantity", "orders"]),
+    "payment method by state": dict(group_by=["state", "payment_method"], metrics=["revenue", "orders"]),
+    "top products, delivered only": dict(group_by=["product"], metrics=["revenue"],
+                                         filters={"status": ["delivered"]}, limit=20),
+    "monthly totals": dict(group_by=["month"], metrics=["revenue", "cost", "gst", "lines"]),
+}
+
+def build_cube(lines: int, products: int, categories: int, seed: int) -> OrderLineCube:
+    rng = np.random.default_rng(seed)
+    cube = OrderLineCube()
+
+    for i in range(categories):
+        cube._dictionaries["category"].encode(f"category-{i}")
+    for i in range(products):
+        cube._dictionaries["product"].encode(f"product-{i}")
+    for value in STATES:
+        cube._dictionaries["state"].encode(value)
+    for value in PAYMENT_METHODS:
+        cube._dictionaries["payment_method"].encode(value)
+    for value in GST_RATES:
+        cube._dictionaries["gst_rate"].encode(value)
+    for value in STATUSES:
+        cube._dictionaries["status"].encode(value)
+
+    order_count = max(1, lines // 3)
+    for i in range(order_count):
+        cube._orders.encode(f"order-{i}")
+
+    order = np.sort(rng.integers(0, order_count, lines)).astype(np.int32)
+    product = rng.integers(0, products, lines).astype(np.int32)
+    quantity = rng.integers(1, 6, lines).astype(np.int32)
+    price = rng.uniform(50, 5000, lines)
+    gst_code = rng.integers(0, len(GST_RATES), lines).astype(np.int32)
+    gst_rate = np.asarray(GST_RATES)[gst_code]
+    today = (np.datetime64("today") - np.datetime64("1970-01-01")).astype(int)
+
+    columns = {
+        "day": (today - rng.integers(0, 730, order_count)[order]).astype(np.int32),
+        "category": (product % categories).astype(np.int32),
+        "product": product,
+        "gst_rate": gst_code,
+        "wholesale": rng.random(lines) < 0.15,
+        "payment_method": rng.integers(0, len(PAYMENT_METHODS), order_count)[order].astype(np.int32),
+        "state": rng.integers(0, len(STATES), order_count)[order].astype(np.int32),
+        "status": rng.integers(0, len(STATUSES), order_count)[order].astype(np.int32),
+        "offline": (rng.random(order_count) < 0.1)[order],
+        "quantity": quantity,
+        "revenue": price * quantity,
+        "gst": price * quantity * gst_rate / 100,
+        "cost": price * quantity * 0.65,
+        "order": order,
+    }
+    assert set(columns) == set(COLUMNS) - {"alive"}
+    cube.append_lines(columns)
+    return cube
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    cube = build_cube(args.lines, args.products, args.categories, args.seed)
+    stats = cube.stats()
+    print(f"built {stats['lines']:,} lines / {stats['orders'] or args.lines // 3:,} orders "
+          f"in {time.perf_counter() - started:.2f}s, {stats['memory_bytes'] / 1e6:.1f} MB of columns")
+
+    for label, query in QUERIES.items():
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            result = cube.query(**query)
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        print(f"{label:32s} groups={result['groups']:>6}  "
+              f"median={timings[len(timings) // 2]:8.2f} ms  best={timings[0]:8.2f} ms")
+
+if __name__ == "__main__":
+    main()
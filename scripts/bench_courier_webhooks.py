@@ -0,0 +1,145 @@
+"""
+Load-test the courier webhook receiver.
+
+    python -m scripts.bench_courier_webhooks --clients 32 --seconds 10 --orders 2000 --duplicate-rate 0.2
+
+Starts the API in-process on a throwaway SQLite database (in a temp
+directory) and seeds shipped orders. Signed pushes are then fired from
+--clients threads, each carrying --events-per-push scans for random orders;
+--duplicate-rate of the pushes resend an earlier body. The report covers
+acknowledgement throughput and latency percentiles, how long the worker
+took to apply the backlog, and the resulting order statuses. Try a small
+WEBHOOK_QUEUE_SIZE to see 503s under burst load.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+SECRET = "bench-webhook-secret"
+STEPS = ["Manifested", "In Transit", "Dispatched", "Delivered"]
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def start_server(port: int, orders: int):
+    os.chdir(tempfile.mkdtemp(prefix="bench_webhooks_"))
+    os.environ["USE_SQLITE"] = "true"
+    os.environ["SCHEDULER_ENABLED"] = "false"
+    os.environ["DELHIVERY_WEBHOOK_SECRET"] = SECRET
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import uvicorn
+    from sqlalchemy import insert
+    from app.main import app
+    from app.db.session import SessionLocal
+    from app.models.order import Order
+    from app.utils.common import generate_id
+
+    db = SessionLocal()
+    db.execute(insert(Order), [
+        {"id": generate_id(), "order_number": f"BENCH{i:07d}", "items": [], "subtotal": 100, "grand_total": 100,
+         "status": "shipped", "tracking_number": f"AWB{i:09d}", "courier_provider": "Delhivery",
+         "tracking_history": [], "created_at": datetime.utcnow()}
+        for i in range(orders)
+    ])
+    db.commit()
+    db.close()
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def make_push(orders: int, events: int, base: datetime) -> bytes:
+    shipments = []
+    for _ in range(events):
+        step = random.randrange(len(STEPS))
+        shipments.append({"Shipment": {
+            "AWB": f"AWB{random.randrange(orders):09d}",
+            "Status": {
+                "Status": STEPS[step],
+                "StatusType": "DL" if STEPS[step] == "Delivered" else "UD",
+                "StatusDateTime": (base + timedelta(hours=step)).isoformat(),
+                "StatusLocation": "Bench Hub"
+            }
+        }})
+    return json.dumps({"Shipments": shipments}).encode()
+
+def client_loop(url, args, base, stop, results):
+    from app.services.courier_webhooks import sign
+
+    session = requests.Session()
+    sent = []
+    while not stop.is_set():
+        if sent and random.random() < args.duplicate_rate:
+            body = random.choice(sent)
+        else:
+            body = make_push(args.orders, args.events_per_push, base)
+            sent.append(body)
+        started = time.perf_counter()
+        response = session.post(url, data=body, timeout=60, headers={
+            "Content-Type": "application/json", "X-Webhook-Signature": sign(body, SECRET)
+        })
+        results.append((response.status_code, time.perf_counter() - started))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--events-per-push", type=int, default=1)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    start_server(args.port, args.orders)
+    from sqlalchemy import func
+    from app.db.session import SessionLocal
+    from app.models.order import Order
+    from app.services.courier_webhooks import webhook_queue
+
+    url = f"http://127.0.0.1:{args.port}/api/courier/webhooks/delhivery"
+    base = datetime.utcnow().replace(microsecond=0)
+    stop = threading.Event()
+    results = []
+    threads = [threading.Thread(target=client_loop, args=(url, args, base, stop, results)) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    drain_started = time.perf_counter()
+    backlog = webhook_queue.stats()["queued"]
+    webhook_queue.drain(timeout=600)
+    drain_seconds = time.perf_counter() - drain_started
+
+    latencies = [latency * 1000 for status, latency in results if status == 202]
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"{args.clients} clients, {args.events_per_push} events/push, {args.seconds:.0f}s, {args.orders} orders")
+    print(f"ack      {len(results) / args.seconds:8.1f} req/s  p50 {percentile(latencies, 50):6.2f} ms  "
+          f"p95 {percentile(latencies, 95):6.2f} ms  p99 {percentile(latencies, 99):6.2f} ms  statuses {statuses}")
+    print(f"apply    backlog of {backlog} events drained in {drain_seconds:.2f}s")
+    print("queue:", json.dumps(webhook_queue.stats()))
+
+    db = SessionLocal()
+    print("orders:", dict(db.query(Order.status, func.count(Order.id)).group_by(Order.status).all()))
+    db.close()
+
+if __name__ == "__main__":
+    main()
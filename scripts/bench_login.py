@@ -0,0 +1,115 @@
+"""
+Load-test /auth/login alongside catalog traffic.
+
+    python -m scripts.bench_login --login-clients 16 --catalog-clients 8 --seconds 15
+
+Starts the API in-process on a throwaway SQLite database (in a temp
+directory), seeds one user and some products, then runs login clients and
+catalog (/products) clients concurrently. Reports throughput and latency
+percentiles for both, plus the hashing executor metrics. Run it with
+different HASH_WORKERS / HASH_QUEUE_LIMIT / BCRYPT_ROUNDS values to see how
+hashing load affects catalog latency.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+PHONE = "9000000001"
+PASSWORD = "bench-password"
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def start_server(port: int):
+    os.chdir(tempfile.mkdtemp(prefix="bench_login_"))
+    os.environ["USE_SQLITE"] = "true"
+    os.environ["SCHEDULER_ENABLED"] = "false"
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import uvicorn
+    from app.main import app
+    from app.db.session import SessionLocal
+    from app.models.user import User
+    from app.models.product import Product, Category
+    from app.core.security import hash_password
+    from app.utils.common import generate_id
+
+    db = SessionLocal()
+    category = Category(id=generate_id(), name="Bench")
+    db.add(category)
+    db.add(User(id=generate_id(), phone=PHONE, name="Bench User", password=hash_password(PASSWORD), role="customer"))
+    for i in range(200):
+        db.add(Product(id=generate_id(), name=f"Bench product {i}", sku=f"BENCH-{i}", category_id=category.id,
+                       mrp=120, selling_price=100, cost_price=60, stock_qty=100, images=[]))
+    db.commit()
+    db.close()
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def client_loop(method, url, payload, stop, results):
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = session.request(method, url, json=payload, timeout=60)
+        results.append((response.status_code, time.perf_counter() - started))
+
+def summarize(name, results, seconds):
+    latencies = [latency * 1000 for status, latency in results if status == 200]
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"{name:8s} {len(results) / seconds:8.1f} req/s  "
+          f"p50 {percentile(latencies, 50):7.1f} ms  p95 {percentile(latencies, 95):7.1f} ms  "
+          f"p99 {percentile(latencies, 99):7.1f} ms  mean {statistics.fmean(latencies) if latencies else 0:7.1f} ms  "
+          f"statuses {statuses}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--login-clients", type=int, default=16)
+    parser.add_argument("--catalog-clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    start_server(args.port)
+    from app.core.security import hashing_executor
+
+    base = f"http://127.0.0.1:{args.port}/api"
+    stop = threading.Event()
+    login_results, catalog_results = [], []
+    threads = [
+        threading.Thread(target=client_loop, args=("POST", f"{base}/auth/login",
+                                                    {"identifier": PHONE, "password": PASSWORD}, stop, login_results))
+        for _ in range(args.login_clients)
+    ] + [
+        threading.Thread(target=client_loop, args=("GET", f"{base}/products?limit=20", None, stop, catalog_results))
+        for _ in range(args.catalog_clients)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{args.login_clients} login clients, {args.catalog_clients} catalog clients, {args.seconds:.0f}s")
+    summarize("login", login_results, args.seconds)
+    summarize("catalog", catalog_results, args.seconds)
+    print("hashing:", hashing_executor.metrics())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Local stand-in for the Delhivery API, for testing and benchmarking.
+
+    python -m scripts.fake_delhivery --port 8900 --latency-ms 40 --error-rate 0.05
+    DELHIVERY_BASE_URL=http://127.0.0.1:8900 uvicorn app.main:app
+
+    python -m scripts.fake_delhivery --bench 500 --latency-ms 5
+
+Implements the endpoints DelhiveryService uses: pincode serviceability
+(99xxxx is not serviceable; no filter returns a generated full list),
+shipment creation (CMU), tracking (comma-separated waybills), packing slip
+and cancellation. Waybills it issued move through Manifested -> In Transit
+-> Dispatched -> Delivered, one step every --scan-interval seconds. Unknown
+waybills are treated as shipped one interval before they were first asked
+about.
+
+Fault injection: --latency-ms/--jitter-ms add delay, --error-rate answers
+503, and --hang-rate holds the request for --hang-seconds (longer than the
+client read timeout).
+
+--bench N starts the server in-process and compares N calls that open a
+fresh connection each (plain requests.get) with N calls through the pooled
+client (app.services.courier.delhivery_http), sequentially and from
+--threads threads.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+SCAN_STEPS = [
+    ("Manifested", "UD", "Shipment manifested", "Origin Hub"),
+    ("In Transit", "UD", "Shipment in transit", "Jaipur Hub"),
+    ("Dispatched", "UD", "Out for delivery", "Destination Hub"),
+    ("Delivered", "DL", "Delivered to consignee", "Customer Address"),
+]
+
+FULL_LIST_RANGES = (110001, 302001, 400001, 560001, 600001, 700001)
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="Fake Delhivery")
+    waybills = {}
+    sequence = itertools.count(int(time.time()) % 10_000_000 * 1000)
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        if args.hang_rate and random.random() < args.hang_rate:
+            await asyncio.sleep(args.hang_seconds)
+        delay = args.latency_ms + random.uniform(0, args.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if args.error_rate and random.random() < args.error_rate:
+            return JSONResponse({"error": "Service temporarily unavailable"}, status_code=503)
+        return await call_next(request)
+
+    def scans_for(waybill: str) -> list:
+        created = waybills.setdefault(waybill, time.time() - args.scan_interval)
+        steps = min(len(SCAN_STEPS), 1 + int((time.time() - created) / args.scan_interval))
+        scans = []
+        for index, (status, code, instructions, location) in enumerate(SCAN_STEPS[:steps]):
+            scan_time = datetime.fromtimestamp(created) + timedelta(seconds=index * args.scan_interval)
+            scans.append({"ScanDetail": {
+                "Scan": status,
+                "ScanType": code,
+                "ScanDateTime": scan_time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "ScannedLocation": location,
+                "Instructions": instructions,
+                "StatusCode": code
+            }})
+        return scans
+
+    @app.get("/c/api/pin-codes/json/")
+    async def pincodes(filter_codes: str = ""):
+        codes = []
+        # No filter means the full list; a few metro ranges stand in for it
+        pins = filter(None, filter_codes.split(",")) if filter_codes else (
+            str(pin) for start in FULL_LIST_RANGES for pin in range(start, start + args.full_list_size)
+        )
+        for pin in pins:
+            if pin.startswith("99"):
+                continue  # treat 99xxxx as not serviceable
+            codes.append({"postal_code": {
+                "pin": int(pin), "cod": "Y", "pre_paid": "Y", "cash": "Y", "pickup": "Y", "repl": "Y",
+                "city": "Jaipur" if pin.startswith("30") else "Fake City",
+                "state_code": "RJ" if pin.startswith("30") else "DL",
+                "district": "Fake District"
+            }})
+        return {"delivery_codes": codes}
+
+    @app.post("/api/cmu/create.json")
+    async def create_shipment(request: Request):
+        form = await request.form()
+        shipments = json.loads(form.get("data") or "{}").get("shipments", [])
+        packages = []
+        for shipment in shipments:
+            waybill = str(next(sequence))
+            waybills[waybill] = time.time()
+            packages.append({"status": "Success", "waybill": waybill, "refnum": shipment.get("order"), "remarks": []})
+        return {"packages": packages, "success": True}
+
+    @app.get("/api/v1/packages/json/")
+    async def track(waybill: str = ""):
+        data = []
+        for awb in filter(None, waybill.split(",")):
+            scans = scans_for(awb)
+            last = scans[-1]["ScanDetail"]
+            data.append({"Shipment": {
+                "AWB": awb,
+                "Status": {"Status": last["Scan"], "StatusDateTime": last["ScanDateTime"], "StatusCode": last["StatusCode"]},
+                "Origin": "Jaipur",
+                "Destination": "Fake City",
+                "ExpectedDeliveryDate": (datetime.now() + timedelta(days=2)).strftime("%Y-%m-%d"),
+                "CODAmount": 0,
+                "Scans": scans
+            }})
+        return {"ShipmentData": data}
+
+    @app.get("/api/p/packing_slip")
+    async def packing_slip(wbns: str = ""):
+        return {"packages": [{"wbn": awb, "pdf_download_link": f"http://127.0.0.1:{args.port}/labels/{awb}.pdf"}
+                             for awb in filter(None, wbns.split(","))]}
+
+    @app.post("/api/p/edit")
+    async def edit(request: Request):
+        payload = await request.json()
+        waybills.pop(str(payload.get("waybill")), None)
+        return {"status": True, "waybill": payload.get("waybill"), "remark": "Shipment has been cancelled"}
+
+    return app
+
+def start_in_thread(args):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(create_app(args), host="127.0.0.1", port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def run_bench(args):
+    os.environ["DELHIVERY_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import requests
+    from app.services.courier import delhivery_http
+
+    start_in_thread(args)
+    url = f"http://127.0.0.1:{args.port}/api/v1/packages/json/"
+
+    def fresh(i):
+        started = time.perf_counter()
+        requests.get(url, params={"waybill": str(i)}, headers={"Connection": "close"}, timeout=10)
+        return time.perf_counter() - started
+
+    def pooled(i):
+        started = time.perf_counter()
+        delhivery_http.get(url, operation="bench", params={"waybill": str(i)})
+        return time.perf_counter() - started
+
+    print(f"{args.bench} tracking calls, {args.latency_ms} ms server latency")
+    for name, call in (("fresh connection", fresh), ("pooled client", pooled)):
+        for threads in (1, args.threads):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                latencies = list(pool.map(call, range(args.bench)))
+            elapsed = time.perf_counter() - started
+            print(f"{name:17s} threads={threads:<3d} {args.bench / elapsed:8.1f} req/s  "
+                  f"mean {statistics.mean(latencies) * 1000:6.2f} ms  max {max(latencies) * 1000:6.2f} ms")
+    print(json.dumps(delhivery_http.metrics(), indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--hang-rate", type=float, default=0)
+    parser.add_argument("--hang-seconds", type=float, default=30)
+    parser.add_argument("--scan-interval", type=float, default=60, help="seconds between tracking scans")
+    parser.add_argument("--full-list-size", type=int, default=100, help="pincodes per range in the full pincode list")
+    parser.add_argument("--bench", type=int, default=0, help="run the client benchmark with this many calls")
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.bench:
+        run_bench(args)
+        return
+
+    import uvicorn
+    uvicorn.run(create_app(args), host="127.0.0.1", port=args.port, log_level="info")
+
+if __name__ == "__main__":
+    main()
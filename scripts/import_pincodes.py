@@ -0,0 +1,48 @@
+"""
+Load the pincode serviceability table from a file or the courier API.
+
+    python -m scripts.import_pincodes pincodes.csv
+    python -m scripts.import_pincodes delhivery_pincodes.json --replace
+    python -m scripts.import_pincodes --api
+
+Files are a saved /c/api/pin-codes/json/ response (.json) or a CSV with a
+header row (see app.services.pincodes.read_pincode_file). --replace treats
+the file as the complete serviceable list: pincodes not in it are marked
+unserviceable. --api pulls the full list from the courier (what the
+scheduled refresh does). Running workers pick the changes up within
+PINCODE_CACHE_TTL_SECONDS.
+"""
+import argparse
+import json
+import sys
+
+from app.db.session import SessionLocal, engine
+from app.db.upgrade import sync_schema
+from app.services import pincodes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="CSV or JSON pincode file")
+    parser.add_argument("--replace", action="store_true", help="file is the complete serviceable list")
+    parser.add_argument("--api", action="store_true", help="pull the full list from the courier API instead")
+    args = parser.parse_args()
+    if bool(args.path) == args.api:
+        parser.error("give either a file or --api")
+
+    sync_schema(engine)
+    db = SessionLocal()
+    try:
+        if args.api:
+            result = pincodes.refresh_from_api(db, force=True)
+        else:
+            result = pincodes.import_file(db, args.path, replace=args.replace)
+    except Exception as e:
+        db.rollback()
+        print(f"Import failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Replay courier status pushes.
+
+    python -m scripts.replay_courier_webhooks pushes.jsonl --url http://127.0.0.1:8000/api/courier/webhooks/delhivery
+    python -m scripts.replay_courier_webhooks --from-db --since 2026-10-01 --url https://staging.example.com/api/courier/webhooks/delhivery
+    python -m scripts.replay_courier_webhooks --reapply --since 2026-10-01 --awb 1234567890
+
+Sends pushes to a webhook URL, signed with DELHIVERY_WEBHOOK_SECRET (or
+--secret). The pushes come from a file with one JSON body per line, or from
+the payloads stored in courier_events, sent --batch events per request. The
+receiver drops events it has already stored, so replaying against the same
+environment is harmless.
+
+--reapply instead applies the stored events again to orders and returns in
+this database, e.g. after an order's AWB was corrected.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+import requests
+
+def load_file(path: str) -> list:
+    with open(path) as handle:
+        return [line.strip().encode() for line in handle if line.strip()]
+
+def load_stored(since, awb, batch: int) -> list:
+    from app.db.session import SessionLocal
+    from app.models.order import CourierEvent
+
+    db = SessionLocal()
+    try:
+        query = db.query(CourierEvent.payload).order_by(CourierEvent.received_at, CourierEvent.id)
+        if since:
+            query = query.filter(CourierEvent.received_at >= since)
+        if awb:
+            query = query.filter(CourierEvent.awb == awb)
+        payloads = [payload for (payload,) in query if payload]
+    finally:
+        db.close()
+    return [json.dumps({"Shipments": payloads[start:start + batch]}).encode() for start in range(0, len(payloads), batch)]
+
+def send(bodies: list, url: str, secret: str):
+    from app.services.courier_webhooks import sign
+
+    session = requests.Session()
+    totals = {"requests": 0, "accepted": 0, "duplicates": 0, "invalid": 0, "errors": {}}
+    for body in bodies:
+        response = session.post(url, data=body, timeout=30, headers={
+            "Content-Type": "application/json",
+            "X-Webhook-Signature": sign(body, secret)
+        })
+        totals["requests"] += 1
+        if response.status_code == 202:
+            for key in ("accepted", "duplicates", "invalid"):
+                totals[key] += response.json().get(key, 0)
+        else:
+            totals["errors"][response.status_code] = totals["errors"].get(response.status_code, 0) + 1
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="file with one push body per line")
+    parser.add_argument("--from-db", action="store_true", help="send the stored courier_events payloads")
+    parser.add_argument("--reapply", action="store_true", help="re-apply stored events to this database")
+    parser.add_argument("--url", help="webhook URL to send to")
+    parser.add_argument("--secret", default=None, help="signing secret (default DELHIVERY_WEBHOOK_SECRET)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="stored events received at or after this time")
+    parser.add_argument("--awb", help="only this AWB's stored events")
+    parser.add_argument("--batch", type=int, default=50, help="stored events per request")
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    if args.reapply:
+        from app.db.session import SessionLocal
+        from app.services.courier_webhooks import reapply_events
+
+        db = SessionLocal()
+        try:
+            print(json.dumps(reapply_events(db, since=args.since, awb=args.awb), indent=2))
+        finally:
+            db.close()
+        return
+
+    if not args.url or bool(args.path) == args.from_db:
+        parser.error("give --url and either a file or --from-db")
+    from app.core.config import settings
+    secret = args.secret or settings.DELHIVERY_WEBHOOK_SECRET
+    if not secret:
+        parser.error("no signing secret; set DELHIVERY_WEBHOOK_SECRET or pass --secret")
+
+    bodies = load_stored(args.since, args.awb, args.batch) if args.from_db else load_file(args.path)
+    print(json.dumps(send(bodies, args.url, secret), indent=2))
+
+if __name__ == "__main__":
+    main()